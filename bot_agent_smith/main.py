@@ -2,10 +2,21 @@ from src.interfaces.discord.bot import AgentSmithBot
 from src.memory import create_vector_db_client, create_message_repository, create_user_repository
 from src.core.logger import logger
 from dotenv import load_dotenv
+import asyncio
 import os
 
 load_dotenv()
 
+def install_uvloop():
+    """Run the bot's event loop on uvloop when it's available"""
+    try:
+        import uvloop
+    except ImportError:
+        logger.info("uvloop not installed, using the default asyncio event loop")
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    logger.info("Using uvloop event loop")
+
 def main():
     # Get required environment variables
     TOKEN = os.getenv('DISCORD_TOKEN')
@@ -28,6 +39,8 @@ def main():
         message_repository=message_repository,
         user_repository=user_repository
     )
+    # Must happen before bot.run creates the event loop
+    install_uvloop()
     bot.run(TOKEN)
 
 if __name__ == "__main__":
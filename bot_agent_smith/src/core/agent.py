@@ -34,7 +34,7 @@ class Agent:
         # Import required services
         from src.llm import create_llm_client, get_default_model, get_available_models
         from src.llm.service import LLMService
-        from src.skills.reasoning.qualifier import QualifierService
+        from src.skills.reasoning.qualifier import QualifierService, QualifierPlusKeywordService
         from src.skills.reasoning.keyword_extraction import KeywordExtractionService
         from src.skills.web_search.article_search import ArticleSearchService
         from src.skills.context.service import ContextService
@@ -48,11 +48,15 @@ class Agent:
         logger.info(f"Initializing with available models: {available_models}")
         logger.info(f"Default model: {default_model}")
         
+        # Track created LLM clients so they can be closed on shutdown
+        self.llm_clients = []
+        
         # Initialize LLM clients and register services for each model family
         for model_family in available_models:
             # Initialize LLM client
             try:
                 llm_client = create_llm_client(model_family)
+                self.llm_clients.append(llm_client)
                 
                 # Register LLM service for this model family
                 llm_service = LLMService(client=llm_client, model_family=model_family)
@@ -98,6 +102,7 @@ class Agent:
         
         # Get the default LLM client for other services
         default_llm_client = create_llm_client(default_model)
+        self.llm_clients.append(default_llm_client)
 
         # Initialize embedding service
         embedding_service = EmbeddingService(model_name="all-MiniLM-L6-v2")
@@ -132,6 +137,18 @@ class Agent:
             version="1.0.0"
         )
         
+        # Register the fused qualifier, which also returns search keywords
+        qualifier_keywords_service = QualifierPlusKeywordService(
+            ollama_client=default_llm_client,
+            message_repository=self.message_repository
+        )
+        self.service_registry.register(
+            name="qualifier_keywords",
+            service=qualifier_keywords_service,
+            description="Determines if a message needs counter-arguments and extracts search keywords",
+            version="1.0.0"
+        )
+        
         # Register keyword extraction service
         keyword_extraction_service = KeywordExtractionService(
             ollama_client=default_llm_client  # Parameter name kept for backward compatibility
@@ -179,6 +196,11 @@ class Agent:
             logger.info(f"Stopping adapter for channel: {channel_type}")
             await adapter.stop()
 
+        # Close LLM clients once no adapter can route new events to them
+        for llm_client in self.llm_clients:
+            await llm_client.aclose()
+        logger.info(f"Closed {len(self.llm_clients)} LLM clients")
+
     processed_events = set()  # Track already processed event IDs
 
     async def handle_event(self, event: CommunicationEvent) -> AgentResponse:
@@ -198,18 +220,15 @@ class Agent:
         message = self._event_to_message(event)
         logger.info(f"Converted to message ID: {message.id}")
         
-        # Add embedding to message
-        embedding_service = self.service_registry.get_service("embedding")
-        message = embedding_service.embed_message(message)
-        logger.info(f"Added embedding with dimension: {len(message.embedding)}")
-        
-        # Store message in repository
-        self.message_repository.add(message)
-        logger.info("Message stored in repository")
-        
-        # Qualify the message
-        qualifier_service = self.service_registry.get_service("qualifier")
-        needs_counter_arguments = qualifier_service.execute(message=message)
+        # Storing the message and qualifying it (getting search keywords from
+        # the same call) don't depend on each other, so run both at once. They
+        # block on I/O, so each gets a worker thread.
+        qualifier_service = self.service_registry.get_service("qualifier_keywords")
+        _, qualification = await asyncio.gather(
+            asyncio.to_thread(self._embed_and_store, message),
+            qualifier_service.execute_async(message=message)
+        )
+        needs_counter_arguments = qualification["needs_counter_arguments"]
         logger.info(f"Qualification result: {needs_counter_arguments}")
         
         # IMPORTANT: If counter-arguments needed, send acknowledgment response immediately
@@ -222,8 +241,11 @@ class Agent:
             )
             self.message_repository.add(ack)
             
-            # Create response with special flag
-            return AgentResponse.with_acknowledgment(ack_message)
+            # Create response with special flag, passing the keywords on to the
+            # counter-argument workflow so it doesn't extract them again
+            response = AgentResponse.with_acknowledgment(ack_message)
+            response.metadata["keywords"] = qualification["keywords"]
+            return response
         
         # Set up workflow input with qualification result already set
         workflow_input = {
@@ -239,7 +261,7 @@ class Agent:
         }
         
         # Process through workflow
-        result = self.workflow.invoke(workflow_input)
+        result = await self.workflow.ainvoke(workflow_input)
         
         # Handle the result
         if result:
@@ -247,15 +269,19 @@ class Agent:
             if isinstance(result.get("messages_to_send"), list) and result["messages_to_send"]:
                 messages = result["messages_to_send"]
                 
-                # Store all messages in repository
-                for msg_obj in messages:
-                    content = msg_obj.get("content", "")
-                    if content:
-                        response_message = self._create_response_message(
-                            content=content,
-                            reply_to_message=message
-                        )
-                        self.message_repository.add(response_message)
+                # Store all messages in repository, embedding them in one batch
+                response_messages = [
+                    self._create_response_message(
+                        content=msg_obj["content"],
+                        reply_to_message=message,
+                        embed=False
+                    )
+                    for msg_obj in messages
+                    if msg_obj.get("content")
+                ]
+                self.service_registry.get_service("embedding").embed_messages(response_messages)
+                for response_message in response_messages:
+                    self.message_repository.add(response_message)
                 
                 # Return structured response with all messages
                 return AgentResponse(messages=messages)
@@ -278,6 +304,15 @@ class Agent:
         logger.info("========== EVENT HANDLING COMPLETE ==========")
         return None
 
+    def _embed_and_store(self, message: Message) -> None:
+        """Add an embedding to the message and store it in the repository"""
+        embedding_service = self.service_registry.get_service("embedding")
+        embedding_service.embed_message(message)
+        logger.info(f"Added embedding with dimension: {len(message.embedding)}")
+        
+        self.message_repository.add(message)
+        logger.info("Message stored in repository")
+
     def _event_to_message(self, event: CommunicationEvent) -> Message:
         """Convert a CommunicationEvent to internal Message format"""
         author = Author(
@@ -300,8 +335,13 @@ class Agent:
             }
         )
 
-    def _create_response_message(self, content: str, reply_to_message: Message) -> Message:
-        """Create a response message from the agent"""
+    def _create_response_message(self, content: str, reply_to_message: Message, embed: bool = True) -> Message:
+        """
+        Create a response message from the agent
+
+        Args:
+            embed: Set to False when the caller embeds several messages at once
+        """
         author = Author(
             id=self.agent_id,
             name=self.name,
@@ -320,7 +360,8 @@ class Agent:
         )
         
         # Add embedding to response message
-        embedding_service = self.service_registry.get_service("embedding")
-        response_message = embedding_service.embed_message(response_message)
+        if embed:
+            embedding_service = self.service_registry.get_service("embedding")
+            response_message = embedding_service.embed_message(response_message)
         
         return response_message
\ No newline at end of file
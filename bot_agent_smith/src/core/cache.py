@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after a time-to-live
+    (or never, when ttl is None).
+
+    Thread-safe, so it can back repository lookups called from worker threads.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: Optional[float] = 60.0):
+        """
+        Args:
+            maxsize: Maximum number of entries before the least recently used is evicted
+            ttl: Seconds an entry stays valid after it was set, or None to keep entries until evicted
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry if full"""
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry and return its value"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[0] if entry else default
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_MISSING = object()
@@ -2,6 +2,7 @@ from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional
 from datetime import datetime, UTC
 from enum import Enum
+from functools import cached_property
 import uuid
 
 class MessageType(Enum):
@@ -44,6 +45,15 @@ class Message:
     embedding: Optional[List[float]] = None
     metadata: Dict[str, Any] = field(default_factory=dict)
 
+    @cached_property
+    def role(self) -> str:
+        """Chat role of the message: bot authors have discord ids starting with 'bot_'"""
+        return "assistant" if self.author.discord_id.startswith("bot_") else "user"
+
+    @cached_property
+    def iso_timestamp(self) -> str:
+        return self.timestamp.isoformat()
+
     def to_dict(self) -> Dict[str, Any]:
         # Flatten the entire structure
         return {
@@ -88,7 +88,9 @@ class AgentSmithBot(commands.Bot):
             # If this is a processing ack, we need to continue with the workflow
             if agent_response.metadata.get("processing", False):
                 # Continue processing in a background task
-                asyncio.create_task(self._process_counter_arguments(event))
+                asyncio.create_task(self._process_counter_arguments(
+                    event, keywords=agent_response.metadata.get("keywords", [])
+                ))
             
             return
             
@@ -111,7 +113,7 @@ class AgentSmithBot(commands.Bot):
                     if i < len(agent_response.messages) - 1:
                         await asyncio.sleep(1)
 
-    async def _process_counter_arguments(self, event):
+    async def _process_counter_arguments(self, event, keywords=None):
         """Continue processing to generate counter-arguments after acknowledgment"""
         try:
             # Set up workflow input for counter-arguments
@@ -120,15 +122,16 @@ class AgentSmithBot(commands.Bot):
                 "context": {},
                 "response": "",
                 "needs_counter_arguments": True,  # Force counter-arguments
-                "keywords": [],
+                "keywords": keywords or [],  # From qualification, when available
                 "articles": [],
                 "counter_arguments": [],
                 "messages_to_send": [],
-                "_skip_qualification": True  # Skip qualification in workflow since we already did it
+                "_skip_qualification": True,  # Skip qualification in workflow since we already did it
+                "_skip_acknowledgment": True  # The acknowledgment was already sent by handle_message
             }
             
             # Run the full counter-argument workflow
-            result = self.agent.workflow.invoke(workflow_input)
+            result = await self.agent.workflow.ainvoke(workflow_input)
             
             # Send the results
             if result and result.get("messages_to_send"):
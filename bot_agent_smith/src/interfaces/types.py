@@ -48,7 +48,11 @@ class ChannelAdapter(Protocol):
         ...
     
     async def stop(self) -> None:
-        """Stop listening for events and clean up"""
+        """Stop listening for events and clean up.
+
+        Shared resources such as LLM clients are owned by the Agent and
+        closed by Agent.stop() once every adapter has stopped.
+        """
         ...
     
     async def send_message(self, channel_id: str, content: str, reply_to: Optional[str] = None) -> None:
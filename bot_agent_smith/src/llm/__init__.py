@@ -1,4 +1,5 @@
 import os
+from enum import StrEnum
 from typing import Union, Any, List, Optional, Dict
 
 from src.core.logger import logger
@@ -10,33 +11,59 @@ from .gcp_models import create_gcp_client, GCPClient
 # Type alias for all LLM client types
 LLMClient = Union[OllamaClient, GCPClient]
 
-def get_default_model() -> str:
+class ModelFamily(StrEnum):
+    """Supported LLM model families"""
+    GCP = "GCP"
+    OLLAMA = "OLLAMA"
+
+def to_model_family(model_family: Union[ModelFamily, str]) -> ModelFamily:
+    """
+    Resolve a model family name (case-insensitive) to its canonical enum member.
+    
+    Raises:
+        ValueError: If the model family is not supported.
+    """
+    if isinstance(model_family, ModelFamily):
+        return model_family
+    try:
+        return ModelFamily(model_family.upper())
+    except ValueError:
+        raise ValueError(f"Unsupported model family: {model_family}. " +
+                         "Please set DEFAULT_MODEL environment variable to GCP or OLLAMA.") from None
+
+def get_default_model() -> ModelFamily:
     """
     Get the default model family based on environment settings.
     
     Returns:
-        str: Default model family (e.g., 'GCP' or 'OLLAMA')
+        ModelFamily: Default model family (e.g., ModelFamily.GCP)
     """
-    return os.getenv('DEFAULT_MODEL', 'GCP').upper()
+    return to_model_family(os.getenv('DEFAULT_MODEL', 'GCP'))
 
-def get_available_models() -> List[str]:
+def get_available_models() -> List[ModelFamily]:
     """
     Get the list of available model families based on environment settings.
+    Unsupported entries are skipped with a warning.
     
     Returns:
-        List[str]: List of available model families (e.g., ['GCP', 'OLLAMA'])
+        List[ModelFamily]: List of available model families (e.g., [ModelFamily.GCP, ModelFamily.OLLAMA])
     """
     models_env = os.getenv('MODELS', '["GCP", "OLLAMA"]')
     import json
-    models = json.loads(models_env)
-    return [model.upper() for model in models]
+    models = []
+    for model in json.loads(models_env):
+        try:
+            models.append(to_model_family(model))
+        except ValueError as e:
+            logger.warning(str(e))
+    return models
 
-def create_llm_client(model_family: Optional[str] = None) -> LLMClient:
+def create_llm_client(model_family: Optional[Union[ModelFamily, str]] = None) -> LLMClient:
     """
     Factory function to create the appropriate LLM client based on environment settings.
     
     Args:
-        model_family: The model family to create (e.g., 'GCP' or 'OLLAMA'). 
+        model_family: The model family to create (e.g., ModelFamily.GCP or 'ollama'). 
                     If None, uses DEFAULT_MODEL from environment.
     
     Returns:
@@ -46,13 +73,10 @@ def create_llm_client(model_family: Optional[str] = None) -> LLMClient:
         ValueError: If the model_family is invalid or required environment
                    variables are missing.
     """
-    if model_family is None:
-        model_family = get_default_model()
-    
-    model_family = model_family.upper()
+    model_family = get_default_model() if model_family is None else to_model_family(model_family)
     logger.info(f"Initializing LLM client for model family: {model_family}")
     
-    if model_family == 'GCP':
+    if model_family is ModelFamily.GCP:
         api_key = os.getenv('GEMINI_API_KEY')
         model = os.getenv('GCP_MODEL', 'gemini-2.0-flash-lite')
         logger.info(f"Using GCP model: {model}")
@@ -63,16 +87,13 @@ def create_llm_client(model_family: Optional[str] = None) -> LLMClient:
         logger.info(f"Creating GCP client with model: {model}")
         return create_gcp_client(api_key=api_key, model=model)
         
-    elif model_family == 'OLLAMA':
+    elif model_family is ModelFamily.OLLAMA:
         base_url = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
         model = os.getenv('OLLAMA_MODEL', 'qwen2.5')
+        keep_alive = os.getenv('OLLAMA_KEEP_ALIVE', '10m')
         
         logger.info(f"Creating Ollama client with model: {model} at {base_url}")
-        return create_ollama_client(base_url=base_url, model=model)
-        
-    else:
-        raise ValueError(f"Unsupported model family: {model_family}. " +
-                         "Please set DEFAULT_MODEL environment variable to GCP or OLLAMA.")
+        return create_ollama_client(base_url=base_url, model=model, keep_alive=keep_alive)
 
 def create_default_llm_client() -> LLMClient:
     """
@@ -93,13 +114,13 @@ def get_model_configs() -> Dict[str, Dict[str, Any]]:
     configs = {}
     
     # GCP config
-    configs['GCP'] = {
+    configs[ModelFamily.GCP] = {
         'model': os.getenv('GCP_MODEL', 'gemini-2.0-flash-lite'),
         'api_key': os.getenv('GEMINI_API_KEY')
     }
     
     # OLLAMA config
-    configs['OLLAMA'] = {
+    configs[ModelFamily.OLLAMA] = {
         'base_url': os.getenv('OLLAMA_HOST', 'http://localhost:11434'),
         'model': os.getenv('OLLAMA_MODEL', 'qwen2.5')
     }
@@ -1,10 +1,16 @@
-import google.generativeai as genai
-from typing import List, Dict, Any
+from functools import cache
+from typing import AsyncIterator, List, Dict, Any, Optional
 from datetime import datetime, UTC
 
 from .models import GCPMessage, GCPResponse
 from src.core.logger import logger
 
+@cache
+def _genai():
+    """Import the Google SDK on first use so Ollama-only setups never load it"""
+    import google.generativeai as genai
+    return genai
+
 class GCPClient:
     """Client for interacting with Google GCP API."""
     
@@ -20,25 +26,88 @@ class GCPClient:
         self.api_key = api_key
         
         # Configure the GCP API
+        genai = _genai()
         genai.configure(api_key=api_key)
         
         # Initialize the model
         self.model_instance = genai.GenerativeModel(model_name=model)
         
-    def send_message(self, messages: List[GCPMessage]) -> GCPResponse:
+    def send_message(self, messages: List[GCPMessage], format: Optional[str] = None) -> GCPResponse:
         """
         Send messages to GCP and get a response.
         
         Args:
             messages: List of GCPMessage objects
+            format: "json" to have the model return a JSON document
             
         Returns:
             GCPResponse object containing the model's response
         """
         logger.info(f"Sending request to GCP model: {self.model}")
+
+        generation_config = self._generation_config(format)
+        history = self._history(messages)
+        
+        # Get response
+        if len(history) <= 1:
+            # A single turn needs no chat session
+            content = history[0]["parts"][0] if history else ""
+            response = self.model_instance.generate_content(content, generation_config=generation_config)
+        else:
+            # For continuing a conversation, create a chat session
+            chat = self.model_instance.start_chat(history=history)
+            last_msg = history[-1]["parts"][0] if history[-1]["role"] == "user" else ""
+            response = chat.send_message(last_msg, generation_config=generation_config)
+        
+        return self._wrap(response)
+
+    async def send_message_async(self, messages: List[GCPMessage], format: Optional[str] = None) -> GCPResponse:
+        """Same as send_message, using the SDK's async calls"""
+        logger.info(f"Sending async request to GCP model: {self.model}")
+
+        generation_config = self._generation_config(format)
+        history = self._history(messages)
         
-        # Convert messages to GCP format
-        gcp_messages = []
+        if len(history) <= 1:
+            content = history[0]["parts"][0] if history else ""
+            response = await self.model_instance.generate_content_async(content, generation_config=generation_config)
+        else:
+            chat = self.model_instance.start_chat(history=history)
+            last_msg = history[-1]["parts"][0] if history[-1]["role"] == "user" else ""
+            response = await chat.send_message_async(last_msg, generation_config=generation_config)
+        
+        return self._wrap(response)
+
+    async def astream(self, messages: List[GCPMessage], format: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the response text as the model generates it"""
+        logger.info(f"Streaming request to GCP model: {self.model}")
+
+        generation_config = self._generation_config(format)
+        history = self._history(messages)
+        
+        if len(history) <= 1:
+            content = history[0]["parts"][0] if history else ""
+            response = await self.model_instance.generate_content_async(
+                content, generation_config=generation_config, stream=True
+            )
+        else:
+            chat = self.model_instance.start_chat(history=history)
+            last_msg = history[-1]["parts"][0] if history[-1]["role"] == "user" else ""
+            response = await chat.send_message_async(last_msg, generation_config=generation_config, stream=True)
+        
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    def _generation_config(self, format: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Generation settings for the requested output format"""
+        return {"response_mime_type": "application/json"} if format == "json" else None
+
+    def _history(self, messages: List[GCPMessage]) -> List[Dict[str, Any]]:
+        """Convert messages to Gemini history, folding the system prompt into the first turn"""
+        # Fast path: a single user turn needs no history rewriting
+        if len(messages) == 1 and messages[0].role == "user":
+            return [{"role": "user", "parts": [messages[0].content]}]
         
         # Handle system message if present (GCP handles system prompts differently)
         system_content = None
@@ -60,27 +129,28 @@ class GCPClient:
             else:
                 history.insert(0, {"role": "user", "parts": [system_content]})
         
-        # Create a chat session
-        chat = self.model_instance.start_chat(history=history if len(history) > 1 else None)
-        
-        # Get response
-        if not history or len(history) <= 1:
-            # For the first message or if there's only one message after handling system
-            content = history[0]["parts"][0] if history else ""
-            response = self.model_instance.generate_content(content)
-        else:
-            # For continuing a conversation
-            last_msg = history[-1]["parts"][0] if history[-1]["role"] == "user" else ""
-            response = chat.send_message(last_msg)
-        
-        # Extract response text
-        response_text = response.text
-        
-        # Create and return GCPResponse
+        return history
+
+    def _wrap(self, response) -> GCPResponse:
+        """Wrap a raw SDK response into a GCPResponse"""
         return GCPResponse(
             model=self.model,
             created_at=datetime.now(UTC).isoformat(),
-            response=response_text,
+            response=response.text,
             done=True,
             metadata={"prompt_feedback": getattr(response, "prompt_feedback", None)}
-        )
\ No newline at end of file
+        )
+
+    def close(self) -> None:
+        """Release client resources (the Google SDK manages its own transport)"""
+        pass
+
+    async def aclose(self) -> None:
+        """Async counterpart of close"""
+        self.close()
+
+    def __enter__(self) -> "GCPClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
\ No newline at end of file
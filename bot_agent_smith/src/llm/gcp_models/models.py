@@ -1,13 +1,18 @@
+import sys
 from dataclasses import dataclass
 from typing import List, Dict, Any, Optional
 from datetime import datetime, UTC
 
-@dataclass
+@dataclass(slots=True)
 class GCPMessage:
     """Represents a message in the GCP conversation."""
     role: str  # system, user, or assistant
     content: str
 
+    def __post_init__(self):
+        # Roles come from a tiny fixed set, share a single string object for each
+        self.role = sys.intern(self.role)
+
 @dataclass
 class GCPResponse:
     """Represents a response from the GCP model."""
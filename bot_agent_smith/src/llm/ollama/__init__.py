@@ -1,5 +1,7 @@
+from typing import Optional
+
 from .client import OllamaClient
 from .models import OllamaMessage, OllamaResponse
 
-def create_ollama_client(base_url: str, model: str) -> OllamaClient:
-    return OllamaClient(base_url=base_url, model=model)
\ No newline at end of file
+def create_ollama_client(base_url: str, model: str, keep_alive: Optional[str] = "10m") -> OllamaClient:
+    return OllamaClient(base_url=base_url, model=model, keep_alive=keep_alive)
\ No newline at end of file
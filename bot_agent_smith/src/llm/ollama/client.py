@@ -1,37 +1,106 @@
 from urllib.parse import urljoin
 import httpx
-from typing import List
+import orjson
+from typing import AsyncIterator, List, Optional
 
 from .models import OllamaMessage, OllamaResponse
 
 class OllamaClient:
-    def __init__(self, base_url: str, model: str):
+    def __init__(self, base_url: str, model: str, keep_alive: Optional[str] = "10m"):
         self.base_url = base_url
         self.model = model
+        # How long the server keeps the model loaded after a request; staying
+        # loaded also keeps the cached prefix of our static system prompts
+        self.keep_alive = keep_alive
         self.timeout = httpx.Timeout(timeout=120.0)
+        self._client = httpx.Client(
+            timeout=self.timeout,
+            headers={"Content-Type": "application/json"}
+        )
+        # Shared by all async requests, so concurrent calls reuse keep-alive connections
+        self._async_client = httpx.AsyncClient(
+            timeout=self.timeout,
+            headers={"Content-Type": "application/json"},
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        )
+        self._completion_url = self._get_completion_url()
         
     def _get_completion_url(self) -> str:
         return urljoin(self.base_url, "/api/generate")
         
-    def send_message(self, messages: List[OllamaMessage]) -> OllamaResponse:
-        url = self._get_completion_url()
-        
-        # Format payload for Ollama
+    def send_message(self, messages: List[OllamaMessage], format: Optional[str] = None) -> OllamaResponse:
+        response = self._client.post(self._completion_url, content=self._body(messages, format))
+        response.raise_for_status()
+        return self._parse(response.content)
+
+    async def send_message_async(self, messages: List[OllamaMessage], format: Optional[str] = None) -> OllamaResponse:
+        """Same as send_message, without blocking the event loop"""
+        response = await self._async_client.post(self._completion_url, content=self._body(messages, format))
+        response.raise_for_status()
+        return self._parse(response.content)
+
+    async def astream(self, messages: List[OllamaMessage], format: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the response text as the model generates it"""
+        body = self._body(messages, format, stream=True)
+        async with self._async_client.stream("POST", self._completion_url, content=body) as response:
+            response.raise_for_status()
+            # Ollama streams one JSON object per line, each carrying the next few tokens
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = orjson.loads(line)
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    break
+
+    def _body(self, messages: List[OllamaMessage], format: Optional[str], stream: bool = False) -> bytes:
         payload = {
             "model": self.model,
             "prompt": "\n".join(msg.content for msg in messages),
-            "stream": False
+            "stream": stream
         }
+        # Constrain decoding to valid JSON when structured output is requested
+        if format:
+            payload["format"] = format
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+
+        # Serialize the payload for Ollama in one pass with orjson
+        return orjson.dumps(payload)
+
+    def _parse(self, content: bytes) -> OllamaResponse:
+        data = orjson.loads(content)
         
-        with httpx.Client(timeout=self.timeout) as client:
-            response = client.post(url, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            
-            return OllamaResponse(
-                model=data["model"],
-                created_at=data.get("created_at", ""),
-                response=data["response"],
-                done=True,
-                context=data.get("context")
-            )
\ No newline at end of file
+        return OllamaResponse(
+            model=data["model"],
+            created_at=data.get("created_at", ""),
+            response=data["response"],
+            done=True,
+            context=data.get("context")
+        )
+
+    def close(self) -> None:
+        """
+        Close the sync connection pool. The async pool is left open: its
+        connections belong to the event loop that opened them, so only aclose
+        (or `async with`) can close it.
+        """
+        self._client.close()
+
+    async def aclose(self) -> None:
+        """Close both the sync and async connection pools"""
+        self._client.close()
+        await self._async_client.aclose()
+
+    def __enter__(self) -> "OllamaClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "OllamaClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
\ No newline at end of file
@@ -1,11 +1,16 @@
+import sys
 from dataclasses import dataclass
 from typing import List, Dict, Any, Optional
 
-@dataclass
+@dataclass(slots=True)
 class OllamaMessage:
     role: str  # system, assistant, or user
     content: str
 
+    def __post_init__(self):
+        # Roles come from a tiny fixed set, share a single string object for each
+        self.role = sys.intern(self.role)
+
 @dataclass
 class OllamaResponse:
     model: str
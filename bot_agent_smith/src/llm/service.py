@@ -1,27 +1,256 @@
-from dataclasses import dataclass
-from typing import List, Dict, Any, Protocol, Union, Optional
+from dataclasses import dataclass, field
+from operator import itemgetter
+from typing import AsyncIterator, Callable, List, Dict, Any, Protocol, Union, Optional, Tuple
+import asyncio
+import hashlib
+import json
+
+import orjson
 
 from src.orchestration.services.registry import ServiceProtocol
+from src.core.cache import TTLCache
 from src.core.logger import logger
 
+# Fetch role and content in a single C-level call when converting messages
+_get_role_content = itemgetter("role", "content")
+
+# Stdlib decoder, for raw_decode: parses one JSON value and reports where it ends
+_JSON_DECODER = json.JSONDecoder()
+
+# Marks a content block as a cacheable prompt prefix for providers that support it
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def cached_system_message(text: str) -> Dict[str, Any]:
+    """
+    Build a system message whose static text is marked for prompt caching.
+
+    Keep everything request-specific out of it so the prefix stays identical
+    across calls.
+    """
+    return {
+        "role": "system",
+        "content": [{"type": "text", "text": text, "cache_control": CACHE_CONTROL}]
+    }
+
+
+def _first_json(text: str, opening: str, accept: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+    """Parse the first valid JSON value starting at an `opening` character that accept allows"""
+    error = None
+    parsed = False
+    start = text.find(opening)
+    while start >= 0:
+        try:
+            value, _end = _JSON_DECODER.raw_decode(text, start)
+            if accept is None or accept(value):
+                return value
+            parsed = True
+        except json.JSONDecodeError as e:
+            error = e
+        start = text.find(opening, start + 1)
+    if error is not None and not parsed:
+        raise error
+    return None
+
+
+def first_json_array(text: str, accept: Optional[Callable[[List[Any]], bool]] = None) -> Optional[List[Any]]:
+    """
+    First JSON array in a free-text LLM response, parsed in a single pass.
+
+    Decoding starts at each "[" in turn and stops at the end of the array,
+    so prose before or after it (even containing brackets) doesn't matter.
+
+    Args:
+        text: The response text
+        accept: Skip arrays for which this returns False, such as a "[1]"
+            citation ahead of the actual answer
+
+    Returns:
+        The parsed array, or None if the text has no "[" or no accepted array
+
+    Raises:
+        json.JSONDecodeError: If no "[" starts a valid JSON value
+    """
+    return _first_json(text, "[", accept)
+
+
+def first_json_object(text: str, accept: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Optional[Dict[str, Any]]:
+    """Same as first_json_array, for the first JSON object ("{")"""
+    return _first_json(text, "{", accept)
+
+
+def _text_of(content: Union[str, List[Dict[str, Any]]]) -> str:
+    """Flatten structured content blocks into plain text"""
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content)
+
+
+def _flatten(msg: Dict[str, Any]) -> tuple:
+    """Role and plain-text content of a message"""
+    role, content = _get_role_content(msg)
+    return role, _text_of(content)
+
+
+async def send_message_async(client: Any, messages: List[Any], **kwargs: Any) -> Any:
+    """
+    Send messages through the client without blocking the event loop: its
+    send_message_async when it has one, otherwise send_message in a worker thread
+    """
+    send_async = getattr(client, "send_message_async", None)
+    if send_async is not None:
+        return await send_async(messages, **kwargs)
+    return await asyncio.to_thread(client.send_message, messages, **kwargs)
+
+
+def response_key(messages: List[Any], model_family: Optional[str], format: Optional[str]) -> bytes:
+    """
+    Hash of a canonicalized request, used as the response cache key.
+    Messages may be dicts or client message dataclasses.
+    """
+    body = orjson.dumps(
+        {"model_family": model_family, "format": format, "messages": messages},
+        option=orjson.OPT_SORT_KEYS,
+        default=str
+    )
+    return hashlib.blake2b(body, digest_size=16).digest()
 
 @dataclass
 class LLMService(ServiceProtocol):
     """Service for handling LLM interactions"""
     client: Any  # Accept any client, we'll check type at runtime
     model_family: str = None  # The model family this service is associated with
+    # Recent responses keyed on the exact request, so repeated queries skip the LLM
+    response_cache: TTLCache = field(
+        default_factory=lambda: TTLCache(maxsize=1024, ttl=300), repr=False
+    )
+    # Async requests currently waiting on the model, by cache key
+    _inflight: Dict[bytes, "asyncio.Future[str]"] = field(default_factory=dict, init=False, repr=False)
 
-    def execute(self, messages: List[Dict[str, str]], model_family: Optional[str] = None, **kwargs: Any) -> str:
+    def execute(
+        self,
+        messages: List[Dict[str, str]],
+        model_family: Optional[str] = None,
+        format: Optional[str] = None,
+        use_cache: bool = True,
+        **kwargs: Any
+    ) -> str:
         """
         Process messages through LLM
         
         Args:
-            messages: List of message dicts with 'role' and 'content'
+            messages: List of message dicts with 'role' and 'content'. Content may
+                also be a list of text blocks (see cached_system_message)
             model_family: Override model family to use (if None, uses the service's model)
+            format: "json" to request structured JSON output from the model
+            use_cache: Set to False to always query the model
             
         Returns:
             str: LLM response text
         """
+        cache_key, cached, converted_messages = self._prepare(messages, model_family, format, use_cache)
+        if cached is not None:
+            return cached
+        
+        # Send to LLM and get response
+        if format:
+            response = self.client.send_message(converted_messages, format=format)
+        else:
+            response = self.client.send_message(converted_messages)
+        
+        return self._finish(response, cache_key)
+
+    async def execute_async(
+        self,
+        messages: List[Dict[str, str]],
+        model_family: Optional[str] = None,
+        format: Optional[str] = None,
+        use_cache: bool = True,
+        **kwargs: Any
+    ) -> str:
+        """
+        Async version of execute, for workflow nodes running under ainvoke.
+
+        Uses the client's send_message_async when it has one, otherwise runs the
+        blocking call in a worker thread so the event loop stays free. Identical
+        requests arriving while one is already in flight wait for that call
+        instead of issuing their own.
+        """
+        cache_key, cached, converted_messages = self._prepare(messages, model_family, format, use_cache)
+        if cached is not None:
+            return cached
+        
+        if cache_key is None:
+            return await self._send_async(converted_messages, format, cache_key)
+        
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            logger.info("Joining identical in-flight LLM request")
+            return await asyncio.shield(inflight)
+        
+        task = asyncio.ensure_future(self._send_async(converted_messages, format, cache_key))
+        self._inflight[cache_key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        return await asyncio.shield(task)
+
+    async def astream(
+        self,
+        messages: List[Dict[str, str]],
+        model_family: Optional[str] = None,
+        format: Optional[str] = None,
+        use_cache: bool = True,
+        **kwargs: Any
+    ) -> AsyncIterator[str]:
+        """
+        Streaming version of execute_async: yields the response text in chunks
+        as the model generates it, so callers can show the start of the answer
+        before the model has finished.
+
+        Clients without an astream method yield the whole response as one chunk.
+        The full text is cached once the stream completes.
+        """
+        cache_key, cached, converted_messages = self._prepare(messages, model_family, format, use_cache)
+        if cached is not None:
+            yield cached
+            return
+        
+        client_stream = getattr(self.client, "astream", None)
+        if client_stream is None:
+            yield await self._send_async(converted_messages, format, cache_key)
+            return
+        
+        send_kwargs = {"format": format} if format else {}
+        chunks = []
+        async for chunk in client_stream(converted_messages, **send_kwargs):
+            chunks.append(chunk)
+            yield chunk
+        
+        response = "".join(chunks)
+        logger.info("Received streamed response from LLM")
+        logger.info(f"Response content: {response[:100]}...")
+        logger.info("========== LLM SERVICE COMPLETE ==========")
+        
+        if cache_key is not None:
+            self.response_cache.set(cache_key, response)
+
+    async def _send_async(self, converted_messages: List[Any], format: Optional[str], cache_key: Optional[bytes]) -> str:
+        """Send one request to the client without blocking the event loop"""
+        send_kwargs = {"format": format} if format else {}
+        response = await send_message_async(self.client, converted_messages, **send_kwargs)
+        
+        return self._finish(response, cache_key)
+
+    def _prepare(
+        self,
+        messages: List[Dict[str, Any]],
+        model_family: Optional[str],
+        format: Optional[str],
+        use_cache: bool
+    ) -> Tuple[Optional[bytes], Optional[str], List[Any]]:
+        """
+        Look the request up in the response cache and convert the messages for
+        the client. Returns (cache key, cached response or None, converted messages).
+        """
         # Use either the provided model family or the service's model family
         used_model_family = model_family or self.model_family
         
@@ -29,12 +258,19 @@ class LLMService(ServiceProtocol):
         logger.info(f"Processing {len(messages)} messages through LLM")
         logger.info(f"Using {type(self.client).__module__}.{type(self.client).__name__}")
         logger.info(f"Model family: {used_model_family}")
+
+        cache_key = response_key(messages, used_model_family, format) if use_cache else None
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Returning cached LLM response")
+                return cache_key, cached, []
         
         # Log the messages being sent to LLM
         for i, msg in enumerate(messages):
             logger.info(f"Message {i + 1}:")
             logger.info(f"Role: {msg['role']}")
-            logger.info(f"Content: {msg['content'][:100]}...")
+            logger.info(f"Content: {_text_of(msg['content'])[:100]}...")
         
         # Determine client type based on module name
         client_module = type(self.client).__module__
@@ -46,10 +282,7 @@ class LLMService(ServiceProtocol):
             
             # Convert to OllamaMessage objects
             converted_messages = [
-                OllamaMessage(
-                    role=msg["role"],
-                    content=msg["content"]
-                )
+                OllamaMessage(*_flatten(msg))
                 for msg in messages
             ]
             
@@ -59,10 +292,7 @@ class LLMService(ServiceProtocol):
             
             # Convert to GCPMessage objects
             converted_messages = [
-                GCPMessage(
-                    role=msg["role"],
-                    content=msg["content"]
-                )
+                GCPMessage(*_flatten(msg))
                 for msg in messages
             ]
             
@@ -71,16 +301,20 @@ class LLMService(ServiceProtocol):
             logger.warning(f"Unknown LLM client type: {client_module}")
             logger.warning("Trying generic message format...")
             
-            # Assume the client accepts dictionaries
+            # Assume the client accepts dictionaries, passing content blocks
+            # (and their cache markers) through untouched
             converted_messages = messages
         
         logger.info(f"Sending request to LLM client...")
-        
-        # Send to LLM and get response
-        response = self.client.send_message(converted_messages)
-        
+        return cache_key, None, converted_messages
+
+    def _finish(self, response: Any, cache_key: Optional[bytes]) -> str:
+        """Log and cache the client's response, returning its text"""
         logger.info("Received response from LLM")
         logger.info(f"Response content: {response.response[:100]}...")
         logger.info("========== LLM SERVICE COMPLETE ==========")
+
+        if cache_key is not None:
+            self.response_cache.set(cache_key, response.response)
         
-        return response.response
\ No newline at end of file
+        return response.response
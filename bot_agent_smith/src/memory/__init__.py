@@ -36,6 +36,8 @@ def get_vector_db_config() -> Dict[str, Any]:
             "api_key": os.getenv("QDRANT_API_KEY", ""),
             "collection_prefix": os.getenv("QDRANT_COLLECTION_PREFIX", "agent_smith_"),
             "dimensions": int(os.getenv("EMBEDDING_DIMENSION", "384")),
+            "prefer_grpc": os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true",
+            "grpc_port": int(os.getenv("QDRANT_GRPC_PORT", "6334")),
         }
     }
     
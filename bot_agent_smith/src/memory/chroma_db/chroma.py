@@ -1,9 +1,18 @@
 from chromadb import HttpClient
 from chromadb.config import Settings
+from heapq import nlargest
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
 from src.core.types import Message, Conversation, UserProfile, Author
+from src.memory.interfaces import select_recent
+
+def _metadata_epoch(metadata: Dict[str, Any]) -> float:
+    """Message timestamp from stored metadata, for messages stored without timestamp_epoch too"""
+    epoch = metadata.get("timestamp_epoch")
+    if epoch is None:
+        epoch = datetime.fromisoformat(metadata["timestamp"]).timestamp()
+    return epoch
 
 class ChromaClient:
     def __init__(self, host: str = "localhost", port: int = 8184):
@@ -33,6 +42,33 @@ class MessageRepository:
     def __init__(self, client: ChromaClient):
         self.client = client
         self.collection = client.messages
+        self._backfill_timestamp_epoch()
+    
+    def _backfill_timestamp_epoch(self, page_size: int = 1000):
+        """
+        Give messages stored before timestamp_epoch existed their numeric copy,
+        so the since filter of get_by_conversation doesn't drop them. Runs once:
+        the collection metadata records that it's done.
+        """
+        collection_metadata = self.collection.metadata or {}
+        if collection_metadata.get("timestamp_epoch_backfilled"):
+            return
+        
+        offset = 0
+        while True:
+            result = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids, metadatas = [], []
+            for id, metadata in zip(result["ids"], result["metadatas"]):
+                if "timestamp_epoch" not in metadata:
+                    ids.append(id)
+                    metadatas.append({**metadata, "timestamp_epoch": _metadata_epoch(metadata)})
+            if ids:
+                self.collection.update(ids=ids, metadatas=metadatas)
+            if len(result["ids"]) < page_size:
+                break
+            offset += page_size
+        
+        self.collection.modify(metadata={**collection_metadata, "timestamp_epoch_backfilled": True})
     
     def add(self, message: Message):
         metadata = {
@@ -43,6 +79,8 @@ class MessageRepository:
             "author_name": message.author.name,
             "author_discord_id": message.author.discord_id,
             "timestamp": message.timestamp.isoformat(),
+            # Chroma only range-filters numbers, so keep a numeric copy for get_by_conversation
+            "timestamp_epoch": message.timestamp.timestamp(),
             "conversation_id": message.conversation_id,
             "attachments": ",".join(message.attachments)  # Convert list to string
         }
@@ -67,13 +105,28 @@ class MessageRepository:
             
         return Message.from_dict(result["metadatas"][0])
     
-    def get_by_conversation(self, conversation_id: str) -> List[Message]:
+    def get_by_conversation(
+        self,
+        conversation_id: str,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> List[Message]:
+        where = {"conversation_id": conversation_id}
+        if since is not None:
+            # Filtered by Chroma, so older messages never cross the wire
+            where = {"$and": [where, {"timestamp_epoch": {"$gt": since.timestamp()}}]}
+        
         result = self.collection.get(
-            where={"conversation_id": conversation_id},
-            include=["metadatas", "documents"]
+            where=where,
+            include=["metadatas"]
         )
         
-        return [Message.from_dict(metadata) for metadata in result["metadatas"]]
+        # Chroma can't order results, so the limit is applied here, on the raw
+        # metadata so that only the kept messages are built
+        metadatas = result["metadatas"]
+        if limit is not None:
+            metadatas = nlargest(limit, metadatas, key=_metadata_epoch)
+        return select_recent(Message.from_dict(metadata) for metadata in metadatas)
     
     def search(self, query: str, n_results: int = 10) -> List[Message]:
         results = self.collection.query(
@@ -0,0 +1,28 @@
+from typing import List
+
+from src.core.logger import logger
+
+
+class LazyTextEmbedder:
+    """
+    Embeds query text with a SentenceTransformer model loaded on first use.
+    Vectors are L2-normalized to match the stored embeddings.
+    """
+    
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+    
+    def __call__(self, text: str) -> List[float]:
+        return self._get_model().encode(text, normalize_embeddings=True).tolist()
+    
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts in one forward pass"""
+        return self._get_model().encode(texts, normalize_embeddings=True).tolist()
+    
+    def _get_model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+            logger.info(f"Loaded query embedding model {self.model_name}")
+        return self._model
@@ -1,17 +1,347 @@
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Callable
 from datetime import datetime, timedelta, UTC
 import uuid
+import asyncio
 import os
 import json
+import hashlib
 import re
+import atexit
+import threading
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future
 
+import numpy as np
+import google.auth
 from google.cloud import aiplatform
 from google.cloud import firestore
 from google.api_core.exceptions import NotFound
 
 from src.core.types import Message, Conversation, UserProfile, Author
 from src.core.logger import logger
-from src.memory.interfaces import VectorDBClient, MessageRepository as MessageRepositoryInterface, UserRepository as UserRepositoryInterface
+from src.core.cache import TTLCache
+from src.memory.embedder import LazyTextEmbedder
+from src.memory.interfaces import VectorDBClient, MessageRepository as MessageRepositoryInterface, UserRepository as UserRepositoryInterface, select_recent
+
+GCP_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+# Resource names of resolved endpoint/indexes, reused across restarts to skip list() scans
+HANDLE_CACHE_PATH = Path(
+    os.getenv("GCP_VECTOR_HANDLE_CACHE", "~/.cache/agent_smith/vector_handles.json")
+).expanduser()
+
+# Document fields needed to rebuild records without their stored embeddings
+MESSAGE_FIELDS = [
+    "id", "content", "type", "author_id", "author_name", "author_discord_id",
+    "timestamp", "conversation_id", "attachments",
+]
+USER_FIELDS = [
+    "id", "name", "discord_id", "interests", "conversation_ids",
+    "created_at", "last_interaction",
+]
+
+# Firestore caps array_contains_any at a small number of values
+MAX_KEYWORD_TOKENS = 10
+
+# Newest message ids kept in a conversation's index document, well under
+# Firestore's 1 MiB document limit. Longer histories are listed by query.
+MAX_INDEXED_MESSAGES = 5000
+
+# Words of three or more characters; \w keeps accented letters
+_TOKEN_RE = re.compile(r"\w{3,}")
+
+
+def _tokenize(text: str) -> List[str]:
+    """Distinct lowercased words longer than two characters, capped for Firestore"""
+    tokens = dict.fromkeys(_TOKEN_RE.findall(text.lower()))
+    return list(tokens)[:MAX_KEYWORD_TOKENS]
+
+
+def quantize_int8(vector: List[float]) -> tuple:
+    """
+    Scalar-quantize a vector to one byte per dimension.
+    
+    Returns:
+        (codes, scale, offset) where vector ~= codes * scale + offset
+    """
+    values = np.asarray(vector, dtype=np.float32)
+    offset = float(values.min())
+    scale = float(values.max() - offset) / 255 or 1.0
+    codes = np.rint((values - offset) / scale).astype(np.uint8)
+    return codes.tobytes(), scale, offset
+
+
+def dequantize_int8(codes: bytes, scale: float, offset: float) -> List[float]:
+    """Reconstruct an approximate float vector from quantize_int8 output"""
+    return (np.frombuffer(codes, dtype=np.uint8).astype(np.float32) * scale + offset).tolist()
+
+
+class _StoredEmbedding(list):
+    """
+    An embedding rebuilt from its int8 copy in Firestore. It only approximates
+    the full-precision vector in Vertex AI, so it must never replace it there.
+    """
+
+
+def _index_vector(index_endpoint, deployed_index_id: str, id: str, embedding: List[float]) -> List[float]:
+    """
+    Vector to upsert for an item. An embedding read back from storage is
+    swapped for the full-precision vector the index already holds, falling
+    back to the int8 copy only when the index has none.
+    """
+    if not isinstance(embedding, _StoredEmbedding):
+        return embedding
+    try:
+        datapoints = index_endpoint.read_index_datapoints(deployed_index_id=deployed_index_id, ids=[id])
+    except Exception as e:
+        logger.warning(f"Couldn't read the indexed vector of {id}, using its stored int8 copy: {e}")
+        datapoints = None
+    if datapoints:
+        return list(datapoints[0].feature_vector)
+    return list(embedding)
+
+
+def _pack_embedding(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Store the embedding int8-quantized (4x smaller than float32). Vertex AI
+    still receives the full-precision vector for indexing.
+    """
+    embedding = data.pop("embedding", None)
+    if embedding:
+        codes, scale, offset = quantize_int8(embedding)
+        data["embedding_q8"] = codes
+        data["embedding_scale"] = scale
+        data["embedding_offset"] = offset
+    return data
+
+
+def _unpack_embedding(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Restore the embedding list from its stored form (quantized, packed float32 or a float list)"""
+    codes = data.pop("embedding_q8", None)
+    scale = data.pop("embedding_scale", None)
+    offset = data.pop("embedding_offset", None)
+    packed = data.pop("embedding_bytes", None)
+    if codes:
+        data["embedding"] = _StoredEmbedding(dequantize_int8(codes, scale, offset))
+    elif packed:
+        data["embedding"] = np.frombuffer(packed, dtype=np.float32).tolist()
+    return data
+
+
+def _ids_by_timestamp(snapshots) -> List[str]:
+    """Document ids of message snapshots (with their timestamp field), oldest first"""
+    return [snapshot.id for snapshot in sorted(snapshots, key=lambda snapshot: snapshot.get("timestamp"))]
+
+
+def _bulk_delete(firestore_client, collection, ids: List[str]):
+    """
+    Delete documents with a BulkWriter: non-atomic, parallel and retried,
+    without the 500-operation cap of a WriteBatch
+    """
+    bulk_writer = firestore_client.bulk_writer()
+    for id in ids:
+        bulk_writer.delete(collection.document(id))
+    bulk_writer.close()
+
+
+def _iter_pages(query, page_size: int):
+    """Yield document dicts from a query page by page, ordered by document ID"""
+    query = query.order_by("__name__").limit(page_size)
+    last = None
+    while True:
+        page = query.start_after(last) if last else query
+        docs = list(page.stream())
+        if not docs:
+            return
+        for doc in docs:
+            yield doc.to_dict()
+        if len(docs) < page_size:
+            return
+        last = docs[-1]
+
+
+def _to_chroma_format(docs) -> Dict[str, Any]:
+    """Collect document dicts into the Chroma get() result shape"""
+    data = {"ids": [], "metadatas": []}
+    for doc_dict in docs:
+        data["ids"].append(doc_dict["id"])
+        data["metadatas"].append(doc_dict)
+    return data
+
+
+class _EmbeddingBuffer:
+    """
+    Accumulates vector upserts and removals for one index and sends them in
+    batches, flushing when max_batch items are pending or max_latency_ms after
+    the first pending item, whichever comes first. Items from a failed call are
+    queued again and retried with exponential backoff.
+    """
+    
+    # Longest wait between retries of a failing index
+    MAX_RETRY_DELAY = 60.0
+    
+    def __init__(self, index, max_batch: int = 1000, max_latency_ms: int = 500):
+        self.index = index
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1000
+        self._upserts: Dict[str, tuple] = {}
+        self._removals: set = set()
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._retry_delay: Optional[float] = None
+    
+    def add(self, id: str, embedding: List[float], metadata: Dict[str, Any]):
+        """Queue an embedding upsert"""
+        with self._lock:
+            self._removals.discard(id)
+            self._upserts[id] = (embedding, metadata)
+            full = self._pending() >= self.max_batch
+            if not full:
+                self._schedule()
+        if full:
+            self._flush_quietly()
+    
+    def remove(self, ids: List[str]):
+        """Queue embedding removals"""
+        with self._lock:
+            for id in ids:
+                self._upserts.pop(id, None)
+                self._removals.add(id)
+            full = self._pending() >= self.max_batch
+            if not full:
+                self._schedule()
+        if full:
+            self._flush_quietly()
+    
+    def flush(self):
+        """
+        Send all pending upserts and removals to the index. If either call
+        fails, its items are queued again for a later retry and the error is
+        raised once both have been attempted.
+        """
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            upserts, self._upserts = self._upserts, {}
+            removals, self._removals = self._removals, set()
+        
+        error = None
+        if upserts:
+            ids = list(upserts)
+            try:
+                self.index.upsert_embeddings(
+                    embeddings=[upserts[id][0] for id in ids],
+                    ids=ids,
+                    metadata_list=[upserts[id][1] for id in ids]
+                )
+                logger.debug(f"Flushed {len(ids)} embeddings to vector index")
+            except Exception as e:
+                logger.error(f"Failed to upsert {len(ids)} embeddings, will retry: {e}")
+                error = e
+            else:
+                upserts = {}
+        
+        # Removals are independent of the upserts, so send them either way
+        if removals:
+            try:
+                self.index.remove_embeddings(ids=list(removals))
+                logger.debug(f"Removed {len(removals)} embeddings from vector index")
+            except Exception as e:
+                logger.error(f"Failed to remove {len(removals)} embeddings, will retry: {e}")
+                error = error or e
+            else:
+                removals = set()
+        
+        with self._lock:
+            if error is None:
+                self._retry_delay = None
+            else:
+                self._requeue(upserts, removals)
+                self._retry_delay = min(2 * (self._retry_delay or self.max_latency), self.MAX_RETRY_DELAY)
+            if self._pending():
+                self._schedule()
+        if error is not None:
+            raise error
+    
+    def _requeue(self, upserts: Dict[str, tuple], removals: set):
+        # Caller holds the lock. Anything queued since the failed call is newer and wins.
+        for id, upsert in upserts.items():
+            if id not in self._upserts and id not in self._removals:
+                self._upserts[id] = upsert
+        for id in removals:
+            if id not in self._upserts:
+                self._removals.add(id)
+    
+    def _flush_quietly(self):
+        """Flush for the timer and full batches, where the caller can't act on a failure"""
+        try:
+            self.flush()
+        except Exception:
+            pass  # Already logged, and the items are queued for a retry
+    
+    def _pending(self) -> int:
+        return len(self._upserts) + len(self._removals)
+    
+    def _schedule(self):
+        # Caller holds the lock
+        if self._timer is None:
+            self._timer = threading.Timer(self._retry_delay or self.max_latency, self._flush_quietly)
+            self._timer.daemon = True
+            self._timer.start()
+
+
+class _SearchCoalescer:
+    """
+    Gathers search calls arriving within window_ms of each other and runs them
+    as one batched query. A search arriving while no batch is running is sent
+    right away; otherwise the first caller in a window waits out the window and
+    dispatches the batch, and later callers block on their result.
+    """
+    
+    def __init__(self, search_many: Callable[[List[str], int], List[List[Any]]], window_ms: int = 5):
+        self.search_many = search_many
+        self.window = window_ms / 1000
+        self._pending: List[tuple] = []
+        self._running = 0
+        self._lock = threading.Lock()
+    
+    def submit(self, query: str, n_results: int) -> List[Any]:
+        """Queue a query and return its results once its batch has run"""
+        future = Future()
+        with self._lock:
+            self._pending.append((query, n_results, future))
+            leader = len(self._pending) == 1
+            # Nothing to batch with when no other search is in flight
+            busy = self._running > 0
+        
+        if leader:
+            if busy:
+                time.sleep(self.window)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._running += 1
+            try:
+                self._dispatch(batch)
+            finally:
+                with self._lock:
+                    self._running -= 1
+        
+        return future.result()
+    
+    def _dispatch(self, batch: List[tuple]):
+        try:
+            n_results = max(n for _, n, _ in batch)
+            results = self.search_many([query for query, _, _ in batch], n_results)
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        
+        for (_, n, future), result in zip(batch, results):
+            future.set_result(result[:n])
+
 
 class GCPVectorSearchClient(VectorDBClient):
     """Client for Google Vertex AI Vector Search with Firestore metadata storage"""
@@ -24,6 +354,8 @@ class GCPVectorSearchClient(VectorDBClient):
         messages_index_id: str = "messages-index",
         users_index_id: str = "users-index",
         dimensions: int = 384,  # Default embedding dimension
+        embedding_function: Optional[Callable[[str], List[float]]] = None,
+        embedding_model_name: str = "all-MiniLM-L6-v2",
     ):
         """
         Initialize the GCP Vector Search client
@@ -35,21 +367,31 @@ class GCPVectorSearchClient(VectorDBClient):
             messages_index_id: ID of the messages index
             users_index_id: ID of the users index
             dimensions: Dimension of the embeddings
+            embedding_function: Callable turning query text into an embedding;
+                defaults to a lazily loaded SentenceTransformer
+            embedding_model_name: Model used by the default embedding function
         """
         self.project_id = project_id
         self.location = location
         self.dimensions = dimensions
+        self.embedding_function = embedding_function or LazyTextEmbedder(embedding_model_name)
+        
+        # Resolve credentials once and share them, so each client skips its own token exchange
+        self.credentials, _ = google.auth.default(scopes=GCP_SCOPES)
         
         # Initialize Vertex AI client
-        aiplatform.init(project=project_id, location=location)
+        aiplatform.init(project=project_id, location=location, credentials=self.credentials)
         
-        # Initialize Firestore client
-        self.firestore_client = firestore.Client(project=project_id)
+        # Initialize Firestore clients; the async one serves reads from event loop code
+        self.firestore_client = firestore.Client(project=project_id, credentials=self.credentials)
+        self.async_firestore_client = firestore.AsyncClient(project=project_id, credentials=self.credentials)
         
         # Set up references to Firestore collections
         self.messages_collection = self.firestore_client.collection("messages")
         self.conversations_collection = self.firestore_client.collection("conversations")
         self.users_collection = self.firestore_client.collection("users")
+        self.discord_index_collection = self.firestore_client.collection("discord_index")
+        self.conversation_index_collection = self.firestore_client.collection("conversation_index")
         
         # Set up Vector Search indexes and endpoints
         self.index_endpoint_name = index_endpoint_name
@@ -59,13 +401,22 @@ class GCPVectorSearchClient(VectorDBClient):
         # Initialize or get Vector Search endpoint and indexes
         self._init_vector_search()
         
+        # Batch vector writes per index
+        self.messages_buffer = _EmbeddingBuffer(self.messages_index)
+        self.users_buffer = _EmbeddingBuffer(self.users_index)
+        atexit.register(self.flush)
+        
         # Create index handles for convenient access
         self.messages = MessageIndexHandle(
             self.messages_collection,
             self.index_endpoint,
-            self.messages_index,
+            self.messages_buffer,
             self.dimensions,
-            self.firestore_client
+            self.firestore_client,
+            deployed_index_id=self.messages_index_id,
+            embedding_function=self.embedding_function,
+            async_firestore_client=self.async_firestore_client,
+            conversation_index=self.conversation_index_collection
         )
         
         self.conversations = ConversationIndexHandle(
@@ -76,49 +427,101 @@ class GCPVectorSearchClient(VectorDBClient):
         self.users = UserIndexHandle(
             self.users_collection,
             self.index_endpoint,
-            self.users_index,
+            self.users_buffer,
             self.dimensions,
-            self.firestore_client
+            self.firestore_client,
+            discord_index=self.discord_index_collection,
+            async_firestore_client=self.async_firestore_client,
+            deployed_index_id=self.users_index_id
         )
         
         logger.info(f"Initialized GCP Vector Search client for project {project_id}")
     
     def _init_vector_search(self):
         """Initialize or get Vector Search endpoint and indexes"""
+        if not self._load_cached_handles():
+            self._discover_vector_search()
+            self._save_cached_handles()
+            
+        # Deploy indexes to endpoint if needed
+        self._deploy_indexes()
+    
+    def _handle_cache_key(self) -> str:
+        """Key identifying this client's resources in the handle cache"""
+        return "/".join([
+            self.project_id,
+            self.location,
+            self.index_endpoint_name,
+            self.messages_index_id,
+            self.users_index_id
+        ])
+    
+    def _read_handle_cache(self) -> Dict[str, Any]:
+        try:
+            return json.loads(HANDLE_CACHE_PATH.read_text())
+        except (OSError, ValueError):
+            return {}
+    
+    def _load_cached_handles(self) -> bool:
+        """Build endpoint and index handles from cached resource names"""
+        cached = self._read_handle_cache().get(self._handle_cache_key())
+        if not cached:
+            return False
+        
+        try:
+            self.index_endpoint = aiplatform.MatchingEngineIndexEndpoint(cached["endpoint"])
+            self.messages_index = aiplatform.MatchingEngineIndex(cached["messages_index"])
+            self.users_index = aiplatform.MatchingEngineIndex(cached["users_index"])
+        except (NotFound, KeyError) as e:
+            logger.warning(f"Cached vector search handles are stale, rediscovering: {e}")
+            return False
+        
+        logger.info("Loaded vector search handles from cache")
+        return True
+    
+    def _save_cached_handles(self):
+        """Persist the resolved resource names for the next start"""
+        cache = self._read_handle_cache()
+        cache[self._handle_cache_key()] = {
+            "endpoint": self.index_endpoint.resource_name,
+            "messages_index": self.messages_index.resource_name,
+            "users_index": self.users_index.resource_name
+        }
+        try:
+            HANDLE_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            HANDLE_CACHE_PATH.write_text(json.dumps(cache))
+        except OSError as e:
+            logger.warning(f"Could not write vector search handle cache: {e}")
+    
+    def _discover_vector_search(self):
+        """Find or create the endpoint and indexes by listing existing resources"""
         # Get or create index endpoint
-        endpoint_exists = False
-        index_endpoints = aiplatform.MatchingEngineIndexEndpoint.list()
-        
-        for endpoint in index_endpoints:
-            if endpoint.display_name == self.index_endpoint_name:
-                self.index_endpoint = endpoint
-                endpoint_exists = True
-                logger.info(f"Found existing index endpoint: {self.index_endpoint_name}")
-                break
-                
-        if not endpoint_exists:
+        endpoints_by_name = {
+            endpoint.display_name: endpoint
+            for endpoint in aiplatform.MatchingEngineIndexEndpoint.list()
+        }
+        self.index_endpoint = endpoints_by_name.get(self.index_endpoint_name)
+        
+        if self.index_endpoint:
+            logger.info(f"Found existing index endpoint: {self.index_endpoint_name}")
+        else:
             logger.info(f"Creating new index endpoint: {self.index_endpoint_name}")
             self.index_endpoint = aiplatform.MatchingEngineIndexEndpoint.create(
                 display_name=self.index_endpoint_name,
                 public_endpoint_enabled=True  # Enable public endpoint
             )
         
-        # Get or create message index
-        messages_index_exists = False
-        users_index_exists = False
-        
-        indexes = aiplatform.MatchingEngineIndex.list()
-        for index in indexes:
-            if index.display_name == self.messages_index_id:
-                self.messages_index = index
-                messages_index_exists = True
-                logger.info(f"Found existing messages index: {self.messages_index_id}")
-            elif index.display_name == self.users_index_id:
-                self.users_index = index
-                users_index_exists = True
-                logger.info(f"Found existing users index: {self.users_index_id}")
-                
-        if not messages_index_exists:
+        # Get or create message and user indexes
+        indexes_by_name = {
+            index.display_name: index
+            for index in aiplatform.MatchingEngineIndex.list()
+        }
+        self.messages_index = indexes_by_name.get(self.messages_index_id)
+        self.users_index = indexes_by_name.get(self.users_index_id)
+        
+        if self.messages_index:
+            logger.info(f"Found existing messages index: {self.messages_index_id}")
+        else:
             logger.info(f"Creating new messages index: {self.messages_index_id}")
             self.messages_index = aiplatform.MatchingEngineIndex.create_tree_ah_index(
                 display_name=self.messages_index_id,
@@ -128,7 +531,9 @@ class GCPVectorSearchClient(VectorDBClient):
                 distance_measure_type="DOT_PRODUCT_DISTANCE"
             )
         
-        if not users_index_exists:
+        if self.users_index:
+            logger.info(f"Found existing users index: {self.users_index_id}")
+        else:
             logger.info(f"Creating new users index: {self.users_index_id}")
             self.users_index = aiplatform.MatchingEngineIndex.create_tree_ah_index(
                 display_name=self.users_index_id,
@@ -137,30 +542,43 @@ class GCPVectorSearchClient(VectorDBClient):
                 approximate_neighbors_count=150,
                 distance_measure_type="DOT_PRODUCT_DISTANCE"
             )
-            
-        # Deploy indexes to endpoint if needed
-        self._deploy_indexes()
     
     def _deploy_indexes(self):
         """Deploy indexes to the endpoint if not already deployed"""
-        # Get list of deployed indexes
-        deployed_indexes = [index.index for index in self.index_endpoint.deployed_indexes]
-        
-        # Deploy messages index if not already deployed
-        if self.messages_index.name not in deployed_indexes:
-            logger.info(f"Deploying messages index to endpoint")
-            self.index_endpoint.deploy_index(
-                index=self.messages_index,
-                deployed_index_id=self.messages_index_id
-            )
+        # Resource names of the indexes already deployed
+        deployed_indexes = {index.index for index in self.index_endpoint.deployed_indexes}
         
-        # Deploy users index if not already deployed
-        if self.users_index.name not in deployed_indexes:
-            logger.info(f"Deploying users index to endpoint")
-            self.index_endpoint.deploy_index(
-                index=self.users_index,
-                deployed_index_id=self.users_index_id
+        pending = [
+            (name, index, deployed_index_id)
+            for name, index, deployed_index_id in (
+                ("messages", self.messages_index, self.messages_index_id),
+                ("users", self.users_index, self.users_index_id),
             )
+            if index.resource_name not in deployed_indexes
+        ]
+        if not pending:
+            return
+        
+        # Each deployment takes minutes, so run them side by side and wait for all
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            futures = []
+            for name, index, deployed_index_id in pending:
+                logger.info(f"Deploying {name} index to endpoint")
+                futures.append(executor.submit(
+                    self.index_endpoint.deploy_index,
+                    index=index,
+                    deployed_index_id=deployed_index_id
+                ))
+            
+            for future in futures:
+                future.result()
+    
+    def flush(self):
+        """Send any buffered vector upserts and removals"""
+        try:
+            self.messages_buffer.flush()
+        finally:
+            self.users_buffer.flush()
     
     def get_messages(self, **kwargs) -> Dict[str, Any]:
         """Get messages collection data"""
@@ -182,41 +600,62 @@ class MessageIndexHandle:
         self, 
         collection, 
         index_endpoint, 
-        index,
+        buffer: _EmbeddingBuffer,
         dimensions: int,
-        firestore_client
+        firestore_client,
+        deployed_index_id: str,
+        embedding_function: Callable[[str], List[float]],
+        async_firestore_client,
+        conversation_index
     ):
         self.collection = collection
         self.index_endpoint = index_endpoint
-        self.index = index
+        self.buffer = buffer
         self.dimensions = dimensions
         self.firestore_client = firestore_client
+        self.deployed_index_id = deployed_index_id
+        self.embedding_function = embedding_function
+        self.async_firestore_client = async_firestore_client
+        self.async_collection = async_firestore_client.collection(collection.id)
+        self.conversation_index = conversation_index
+        self.async_conversation_index = async_firestore_client.collection(conversation_index.id)
+        self._cache = TTLCache(maxsize=4096, ttl=60)
+        self._coalescer = _SearchCoalescer(self.search_many)
+        # Conversations whose index document is known to hold their full history
+        self._indexed: set = set()
     
     def add(self, message: Message):
         """Add a message to the index and Firestore"""
-        # Convert message to a dictionary
-        message_dict = message.to_dict()
+        # Convert message to a dictionary, with keyword tokens for server-side matching
+        message_dict = _pack_embedding(message.to_dict())
+        message_dict["tokens"] = _tokenize(message.content)
         
-        # Store in Firestore
+        # Store in Firestore and append to the conversation's message list
         self.collection.document(message.id).set(message_dict)
+        self._index_message(message)
+        self._cache.pop(message.id)
         
-        # Add to vector index if embedding exists
+        # Queue for the vector index if embedding exists
         if message.embedding:
-            self.index.upsert_embeddings(
-                embeddings=[message.embedding],
-                ids=[message.id],
-                metadata_list=[{
+            self.buffer.add(
+                message.id,
+                _index_vector(self.index_endpoint, self.deployed_index_id, message.id, message.embedding),
+                {
                     "id": message.id,
                     "conversation_id": message.conversation_id,
                     "type": message.type.value,
                     "author_id": message.author.id
-                }]
+                }
             )
         else:
             logger.warning(f"No embedding for message {message.id}, skipping vector index")
     
     def get(self, message_id: str) -> Optional[Message]:
         """Get a message by ID"""
+        cached = self._cache.get(message_id)
+        if cached is not None:
+            return cached
+        
         # Get from Firestore
         doc_ref = self.collection.document(message_id)
         doc = doc_ref.get()
@@ -224,65 +663,229 @@ class MessageIndexHandle:
         if not doc.exists:
             return None
             
-        return Message.from_dict(doc.to_dict())
+        message = Message.from_dict(_unpack_embedding(doc.to_dict()))
+        self._cache.set(message_id, message)
+        return message
     
-    def get_by_conversation(self, conversation_id: str) -> List[Message]:
-        """Get all messages in a conversation"""
-        # Query Firestore
-        query = self.collection.where("conversation_id", "==", conversation_id)
-        docs = query.stream()
+    async def aget(self, message_id: str) -> Optional[Message]:
+        """Get a message by ID without blocking the event loop"""
+        cached = self._cache.get(message_id)
+        if cached is not None:
+            return cached
+        
+        doc = await self.async_collection.document(message_id).get()
+        if not doc.exists:
+            return None
         
-        return [Message.from_dict(doc.to_dict()) for doc in docs]
+        message = Message.from_dict(_unpack_embedding(doc.to_dict()))
+        self._cache.set(message_id, message)
+        return message
     
-    def search(self, query: str, n_results: int = 10) -> List[Message]:
+    async def aget_many(self, ids: List[str]) -> List[Message]:
+        """Get several messages by ID concurrently, preserving the order of ids"""
+        messages = await asyncio.gather(*(self.aget(id) for id in ids))
+        return [message for message in messages if message]
+    
+    async def aget_by_conversation(self, conversation_id: str) -> List[Message]:
+        """Get all messages in a conversation without blocking the event loop"""
+        entry = (await self.async_conversation_index.document(conversation_id).get()).to_dict() or {}
+        if entry.get("backfilled") and not entry.get("truncated"):
+            ids = entry["message_ids"]
+        else:
+            # Incomplete list; get_by_conversation rebuilds it, this path only reads
+            query = self.async_collection.where("conversation_id", "==", conversation_id).select(["timestamp"])
+            ids = _ids_by_timestamp([doc async for doc in query.stream()])
+        if not ids:
+            return []
+        
+        docs = {}
+        async for snapshot in self.async_firestore_client.get_all(
+            [self.async_collection.document(id) for id in ids],
+            field_paths=MESSAGE_FIELDS
+        ):
+            if snapshot.exists:
+                docs[snapshot.id] = snapshot.to_dict()
+        
+        return [Message.from_dict(docs[id]) for id in ids if id in docs]
+    
+    def get_by_conversation(
+        self,
+        conversation_id: str,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> List[Message]:
+        """
+        Get the messages in a conversation without their embeddings, oldest
+        first, optionally only recent ones
         """
-        Search for messages similar to the query
+        # Point read of the conversation's message ids, then one batched read for the
+        # documents. Ids of deleted messages may linger there; _get_many skips them.
+        ids = self._conversation_ids(conversation_id, limit)
+        messages = self._get_many(ids, fields=MESSAGE_FIELDS)
+        if since is None and limit is None:
+            return messages
+        return select_recent(messages, since=since, limit=limit)
+    
+    def _conversation_ids(self, conversation_id: str, limit: Optional[int] = None) -> List[str]:
+        """Ids of a conversation's messages, oldest first; only the newest limit when given"""
+        entry_ref = self.conversation_index.document(conversation_id)
+        entry = entry_ref.get().to_dict() or {}
+        if not entry.get("backfilled"):
+            entry = self._backfill(conversation_id)
+        
+        ids = entry.get("message_ids", [])
+        if len(ids) > MAX_INDEXED_MESSAGES:
+            # ArrayRemove rather than a rewrite, so concurrent appends aren't lost
+            entry_ref.update({
+                "message_ids": firestore.ArrayRemove(ids[:-MAX_INDEXED_MESSAGES]),
+                "truncated": True
+            })
+            ids = ids[-MAX_INDEXED_MESSAGES:]
+            entry["truncated"] = True
+        
+        # Ids are appended as messages are stored, so the newest are at the end
+        if limit is not None:
+            return ids[-limit:]
+        if entry.get("truncated"):
+            query = self.collection.where("conversation_id", "==", conversation_id).select(["timestamp"])
+            return _ids_by_timestamp(query.stream())
+        return ids
+    
+    def _index_message(self, message: Message):
+        """Append a stored message to its conversation's id list"""
+        conversation_id = message.conversation_id
+        if conversation_id not in self._indexed:
+            entry = self.conversation_index.document(conversation_id).get(field_paths=["backfilled"])
+            if not (entry.to_dict() or {}).get("backfilled"):
+                # Either a new conversation or one stored before the index existed
+                self._backfill(conversation_id)
+            self._indexed.add(conversation_id)
         
-        Note: This is a simplified implementation that assumes embeddings
-        are generated elsewhere before adding to the index.
+        self.conversation_index.document(conversation_id).set(
+            {"message_ids": firestore.ArrayUnion([message.id])}, merge=True
+        )
+    
+    def _backfill(self, conversation_id: str) -> Dict[str, Any]:
         """
-        # For this example, we'll use a simple keyword search in Firestore
-        # In a real implementation, you would:
-        # 1. Generate an embedding for the query
-        # 2. Search the vector index using the embedding
-        # 3. Return the matched documents
+        Rebuild a conversation's id list from its stored messages, oldest
+        first. The transaction keeps messages indexed meanwhile from being
+        overwritten.
+        """
+        entry_ref = self.conversation_index.document(conversation_id)
+        query = self.collection.where("conversation_id", "==", conversation_id).select(["timestamp"])
         
-        logger.warning("Vector search not fully implemented - using keyword fallback")
+        @firestore.transactional
+        def rebuild(transaction) -> Dict[str, Any]:
+            entry = entry_ref.get(transaction=transaction).to_dict() or {}
+            if entry.get("backfilled"):
+                return entry
+            ids = _ids_by_timestamp(query.stream(transaction=transaction))
+            entry = {
+                "message_ids": ids[-MAX_INDEXED_MESSAGES:],
+                "backfilled": True,
+                "truncated": len(ids) > MAX_INDEXED_MESSAGES
+            }
+            transaction.set(entry_ref, entry)
+            return entry
         
-        # Simple keyword search fallback
-        query_words = query.lower().split()
-        results = []
+        return rebuild(self.firestore_client.transaction())
+    
+    def search(self, query: str, n_results: int = 10) -> List[Message]:
+        """Search for messages similar to the query using the vector index"""
+        # Concurrent searches are batched into a single search_many call
+        try:
+            return self._coalescer.submit(query, n_results)
+        except Exception as e:
+            logger.warning(f"Vector search failed, using keyword fallback: {e}")
+            return self.keyword_search(query, n_results)
+    
+    def search_many(self, queries: List[str], n_results: int = 10) -> List[List[Message]]:
+        """Run several vector searches in one find_neighbors call and one document read"""
+        if not queries:
+            return []
         
-        # Query all messages (inefficient for production)
-        all_docs = self.collection.stream()
+        embed_batch = getattr(self.embedding_function, "embed_batch", None)
+        if embed_batch:
+            query_embeddings = embed_batch(queries)
+        else:
+            query_embeddings = [self.embedding_function(query) for query in queries]
         
-        for doc in all_docs:
-            data = doc.to_dict()
-            content = data.get("content", "").lower()
-            
-            # Simple relevance score based on word matches
-            score = sum(1 for word in query_words if word in content)
-            
-            if score > 0:
-                results.append((score, Message.from_dict(data)))
+        neighbors = self.index_endpoint.find_neighbors(
+            deployed_index_id=self.deployed_index_id,
+            queries=query_embeddings,
+            num_neighbors=n_results
+        ) or []
+        neighbor_ids = [[neighbor.id for neighbor in matches] for matches in neighbors]
+        neighbor_ids += [[]] * (len(queries) - len(neighbor_ids))
+        
+        # Fetch every distinct hit once, then split the results back per query
+        messages = {
+            message.id: message
+            for message in self._get_many(list(dict.fromkeys(id for ids in neighbor_ids for id in ids)))
+        }
+        return [[messages[id] for id in ids if id in messages] for ids in neighbor_ids]
+    
+    def keyword_search(self, query: str, n_results: int = 10) -> List[Message]:
+        """
+        Keyword search against the stored token arrays. Firestore narrows the
+        candidates server-side; only that small set is scored in Python.
+        """
+        query_tokens = _tokenize(query)
+        if not query_tokens:
+            return []
+        
+        docs = (
+            self.collection
+            .where("tokens", "array_contains_any", query_tokens)
+            .limit(n_results * 8)
+            .stream()
+        )
+        
+        results = []
+        for doc in docs:
+            data = _unpack_embedding(doc.to_dict())
+            score = len(set(query_tokens).intersection(data.get("tokens", [])))
+            results.append((score, Message.from_dict(data)))
         
         # Sort by relevance and limit to n_results
         results.sort(reverse=True, key=lambda x: x[0])
         return [msg for _, msg in results[:n_results]]
     
+    def _get_many(self, ids: List[str], fields: Optional[List[str]] = None) -> List[Message]:
+        """
+        Fetch several messages in one batched read, preserving the order of ids.
+        When fields is given, only those document fields are read.
+        """
+        if not ids:
+            return []
+        
+        snapshots = self.firestore_client.get_all(
+            [self.collection.document(id) for id in ids],
+            field_paths=fields
+        )
+        docs = {
+            snapshot.id: _unpack_embedding(snapshot.to_dict())
+            for snapshot in snapshots if snapshot.exists
+        }
+        
+        return [Message.from_dict(docs[id]) for id in ids if id in docs]
+    
+    def _invalidate(self, ids: List[str]):
+        """Drop cached messages for the given IDs"""
+        for id in ids:
+            self._cache.pop(id)
+    
     def delete(self, ids: List[str] = None):
         """Delete messages by ID"""
         if not ids:
             return
             
         # Delete from Firestore
-        batch = self.firestore_client.batch()
-        for id in ids:
-            batch.delete(self.collection.document(id))
-        batch.commit()
+        _bulk_delete(self.firestore_client, self.collection, ids)
+        self._invalidate(ids)
         
-        # Delete from vector index
-        self.index.remove_embeddings(ids=ids)
+        # Queue removal from vector index
+        self.buffer.remove(ids)
 
 
 class MessageRepository(MessageRepositoryInterface):
@@ -300,13 +903,30 @@ class MessageRepository(MessageRepositoryInterface):
         """Get a message by ID"""
         return self.collection.get(message_id)
     
-    def get_by_conversation(self, conversation_id: str) -> List[Message]:
-        """Get all messages in a conversation"""
-        return self.collection.get_by_conversation(conversation_id)
+    def get_by_conversation(
+        self,
+        conversation_id: str,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> List[Message]:
+        """Get the messages in a conversation, oldest first, optionally only recent ones"""
+        return self.collection.get_by_conversation(conversation_id, since=since, limit=limit)
+    
+    async def aget(self, message_id: str) -> Optional[Message]:
+        """Get a message by ID from async code"""
+        return await self.collection.aget(message_id)
+    
+    async def aget_by_conversation(self, conversation_id: str) -> List[Message]:
+        """Get all messages in a conversation from async code"""
+        return await self.collection.aget_by_conversation(conversation_id)
     
     def search(self, query: str, n_results: int = 10) -> List[Message]:
         """Search for messages similar to the query"""
         return self.collection.search(query, n_results)
+    
+    def search_many(self, queries: List[str], n_results: int = 10) -> List[List[Message]]:
+        """Search for messages similar to each of several queries in one batch"""
+        return self.collection.search_many(queries, n_results)
 
 
 class UserRepository(UserRepositoryInterface):
@@ -320,30 +940,25 @@ class UserRepository(UserRepositoryInterface):
         """Add a user to the repository"""
         self.collection.add(user)
     
-    def get(self, user_id: str) -> Optional[UserProfile]:
-        """Get a user by ID"""
+    def get(self, user_id: str = None) -> Optional[Union[UserProfile, Dict[str, Any]]]:
+        """Get a user by ID, or all users in Chroma API format when no ID is given"""
         return self.collection.get(user_id)
     
     def get_by_discord_id(self, discord_id: str) -> Optional[UserProfile]:
         """Get a user by Discord ID"""
         return self.collection.get_by_discord_id(discord_id)
     
+    async def aget(self, user_id: str) -> Optional[UserProfile]:
+        """Get a user by ID from async code"""
+        return await self.collection.aget(user_id)
+    
+    async def aget_by_discord_id(self, discord_id: str) -> Optional[UserProfile]:
+        """Get a user by Discord ID from async code"""
+        return await self.collection.aget_by_discord_id(discord_id)
+    
     def update(self, user: UserProfile) -> None:
         """Update a user in the repository"""
         self.collection.update(user)
-    
-    def get(self, include=None):
-        """Get all messages - compatible with Chroma API"""
-        # Get all documents from Firestore
-        docs = self.collection.stream()
-        data = {"ids": [], "metadatas": []}
-        
-        for doc in docs:
-            doc_dict = doc.to_dict()
-            data["ids"].append(doc_dict["id"])
-            data["metadatas"].append(doc_dict)
-            
-        return data
 
 
 class ConversationIndexHandle:
@@ -374,15 +989,12 @@ class ConversationIndexHandle:
             return Conversation.from_dict(doc.to_dict())
         else:
             # Get all conversations (for compatibility with Chroma API)
-            docs = self.collection.stream()
-            data = {"ids": [], "metadatas": []}
-            
-            for doc in docs:
-                doc_dict = doc.to_dict()
-                data["ids"].append(doc_dict["id"])
-                data["metadatas"].append(doc_dict)
-                
-            return data
+            logger.warning("Loading every conversation into memory; prefer iter_all()")
+            return _to_chroma_format(self.iter_all())
+    
+    def iter_all(self, page_size: int = 500):
+        """Lazily yield every conversation document, reading page_size at a time"""
+        return _iter_pages(self.collection, page_size)
     
     def delete(self, ids: List[str] = None):
         """Delete conversations by ID"""
@@ -390,10 +1002,7 @@ class ConversationIndexHandle:
             return
             
         # Delete from Firestore
-        batch = self.firestore_client.batch()
-        for id in ids:
-            batch.delete(self.collection.document(id))
-        batch.commit()
+        _bulk_delete(self.firestore_client, self.collection, ids)
 
 
 class UserIndexHandle:
@@ -403,41 +1012,62 @@ class UserIndexHandle:
         self, 
         collection, 
         index_endpoint, 
-        index,
+        buffer: _EmbeddingBuffer,
         dimensions: int,
-        firestore_client
+        firestore_client,
+        discord_index,
+        async_firestore_client,
+        deployed_index_id: str
     ):
         self.collection = collection
         self.index_endpoint = index_endpoint
-        self.index = index
+        self.buffer = buffer
         self.dimensions = dimensions
         self.firestore_client = firestore_client
+        self.discord_index = discord_index
+        self.deployed_index_id = deployed_index_id
+        self.async_collection = async_firestore_client.collection(collection.id)
+        self.async_discord_index = async_firestore_client.collection(discord_index.id)
+        self._cache = TTLCache(maxsize=4096, ttl=60)
+        self._discord_cache = TTLCache(maxsize=4096, ttl=60)
+        # (document, embedding, index metadata) hashes of the last state written for each user
+        self._state_hashes: Dict[str, tuple] = {}
     
     def add(self, user: UserProfile):
         """Add a user to the index and Firestore"""
         # Convert user to a dictionary
-        user_dict = user.to_dict()
+        user_dict = _pack_embedding(user.to_dict())
         
         # Store in Firestore
         self.collection.document(user.id).set(user_dict)
+        self.discord_index.document(user.discord_id).set({"user_id": user.id})
+        self._cache.pop(user.id)
+        self._discord_cache.pop(user.discord_id)
         
-        # Add to vector index if embedding exists
+        # Queue for the vector index if embedding exists
         if user.embedding:
-            self.index.upsert_embeddings(
-                embeddings=[user.embedding],
-                ids=[user.id],
-                metadata_list=[{
+            self.buffer.add(
+                user.id,
+                _index_vector(self.index_endpoint, self.deployed_index_id, user.id, user.embedding),
+                {
                     "id": user.id,
                     "name": user.name,
                     "discord_id": user.discord_id
-                }]
+                }
             )
         else:
             logger.warning(f"No embedding for user {user.id}, skipping vector index")
+        
+        # Only once the writes went through, so a failed one is retried
+        self._state_hashes[user.id] = self._hash_state(user)
     
     def get(self, user_id: str = None) -> Optional[Union[UserProfile, Dict[str, Any]]]:
         """Get a user by ID or get all users"""
         if user_id:
+            cached = self._cache.get(user_id)
+            if cached is not None:
+                return cached
+            
             # Get from Firestore
             doc_ref = self.collection.document(user_id)
             doc = doc_ref.get()
@@ -445,49 +1075,119 @@ class UserIndexHandle:
             if not doc.exists:
                 return None
                 
-            return UserProfile.from_dict(doc.to_dict())
+            user = UserProfile.from_dict(_unpack_embedding(doc.to_dict()))
+            self._cache.set(user_id, user)
+            return user
         else:
             # Get all users (for compatibility with Chroma API)
-            docs = self.collection.stream()
-            data = {"ids": [], "metadatas": []}
+            logger.warning("Loading every user into memory; prefer iter_all()")
+            return _to_chroma_format(self.iter_all())
+    
+    def iter_all(self, page_size: int = 500):
+        """Lazily yield every user document without embeddings, reading page_size at a time"""
+        return _iter_pages(self.collection.select(USER_FIELDS), page_size)
+    
+    async def aget(self, user_id: str) -> Optional[UserProfile]:
+        """Get a user by ID without blocking the event loop"""
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            return cached
+        
+        doc = await self.async_collection.document(user_id).get()
+        if not doc.exists:
+            return None
+        
+        user = UserProfile.from_dict(_unpack_embedding(doc.to_dict()))
+        self._cache.set(user_id, user)
+        return user
+    
+    async def aget_by_discord_id(self, discord_id: str) -> Optional[UserProfile]:
+        """Get a user by Discord ID without blocking the event loop"""
+        cached = self._discord_cache.get(discord_id)
+        if cached is not None:
+            return cached
+        
+        user = None
+        mapping = await self.async_discord_index.document(discord_id).get()
+        if mapping.exists:
+            user = await self.aget(mapping.get("user_id"))
+            if user and user.discord_id != discord_id:
+                user = None
+        
+        if user is None:
+            query = self.async_collection.where("discord_id", "==", discord_id).limit(1)
+            docs = [doc async for doc in query.stream()]
             
-            for doc in docs:
-                doc_dict = doc.to_dict()
-                data["ids"].append(doc_dict["id"])
-                data["metadatas"].append(doc_dict)
-                
-            return data
+            if not docs:
+                return None
+            
+            user = UserProfile.from_dict(_unpack_embedding(docs[0].to_dict()))
+            await self.async_discord_index.document(discord_id).set({"user_id": user.id})
+        
+        self._discord_cache.set(discord_id, user)
+        return user
     
     def get_by_discord_id(self, discord_id: str) -> Optional[UserProfile]:
         """Get a user by Discord ID"""
-        # Query Firestore
-        query = self.collection.where("discord_id", "==", discord_id)
-        docs = list(query.stream())
+        cached = self._discord_cache.get(discord_id)
+        if cached is not None:
+            return cached
         
-        if not docs:
-            return None
+        # Point read through the discord_index mapping; entries left behind by
+        # deletes or Discord ID changes fail the check and fall through
+        user = None
+        mapping = self.discord_index.document(discord_id).get()
+        if mapping.exists:
+            user = self.get(mapping.get("user_id"))
+            if user and user.discord_id != discord_id:
+                user = None
+        
+        if user is None:
+            # Query Firestore for users written before the mapping existed
+            query = self.collection.where("discord_id", "==", discord_id)
+            docs = list(query.stream())
             
-        return UserProfile.from_dict(docs[0].to_dict())
+            if not docs:
+                return None
+                
+            user = UserProfile.from_dict(_unpack_embedding(docs[0].to_dict()))
+            self.discord_index.document(discord_id).set({"user_id": user.id})
+        
+        self._discord_cache.set(discord_id, user)
+        return user
     
     def update(self, user: UserProfile):
-        """Update a user in the index and Firestore"""
+        """Update a user in the index and Firestore, skipping writes that change nothing"""
+        doc_hash, embedding_hash, metadata_hash = self._hash_state(user)
+        last_doc_hash, last_embedding_hash, last_metadata_hash = self._state_hashes.get(user.id, (None, None, None))
+        embedding_changed = embedding_hash is not None and embedding_hash != last_embedding_hash
+        metadata_changed = metadata_hash != last_metadata_hash
+        if doc_hash == last_doc_hash and not embedding_changed and not metadata_changed:
+            return
+        
         # Convert user to a dictionary
-        user_dict = user.to_dict()
+        user_dict = _pack_embedding(user.to_dict())
         
-        # Update in Firestore
+        # Update in Firestore; the embedding is stored in the document too
         self.collection.document(user.id).set(user_dict)
+        self.discord_index.document(user.discord_id).set({"user_id": user.id})
+        self._cache.pop(user.id)
+        self._discord_cache.pop(user.discord_id)
         
-        # Update in vector index if embedding exists
-        if user.embedding:
-            self.index.upsert_embeddings(
-                embeddings=[user.embedding],
-                ids=[user.id],
-                metadata_list=[{
+        # Queue vector index update if the embedding or its metadata changed
+        if user.embedding and (embedding_changed or metadata_changed):
+            self.buffer.add(
+                user.id,
+                _index_vector(self.index_endpoint, self.deployed_index_id, user.id, user.embedding),
+                {
                     "id": user.id,
                     "name": user.name,
                     "discord_id": user.discord_id
-                }]
+                }
             )
+        
+        # Only once the writes went through, so a failed one is retried
+        self._state_hashes[user.id] = (doc_hash, embedding_hash or last_embedding_hash, metadata_hash)
     
     def delete(self, ids: List[str] = None):
         """Delete users by ID"""
@@ -495,10 +1195,40 @@ class UserIndexHandle:
             return
             
         # Delete from Firestore
-        batch = self.firestore_client.batch()
+        _bulk_delete(self.firestore_client, self.collection, ids)
+        self._invalidate(ids)
+        
+        # Queue removal from vector index
+        self.buffer.remove(ids)
+    
+    def _invalidate(self, ids: List[str]):
+        """Drop cached users for the given IDs"""
         for id in ids:
-            batch.delete(self.collection.document(id))
-        batch.commit()
+            self._cache.pop(id)
+            self._state_hashes.pop(id, None)
+        
+        # The Discord ID of a deleted user may not be known here, so start the lookup cache afresh
+        self._discord_cache.clear()
+    
+    @staticmethod
+    def _hash_state(user: UserProfile) -> tuple:
+        """
+        Hashes of the user's document fields, of its embedding and of the
+        vector index metadata. An embedding read back from storage hashes as
+        None: it is whatever was last written.
+        """
+        doc = user.to_dict()
+        doc.pop("embedding")
+        doc_hash = hashlib.blake2b(
+            json.dumps(doc, sort_keys=True).encode(), digest_size=16
+        ).digest()
         
-        # Delete from vector index
-        self.index.remove_embeddings(ids=ids)
\ No newline at end of file
+        embedding_hash = None
+        if user.embedding and not isinstance(user.embedding, _StoredEmbedding):
+            embedding_hash = hashlib.blake2b(
+                np.asarray(user.embedding, dtype=np.float32).tobytes(), digest_size=16
+            ).digest()
+        metadata_hash = hashlib.blake2b(
+            f"{user.name}\0{user.discord_id}".encode(), digest_size=16
+        ).digest()
+        return doc_hash, embedding_hash, metadata_hash
@@ -1,7 +1,25 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from datetime import datetime
+from heapq import nlargest
+from typing import List, Dict, Any, Iterable, Optional
 from src.core.types import Message, UserProfile
 
+
+def select_recent(
+    messages: Iterable[Message],
+    since: Optional[datetime] = None,
+    limit: Optional[int] = None
+) -> List[Message]:
+    """
+    Keep messages newer than since and, of those, the limit newest,
+    returned oldest first. For backends that can't do this server-side.
+    """
+    if since is not None:
+        messages = (m for m in messages if m.timestamp > since)
+    if limit is not None:
+        messages = nlargest(limit, messages, key=lambda m: m.timestamp)
+    return sorted(messages, key=lambda m: m.timestamp)
+
 class VectorDBClient(ABC):
     """Abstract base class for vector database clients"""
     
@@ -34,8 +52,20 @@ class MessageRepository(ABC):
         pass
     
     @abstractmethod
-    def get_by_conversation(self, conversation_id: str) -> List[Message]:
-        """Get all messages in a conversation"""
+    def get_by_conversation(
+        self,
+        conversation_id: str,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> List[Message]:
+        """
+        Get the messages in a conversation, oldest first
+
+        Args:
+            conversation_id: The conversation to read
+            since: Only return messages newer than this
+            limit: Only return this many of the newest messages
+        """
         pass
     
     @abstractmethod
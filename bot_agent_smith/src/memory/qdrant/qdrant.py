@@ -1,15 +1,75 @@
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Callable
 from datetime import datetime, UTC
+from contextlib import contextmanager
 import os
 import json
+import numpy as np
 
 from qdrant_client import QdrantClient as QClient
 from qdrant_client.http import models
-from qdrant_client.http.models import VectorParams, Distance, PointStruct, SearchRequest
+from qdrant_client.http.models import VectorParams, Distance, PointStruct
 
 from src.core.types import Message, Conversation, UserProfile, Author
 from src.core.logger import logger
-from src.memory.interfaces import VectorDBClient, MessageRepository as MessageRepositoryInterface, UserRepository as UserRepositoryInterface
+from src.memory.embedder import LazyTextEmbedder
+from src.memory.interfaces import VectorDBClient, MessageRepository as MessageRepositoryInterface, UserRepository as UserRepositoryInterface, select_recent
+
+# Qdrant's default indexing threshold, restored after a bulk load when a
+# collection doesn't report its own
+DEFAULT_INDEXING_THRESHOLD = 20000
+
+# Embedding sizes of known SentenceTransformer models, to avoid loading one just to ask
+_MODEL_DIMS = {
+    "all-MiniLM-L6-v2": 384,
+    "all-MiniLM-L12-v2": 384,
+    "paraphrase-multilingual-MiniLM-L12-v2": 384,
+    "all-mpnet-base-v2": 768,
+    "bge-small-en-v1.5": 384,
+    "bge-base-en-v1.5": 768,
+    "bge-large-en-v1.5": 1024,
+}
+
+def _unit_vector(vector: List[float], kind: str, id: str) -> List[float]:
+    """DOT distance only ranks like cosine on unit vectors, so rescale any that aren't"""
+    norm = float(np.linalg.norm(vector))
+    if norm == 0 or abs(norm - 1.0) < 1e-3:
+        return vector
+    logger.warning("Embedding of %s %s has norm %.3f, normalizing it", kind, id, norm)
+    return (np.asarray(vector, dtype=np.float32) / norm).tolist()
+
+def _scroll_all(client, collection_name: str, scroll_filter=None, page_size: int = 256, with_payload: bool = True):
+    """Yield every point matching the filter, following scroll offsets page by page"""
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=scroll_filter,
+            limit=page_size,
+            offset=offset,
+            with_payload=with_payload,
+            with_vectors=False
+        )
+        yield from points
+        if offset is None:
+            return
+
+
+def _to_chroma_format(points, with_payload: bool = True) -> Dict[str, Any]:
+    """Collect points into the Chroma get() result shape; ids only without payloads"""
+    if not with_payload:
+        return {"ids": [point.id for point in points]}
+    
+    data = {
+        "ids": [],
+        "metadatas": []
+    }
+    
+    for point in points:
+        data["ids"].append(point.id)
+        data["metadatas"].append(point.payload)
+    
+    return data
+
 
 class QdrantClient(VectorDBClient):
     """Client for Qdrant vector database with cloud and self-hosted support"""
@@ -20,7 +80,11 @@ class QdrantClient(VectorDBClient):
         api_key: str = None,
         dimensions: int = None,  # Make this optional
         collection_prefix: str = "agent_smith_",
-        embedding_model_name: str = "all-MiniLM-L6-v2"  # Add model name
+        embedding_model_name: str = "all-MiniLM-L6-v2",  # Add model name
+        embedding_function: Optional[Callable[[str], List[float]]] = None,
+        prefer_grpc: bool = True,
+        grpc_port: int = 6334,
+        timeout: int = 30
     ):
         """
         Initialize the Qdrant Client
@@ -30,22 +94,31 @@ class QdrantClient(VectorDBClient):
             api_key: Qdrant API key for authentication
             dimensions: Dimension of embeddings to be stored
             collection_prefix: Prefix for collection names to avoid conflicts
+            embedding_model_name: Model whose embeddings are stored
+            embedding_function: Callable turning query text into an embedding;
+                defaults to a lazily loaded SentenceTransformer
+            prefer_grpc: Talk to Qdrant over gRPC (one multiplexed HTTP/2 connection)
+            grpc_port: Port of the Qdrant gRPC API
+            timeout: Request timeout in seconds
         """
-        # Determine embedding dimension based on model
-        if dimensions is None:
+        # Determine embedding dimension based on model, loading it only if unknown
+        self.dimensions = dimensions or _MODEL_DIMS.get(embedding_model_name)
+        if self.dimensions is None:
             from sentence_transformers import SentenceTransformer
             model = SentenceTransformer(embedding_model_name)
             self.dimensions = model.get_sentence_embedding_dimension()
-            logger.info(f"Using embedding dimension {self.dimensions} from model {embedding_model_name}")
-        else:
-            self.dimensions = dimensions
+        logger.info(f"Using embedding dimension {self.dimensions} for model {embedding_model_name}")
         
-        self.collection_prefix = collection_prefix        
+        self.collection_prefix = collection_prefix
+        self.embedding_function = embedding_function or LazyTextEmbedder(embedding_model_name)
 
-        # Initialize Qdrant client
+        # Initialize Qdrant client; it is shared by every handle and repository
         self.client = QClient(
             url=url,
             api_key=api_key,
+            prefer_grpc=prefer_grpc,
+            grpc_port=grpc_port,
+            timeout=timeout,
         )
         
         # Collection names with prefix
@@ -60,7 +133,8 @@ class QdrantClient(VectorDBClient):
         self.messages = MessageIndexHandle(
             client=self.client,
             collection_name=self.messages_collection_name,
-            dimensions=self.dimensions
+            dimensions=self.dimensions,
+            embedding_function=self.embedding_function
         )
         
         self.users = UserIndexHandle(
@@ -95,29 +169,66 @@ class QdrantClient(VectorDBClient):
             collection_name=self.conversations_collection_name,
             has_vectors=False
         )
+        
+        # Index the payload fields used in filtered scrolls and searches
+        self._ensure_payload_indexes(self.messages_collection_name, {
+            "conversation_id": models.PayloadSchemaType.KEYWORD,
+            # Range index, so recent messages can be filtered and ordered server-side
+            "timestamp": models.PayloadSchemaType.DATETIME,
+            "content": models.TextIndexParams(
+                type="text",
+                tokenizer=models.TokenizerType.WORD,
+                lowercase=True
+            ),
+        })
+        self._ensure_payload_indexes(self.users_collection_name, {
+            "discord_id": models.PayloadSchemaType.KEYWORD,
+        })
+    
+    def _ensure_payload_indexes(self, collection_name: str, field_schemas: Dict[str, Any]):
+        """Create the payload indexes a collection is missing"""
+        existing = self.client.get_collection(collection_name=collection_name).payload_schema or {}
+        for field_name, field_schema in field_schemas.items():
+            if field_name in existing:
+                continue
+            self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=field_schema
+            )
+            logger.info(f"Created payload index on {collection_name}.{field_name}")
     
     def _create_collection_if_not_exists(self, collection_name: str, has_vectors: bool = True):
         """Create a collection if it doesn't exist"""
-        # Check if collection exists
-        collections = self.client.get_collections().collections
-        collection_exists = any(c.name == collection_name for c in collections)
-        
-        # Delete collection if it exists
-        if collection_exists:
-            self.client.delete_collection(collection_name=collection_name)
-            logger.info(f"Deleted existing collection {collection_name}")
+        # Keep existing data across restarts; reset_collections() is the destructive path
+        if self.client.collection_exists(collection_name=collection_name):
+            logger.debug("Using existing collection %s", collection_name)
+            return
         
-        # Create collection with correct dimensions
+        # Create collection with correct dimensions. Embeddings are L2-normalized, so a raw
+        # dot product ranks like cosine without normalizing on every comparison. Vectors
+        # are searched through an int8 copy kept in RAM; the full-precision originals
+        # stay on disk for rescoring
         vector_params = None
+        quantization_config = None
         if has_vectors:
             vector_params = VectorParams(
                 size=self.dimensions,
-                distance=Distance.COSINE
+                distance=Distance.DOT,
+                on_disk=True
+            )
+            quantization_config = models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=True
+                )
             )
         
         self.client.create_collection(
             collection_name=collection_name,
-            vectors_config=vector_params
+            vectors_config=vector_params,
+            quantization_config=quantization_config
         )
         logger.info(f"Created collection {collection_name} with dimension {self.dimensions}")
     
@@ -133,6 +244,33 @@ class QdrantClient(VectorDBClient):
         """Get conversations data"""
         return self.conversations.get(**kwargs)
     
+    @contextmanager
+    def bulk_load(self, collection_names: List[str] = None):
+        """
+        Pause HNSW indexing on the given collections (default: messages and users)
+        while loading many points, then restore it so the index is built once
+        """
+        collection_names = collection_names or [self.messages_collection_name, self.users_collection_name]
+        # Each collection gets back its own threshold, which may not be the default
+        thresholds = {}
+        for collection_name in collection_names:
+            optimizer_config = self.client.get_collection(collection_name).config.optimizer_config
+            thresholds[collection_name] = optimizer_config.indexing_threshold
+            if thresholds[collection_name] is None:
+                thresholds[collection_name] = DEFAULT_INDEXING_THRESHOLD
+            self.client.update_collection(
+                collection_name=collection_name,
+                optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0)
+            )
+        try:
+            yield
+        finally:
+            for collection_name in collection_names:
+                self.client.update_collection(
+                    collection_name=collection_name,
+                    optimizers_config=models.OptimizersConfigDiff(indexing_threshold=thresholds[collection_name])
+                )
+    
     def reset_collections(self):
         """Reset all collections - use with caution!"""
         logger.warning("Resetting all Qdrant collections!")
@@ -157,44 +295,77 @@ class QdrantClient(VectorDBClient):
 class MessageIndexHandle:
     """Handle for the messages collection"""
     
-    def __init__(self, client, collection_name: str, dimensions: int):
+    def __init__(
+        self,
+        client,
+        collection_name: str,
+        dimensions: int,
+        embedding_function: Callable[[str], List[float]]
+    ):
         self.client = client
         self.collection_name = collection_name
         self.dimensions = dimensions
+        self.embedding_function = embedding_function
+        # Shared placeholder for points without an embedding; never mutated
+        self._zero_vector = [0.0] * dimensions
     
     def add(self, message: Message):
         """Add a message to the Qdrant collection"""
-        # Convert message to a dictionary
-        message_dict = message.to_dict()
+        # Upsert point to Qdrant
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[self._to_point(message)]
+        )
         
-        # If no vector, we'll use a placeholder with all zeros
-        vector = message.embedding if message.embedding else [0.0] * self.dimensions
-        if not message.embedding:
-            logger.warning(f"No embedding for message {message.id}, using zero vector")
+        logger.debug("Added message %s to Qdrant", message.id)
+    
+    def add_many(self, messages: List[Message], batch_size: int = 64, parallel: int = 1, wait: bool = True):
+        """
+        Add several messages in batched requests
         
-        # Create Qdrant point
-        point = PointStruct(
-            id=message.id,
-            payload=message_dict,
-            vector=vector  # Now vector is always defined
-        )
+        Args:
+            messages: Messages to add
+            batch_size: Points sent per request
+            parallel: Worker processes uploading batches; worth raising only for large loads
+            wait: Whether to wait for Qdrant to apply each batch
+        """
+        if not messages:
+            return
         
-        # Upsert point to Qdrant
-        self.client.upsert(
+        self.client.upload_points(
             collection_name=self.collection_name,
-            points=[point]
+            points=[self._to_point(message) for message in messages],
+            batch_size=batch_size,
+            parallel=parallel,
+            wait=wait
         )
         
-        logger.info(f"Added message {message.id} to Qdrant")
+        logger.info(f"Added {len(messages)} messages to Qdrant")
+    
+    def _to_point(self, message: Message) -> PointStruct:
+        """Build the Qdrant point for a message, L2-normalizing its embedding if needed"""
+        # If no vector, we'll use a placeholder with all zeros
+        vector = message.embedding or self._zero_vector
+        if not message.embedding:
+            logger.warning("No embedding for message %s, using zero vector", message.id)
+        else:
+            vector = _unit_vector(vector, "message", message.id)
+        
+        return PointStruct(
+            id=message.id,
+            payload=message.to_dict(),
+            vector=vector
+        )
     
-    def get(self, message_id: str = None) -> Union[Optional[Message], Dict[str, Any]]:
-        """Get a message by ID or get all messages"""
+    def get(self, message_id: str = None, with_payload: bool = True) -> Union[Optional[Message], Dict[str, Any]]:
+        """Get a message by ID or get all messages; with_payload=False lists IDs only"""
         if message_id:
             # Retrieve single message
             try:
                 point = self.client.retrieve(
                     collection_name=self.collection_name,
-                    ids=[message_id]
+                    ids=[message_id],
+                    with_vectors=False
                 )
                 
                 if not point:
@@ -207,50 +378,95 @@ class MessageIndexHandle:
                 return None
         else:
             # For compatibility with Chroma API - return all IDs and metadatas
-            # Note: This should be used carefully with pagination for large collections
-            points = self.client.scroll(
-                collection_name=self.collection_name,
-                limit=100  # Adjust this limit as needed
-            )[0]
-            
-            data = {
-                "ids": [],
-                "metadatas": []
-            }
-            
-            for point in points:
-                data["ids"].append(point.id)
-                data["metadatas"].append(point.payload)
-            
-            return data
+            points = _scroll_all(self.client, self.collection_name, with_payload=with_payload)
+            return _to_chroma_format(points, with_payload)
     
-    def get_by_conversation(self, conversation_id: str) -> List[Message]:
-        """Get all messages in a conversation"""
-        # Scroll through points with filter
-        points = self.client.scroll(
+    def get_by_conversation(
+        self,
+        conversation_id: str,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> List[Message]:
+        """Get the messages in a conversation, oldest first, optionally only recent ones"""
+        if limit is None:
+            return select_recent(self.iter_by_conversation(conversation_id, since=since))
+        
+        # Qdrant orders by the timestamp index and stops after limit points
+        points, _ = self.client.scroll(
             collection_name=self.collection_name,
-            scroll_filter=models.Filter(
-                must=[
-                    models.FieldCondition(
-                        key="conversation_id",
-                        match=models.MatchValue(value=conversation_id)
-                    )
-                ]
-            ),
-            limit=1000  # Adjust this limit as needed
-        )[0]
+            scroll_filter=self._conversation_filter(conversation_id, since),
+            limit=limit,
+            order_by=models.OrderBy(key="timestamp", direction=models.Direction.DESC),
+            with_payload=True,
+            with_vectors=False
+        )
+        messages = [Message.from_dict(point.payload) for point in points]
+        messages.reverse()
+        return messages
+    
+    def iter_by_conversation(self, conversation_id: str, since: Optional[datetime] = None):
+        """
+        Lazily yield the messages of a conversation, one scroll page at a time.
+        With since, Qdrant only returns messages newer than it.
+        """
+        points = _scroll_all(
+            self.client,
+            self.collection_name,
+            scroll_filter=self._conversation_filter(conversation_id, since)
+        )
         
         # Convert to Messages
-        return [Message.from_dict(point.payload) for point in points]
+        for point in points:
+            yield Message.from_dict(point.payload)
     
-    def search(self, query: str, n_results: int = 10) -> List[Message]:
+    def _conversation_filter(self, conversation_id: str, since: Optional[datetime] = None) -> models.Filter:
+        """Filter for a conversation's messages, newer than since when given"""
+        conditions = [
+            models.FieldCondition(
+                key="conversation_id",
+                match=models.MatchValue(value=conversation_id)
+            )
+        ]
+        if since is not None:
+            conditions.append(
+                models.FieldCondition(key="timestamp", range=models.DatetimeRange(gt=since))
+            )
+        return models.Filter(must=conditions)
+    
+    def search(self, query: str, n_results: int = 10, keyword: Optional[str] = None) -> List[Message]:
         """
-        Search for messages similar to the query
+        Search for messages similar to the query using the HNSW index
         
-        Note: This is a simplified implementation that uses text search
-        for demonstration. In a real implementation, you would generate
-        an embedding for the query and use vector search.
+        Args:
+            query: Text to find similar messages for
+            n_results: Maximum number of messages to return
+            keyword: Optional text the message content must contain
         """
+        query_filter = None
+        if keyword:
+            query_filter = models.Filter(
+                must=[models.FieldCondition(key="content", match=models.MatchText(text=keyword))]
+            )
+        
+        try:
+            points = self.client.query_points(
+                collection_name=self.collection_name,
+                query=self.embedding_function(query),
+                query_filter=query_filter,
+                limit=n_results,
+                search_params=models.SearchParams(
+                    hnsw_ef=64,
+                    quantization=models.QuantizationSearchParams(rescore=True, oversampling=2.0)
+                )
+            ).points
+        except Exception as e:
+            logger.warning(f"Vector search failed, using text match fallback: {e}")
+            return self.text_search(query, n_results)
+        
+        return [Message.from_dict(point.payload) for point in points]
+    
+    def text_search(self, query: str, n_results: int = 10) -> List[Message]:
+        """Search for messages whose content matches the query text"""
         # First try with text match
         points = self.client.scroll(
             collection_name=self.collection_name,
@@ -304,40 +520,58 @@ class UserIndexHandle:
         self.client = client
         self.collection_name = collection_name
         self.dimensions = dimensions
+        # Shared placeholder for points without an embedding; never mutated
+        self._zero_vector = [0.0] * dimensions
     
     def add(self, user: UserProfile):
         """Add a user to the Qdrant collection"""
-        # Convert user to a dictionary
-        user_dict = user.to_dict()
+        # Upsert point to Qdrant
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[self._to_point(user)]
+        )
+        
+        logger.debug("Added user %s to Qdrant", user.id)
+    
+    def add_many(self, users: List[UserProfile], batch_size: int = 64, parallel: int = 1, wait: bool = True):
+        """Add several users in batched requests; see MessageIndexHandle.add_many"""
+        if not users:
+            return
+        
+        self.client.upload_points(
+            collection_name=self.collection_name,
+            points=[self._to_point(user) for user in users],
+            batch_size=batch_size,
+            parallel=parallel,
+            wait=wait
+        )
         
+        logger.info(f"Added {len(users)} users to Qdrant")
+    
+    def _to_point(self, user: UserProfile) -> PointStruct:
+        """Build the Qdrant point for a user, L2-normalizing its embedding if needed"""
         # If no vector, we'll use a placeholder with all zeros
-        vector = user.embedding if user.embedding else [0.0] * self.dimensions
+        vector = user.embedding or self._zero_vector
         if not user.embedding:
-            logger.warning(f"No embedding for user {user.id}, using zero vector")
+            logger.warning("No embedding for user %s, using zero vector", user.id)
+        else:
+            vector = _unit_vector(vector, "user", user.id)
         
-        # Create Qdrant point
-        point = PointStruct(
+        return PointStruct(
             id=user.id,
-            payload=user_dict,
-            vector=vector  # Now vector is always defined
+            payload=user.to_dict(),
+            vector=vector
         )
-        
-        # Upsert point to Qdrant
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=[point]
-        )
-        
-        logger.info(f"Added user {user.id} to Qdrant")
     
-    def get(self, user_id: str = None) -> Union[Optional[UserProfile], Dict[str, Any]]:
-        """Get a user by ID or get all users"""
+    def get(self, user_id: str = None, with_payload: bool = True) -> Union[Optional[UserProfile], Dict[str, Any]]:
+        """Get a user by ID or get all users; with_payload=False lists IDs only"""
         if user_id:
             # Retrieve single user
             try:
                 point = self.client.retrieve(
                     collection_name=self.collection_name,
-                    ids=[user_id]
+                    ids=[user_id],
+                    with_vectors=False
                 )
                 
                 if not point:
@@ -350,21 +584,8 @@ class UserIndexHandle:
                 return None
         else:
             # For compatibility with Chroma API - return all IDs and metadatas
-            points = self.client.scroll(
-                collection_name=self.collection_name,
-                limit=100  # Adjust this limit as needed
-            )[0]
-            
-            data = {
-                "ids": [],
-                "metadatas": []
-            }
-            
-            for point in points:
-                data["ids"].append(point.id)
-                data["metadatas"].append(point.payload)
-            
-            return data
+            points = _scroll_all(self.client, self.collection_name, with_payload=with_payload)
+            return _to_chroma_format(points, with_payload)
     
     def get_by_discord_id(self, discord_id: str) -> Optional[UserProfile]:
         """Get a user by Discord ID"""
@@ -419,16 +640,17 @@ class ConversationIndexHandle:
             points=[point]
         )
         
-        logger.info(f"Added conversation {conversation.id} to Qdrant")
+        logger.debug("Added conversation %s to Qdrant", conversation.id)
     
-    def get(self, conversation_id: str = None) -> Union[Optional[Conversation], Dict[str, Any]]:
-        """Get a conversation by ID or get all conversations"""
+    def get(self, conversation_id: str = None, with_payload: bool = True) -> Union[Optional[Conversation], Dict[str, Any]]:
+        """Get a conversation by ID or get all conversations; with_payload=False lists IDs only"""
         if conversation_id:
             # Retrieve single conversation
             try:
                 point = self.client.retrieve(
                     collection_name=self.collection_name,
-                    ids=[conversation_id]
+                    ids=[conversation_id],
+                    with_vectors=False
                 )
                 
                 if not point:
@@ -441,21 +663,8 @@ class ConversationIndexHandle:
                 return None
         else:
             # For compatibility with Chroma API - return all IDs and metadatas
-            points = self.client.scroll(
-                collection_name=self.collection_name,
-                limit=100  # Adjust this limit as needed
-            )[0]
-            
-            data = {
-                "ids": [],
-                "metadatas": []
-            }
-            
-            for point in points:
-                data["ids"].append(point.id)
-                data["metadatas"].append(point.payload)
-            
-            return data
+            points = _scroll_all(self.client, self.collection_name, with_payload=with_payload)
+            return _to_chroma_format(points, with_payload)
 
 
 class MessageRepository(MessageRepositoryInterface):
@@ -469,13 +678,22 @@ class MessageRepository(MessageRepositoryInterface):
         """Add a message to the repository"""
         self.collection.add(message)
     
+    def add_many(self, messages: List[Message]) -> None:
+        """Add several messages to the repository in batches"""
+        self.collection.add_many(messages)
+    
     def get(self, message_id: str) -> Optional[Message]:
         """Get a message by ID"""
         return self.collection.get(message_id)
     
-    def get_by_conversation(self, conversation_id: str) -> List[Message]:
-        """Get all messages in a conversation"""
-        return self.collection.get_by_conversation(conversation_id)
+    def get_by_conversation(
+        self,
+        conversation_id: str,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> List[Message]:
+        """Get the messages in a conversation, oldest first, optionally only recent ones"""
+        return self.collection.get_by_conversation(conversation_id, since=since, limit=limit)
     
     def search(self, query: str, n_results: int = 10) -> List[Message]:
         """Search for messages similar to the query"""
@@ -493,6 +711,10 @@ class UserRepository(UserRepositoryInterface):
         """Add a user to the repository"""
         self.collection.add(user)
     
+    def add_many(self, users: List[UserProfile]) -> None:
+        """Add several users to the repository in batches"""
+        self.collection.add_many(users)
+    
     def get(self, user_id: str) -> Optional[UserProfile]:
         """Get a user by ID"""
         return self.collection.get(user_id)
@@ -1,9 +1,13 @@
 from typing import Dict, Any, List
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 
 from src.orchestration.conversation.window import ConversationWindow
 from src.orchestration.services.registry import ServiceRegistry
 
+# Shared by all builders; service calls are mostly I/O bound (LLM, HTTP, DB)
+_service_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="context-service")
+
 @dataclass
 class ContextBuilder:
     service_registry: ServiceRegistry
@@ -14,17 +18,22 @@ class ContextBuilder:
         required_services: List[str] = None
     ) -> Dict[str, Any]:
         """Build a complete context including service calls if specified"""
-        # Start with base context
-        context = window.get_context()
+        # Start with base context; copied because the window reuses its dict
+        context = dict(window.get_context())
         
-        # Add service responses if required
+        # Add service responses if required, calling the services concurrently
         if required_services:
-            service_responses = {}
-            for service_name in required_services:
-                service = self.service_registry.get_service(service_name)
-                response = service.execute(context=context)
-                service_responses[service_name] = response
+            futures = {
+                service_name: _service_pool.submit(
+                    self.service_registry.get_service(service_name).execute,
+                    context=context
+                )
+                for service_name in required_services
+            }
             
-            context["service_responses"] = service_responses
+            context["service_responses"] = {
+                service_name: future.result()
+                for service_name, future in futures.items()
+            }
         
-        return context
\ No newline at end of file
+        return context
@@ -1,6 +1,7 @@
 from typing import Dict, Optional
+from collections import OrderedDict
 
-from agent_smith.bot_agent_smith.src.memory.chroma_db.chroma import MessageRepository, UserRepository
+from src.memory.interfaces import MessageRepository, UserRepository
 from src.core.types import Message
 from .window import ConversationWindow
 
@@ -16,7 +17,8 @@ class ConversationManager:
         self.user_repository = user_repository
         self.window_size = window_size
         self.max_windows = max_windows
-        self.active_windows: Dict[str, ConversationWindow] = {}
+        # Least recently used window first
+        self.active_windows: OrderedDict[str, ConversationWindow] = OrderedDict()
 
     def get_or_create_window(
         self,
@@ -27,11 +29,12 @@ class ConversationManager:
         if conversation_id in self.active_windows:
             window = self.active_windows[conversation_id]
             if not window.is_stale():
+                self.active_windows.move_to_end(conversation_id)
                 return window
 
         # Fetch recent messages
-        messages = self.message_repository.get_by_conversation(conversation_id)
-        messages = sorted(messages, key=lambda m: m.timestamp)[-self.window_size:]
+        # The repository returns the newest window_size messages, oldest first
+        messages = self.message_repository.get_by_conversation(conversation_id, limit=self.window_size)
 
         # Fetch user profile if provided
         user_profile = None
@@ -46,15 +49,12 @@ class ConversationManager:
             window_size=self.window_size
         )
 
-        # Manage active windows limit
-        if len(self.active_windows) >= self.max_windows:
-            oldest_id = min(
-                self.active_windows.keys(),
-                key=lambda k: self.active_windows[k].last_updated
-            )
-            del self.active_windows[oldest_id]
+        # Manage active windows limit; a stale window is replaced in place
+        if conversation_id not in self.active_windows and len(self.active_windows) >= self.max_windows:
+            self.active_windows.popitem(last=False)
 
         self.active_windows[conversation_id] = window
+        self.active_windows.move_to_end(conversation_id)
         return window
 
     def add_message(self, message: Message) -> ConversationWindow:
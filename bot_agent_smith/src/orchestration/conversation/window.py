@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import List, Optional, Dict
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Set, Tuple
 from datetime import datetime, timedelta, UTC
 
 from src.core.types import Message, UserProfile
@@ -11,48 +11,65 @@ class ConversationWindow:
     user_profile: Optional[UserProfile]
     window_size: int = 10
     context_ttl: timedelta = timedelta(minutes=30)
-    last_updated: datetime = datetime.now(UTC)
+    last_updated: datetime = field(default_factory=lambda: datetime.now(UTC))
+    # Dedup keys of the messages currently in the window
+    _seen: Set[Tuple] = field(default_factory=set, init=False, repr=False)
+    # Built by get_context and reused until the window changes
+    _context_cache: Optional[Dict] = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        # Drop duplicates from the initial history so get_context can skip its own pass
+        messages, self.messages = self.messages, []
+        for message in messages:
+            key = self._dedup_key(message)
+            if key not in self._seen:
+                self._seen.add(key)
+                self.messages.append(message)
 
     def is_stale(self) -> bool:
         return datetime.now(UTC) - self.last_updated > self.context_ttl
 
     def add_message(self, message: Message):
-        # Don't add if it's a duplicate of the last message
-        if self.messages and self._is_duplicate(message, self.messages[-1]):
+        # Don't add if the same author already sent this content in the same 5 second slot
+        key = self._dedup_key(message)
+        if key in self._seen:
             return
             
+        self._seen.add(key)
+        self._context_cache = None
         self.messages.append(message)
         if len(self.messages) > self.window_size:
+            for dropped in self.messages[:-self.window_size]:
+                self._seen.discard(self._dedup_key(dropped))
             self.messages = self.messages[-self.window_size:]
         self.last_updated = datetime.now(UTC)
 
-    def _is_duplicate(self, msg1: Message, msg2: Message) -> bool:
-        """Check if two messages are duplicates based on content and timing"""
-        content_match = msg1.content == msg2.content
-        author_match = msg1.author.id == msg2.author.id
-        time_close = abs((msg1.timestamp - msg2.timestamp).total_seconds()) < 5
-        return content_match and author_match and time_close
+    @staticmethod
+    def _dedup_key(message: Message) -> Tuple:
+        """Messages sharing author, content and 5 second time slot count as duplicates"""
+        # Cheap fields first: on a hash collision tuples compare element by
+        # element, so a long content compare only happens when the rest match
+        return (message.author.id, int(message.timestamp.timestamp()) // 5, message.content)
 
     def get_context(self) -> Dict:
         """Returns the current conversation context in a format suitable for LLM input"""
-        # First, deduplicate messages based on content, author and timestamp
-        deduped_messages = []
-        for msg in self.messages:
-            if not deduped_messages or not self._is_duplicate(msg, deduped_messages[-1]):
-                deduped_messages.append(msg)
+        if self._context_cache is not None:
+            return self._context_cache
 
-        return {
+        # Messages are deduplicated as they enter the window
+        self._context_cache = {
             "conversation_id": self.conversation_id,
             "messages": [
                 {
-                    "role": "assistant" if msg.author.discord_id.startswith("bot_") else "user",
+                    "role": msg.role,
                     "content": msg.content,
-                    "timestamp": msg.timestamp.isoformat()
+                    "timestamp": msg.iso_timestamp
                 }
-                for msg in deduped_messages
+                for msg in self.messages
             ],
             "user": {
                 "name": self.user_profile.name,
                 "interests": self.user_profile.interests
             } if self.user_profile else None
-        }
\ No newline at end of file
+        }
+        return self._context_cache
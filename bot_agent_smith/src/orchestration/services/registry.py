@@ -1,5 +1,5 @@
 from typing import Dict, Type, Callable, Any, Protocol
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, UTC
 
 class ServiceProtocol(Protocol):
@@ -11,7 +11,7 @@ class ServiceMetadata:
     name: str
     description: str
     version: str
-    created_at: datetime = datetime.now(UTC)
+    created_at: datetime = field(default_factory=lambda: datetime.now(UTC))
 
 class ServiceRegistry:
     def __init__(self):
@@ -39,6 +39,10 @@ class ServiceRegistry:
             raise KeyError(f"Service {name} not found")
         return self.services[name]
 
+    def has_service(self, name: str) -> bool:
+        """Whether a service is registered under this name"""
+        return name in self.services
+
     def list_services(self) -> Dict[str, ServiceMetadata]:
         """List all registered services"""
         return self.metadata
\ No newline at end of file
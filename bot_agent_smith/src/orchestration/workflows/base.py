@@ -0,0 +1,51 @@
+import functools
+import inspect
+import time
+from typing import Any, Callable
+
+from src.core.logger import logger
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+
+def _record_timing(name: str, elapsed_ns: int) -> None:
+    """Log a node's duration and attach it to the current trace span, if any"""
+    logger.info(f"Node {name} took {elapsed_ns / 1_000_000:.1f} ms")
+    if trace is not None:
+        span = trace.get_current_span()
+        if span.is_recording():
+            span.add_event(name, {"duration_ns": elapsed_ns})
+
+
+def timed_node(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Decorate a workflow node so each run records how long it took.
+
+    Works for both sync and async nodes. Timings are logged and, when
+    opentelemetry is installed and a span is recording, added to that span
+    as an event named after the node.
+    """
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(state):
+                start = time.perf_counter_ns()
+                try:
+                    return await fn(state)
+                finally:
+                    _record_timing(name, time.perf_counter_ns() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(state):
+            start = time.perf_counter_ns()
+            try:
+                return fn(state)
+            finally:
+                _record_timing(name, time.perf_counter_ns() - start)
+        return wrapper
+
+    return decorator
@@ -1,8 +1,151 @@
-from typing_extensions import TypedDict, Literal
+import asyncio
+import heapq
+import re
+from string import Template
+from textwrap import dedent
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from typing_extensions import NotRequired, TypedDict, Literal
+import orjson
 from langgraph.graph import StateGraph, START, END
 from src.orchestration.services.registry import ServiceRegistry
 from src.core.types import Message
 from src.core.logger import logger
+from src.llm.service import cached_system_message, first_json_array
+
+from .base import timed_node
+
+# Per-article cap on content sent for counter-argument analysis
+MAX_ARTICLE_CHARS = 2000
+
+# Sentences kept from each article, picked by overlap with the statement
+TOP_SENTENCES = 5
+
+# Budget for all article excerpts in the analysis prompt, estimated at
+# CHARS_PER_TOKEN characters per token
+MAX_ARTICLE_TOKENS = 6000
+CHARS_PER_TOKEN = 4
+
+# Recent context messages included when answering
+HISTORY_MSGS = 3
+
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+_WORD_RE = re.compile(r'\w{3,}')
+
+# Static prompts, dedented once at import so every request sends the exact
+# same bytes (and providers can reuse the cached prefix)
+_SYS_STANDARD = cached_system_message(dedent("""\
+    You are a helpful assistant.
+    Provide clear, concise responses to the user's questions.
+    Focus only on the most recent message, not prior conversation.
+    """))
+
+_SYS_ANALYZE = cached_system_message(dedent("""\
+    Analyze the provided articles to find counter-arguments to the main statement.
+
+    For each article, determine if it presents a view that contradicts or provides an alternative
+    perspective to the main statement.
+
+    Format your response as a JSON object with a "counter_arguments" array, each item containing:
+    1. "title": A concise title for the counter-argument
+    2. "summary": A brief summary of the counter-argument (1-2 sentences)
+    3. "article_index": The index of the article containing this counter-argument
+
+    Only include counter-arguments that genuinely oppose or offer alternatives to the main statement.
+    If an article doesn't provide a counter-argument, don't include it.
+
+    Return an empty array if no counter-arguments are found.
+    """))
+
+_SYS_COUNTER = cached_system_message(dedent("""\
+    You are a helpful assistant that provides balanced perspectives.
+
+    The user has shared a viewpoint, and you need to present
+    alternative perspectives in MULTIPLE SEPARATE MESSAGES.
+
+    Format your response as follows:
+    1. FIRST MESSAGE: A brief introduction acknowledging their view and mentioning you'll share different perspectives
+    2. SEPARATE MESSAGES for each counter-argument (maximum 3), with each containing:
+    - A title for the perspective
+    - A brief explanation (2-3 sentences)
+    - The source link in format "[Source: Title](URL)"
+    3. FINAL MESSAGE: A brief balanced conclusion
+
+    Split your response into multiple messages as described, with the first acknowledging
+    the user's perspective and indicating you'll share different viewpoints.
+
+    IMPORTANT: Format your response as a JSON array of message objects, where each object has a "content" field.
+    Example: [{"content": "First message..."}, {"content": "Second message..."}]
+    Return ONLY the JSON array of messages.
+    """))
+
+# User turns carry only the per-request text
+_USER_ANALYZE_TEMPLATE = Template(dedent("""\
+    Main statement: "$statement"
+
+    Articles to analyze:
+    $articles
+    """))
+
+_USER_COUNTER_TEMPLATE = Template(dedent("""\
+    User's statement: "$statement"
+
+    $counter_args_text
+    """))
+
+def _is_message_list(value: List[Any]) -> bool:
+    """An array of {"content": ...} messages, unlike a "[1]" citation in the prose"""
+    return all(isinstance(message, dict) and "content" in message for message in value)
+
+
+def _terms(text: str) -> Set[str]:
+    """Lowercased words of three letters or more"""
+    return {word.lower() for word in _WORD_RE.findall(text)}
+
+
+def _rank_sentences(content: str, query_terms: Set[str], top_k: int = TOP_SENTENCES) -> Tuple[str, int]:
+    """
+    Keep the top_k sentences of an article sharing the most words with the
+    query, in their original order. Ties go to earlier sentences, since news
+    articles lead with their point.
+
+    Returns:
+        Tuple of the excerpt and its total overlap score
+    """
+    sentences = _SENTENCE_SPLIT_RE.split(content.strip())
+    scores = [len(query_terms & _terms(sentence)) for sentence in sentences]
+    if len(sentences) <= top_k:
+        return content, sum(scores)
+
+    best = heapq.nlargest(top_k, range(len(sentences)), key=lambda i: (scores[i], -i))
+    best.sort()
+    return " ".join(sentences[i] for i in best), sum(scores[i] for i in best)
+
+
+def _article_excerpts(articles: List[Dict[str, Any]], statement: str) -> List[Dict[str, Any]]:
+    """
+    Cut each article down to its most relevant sentences for the analysis
+    prompt, dropping the least relevant articles once the token budget is
+    spent. Each excerpt keeps the article's original index.
+    """
+    query_terms = _terms(statement)
+    ranked = []
+    for i, article in enumerate(articles):
+        excerpt, score = _rank_sentences(article["content"], query_terms)
+        ranked.append((score, i, {"index": i, "title": article["title"], "content": excerpt[:MAX_ARTICLE_CHARS]}))
+
+    budget = MAX_ARTICLE_TOKENS * CHARS_PER_TOKEN
+    kept = []
+    for score, i, excerpt in sorted(ranked, key=lambda item: (-item[0], item[1])):
+        size = len(excerpt["title"]) + len(excerpt["content"])
+        if size > budget:
+            logger.info(f"Dropping article {i} from analysis, over the prompt budget")
+            continue
+        budget -= size
+        kept.append(excerpt)
+
+    kept.sort(key=lambda excerpt: excerpt["index"])
+    return kept
+
 
 class QualifiedWorkflowState(TypedDict):
     message: Message
@@ -13,37 +156,100 @@ class QualifiedWorkflowState(TypedDict):
     articles: list
     counter_arguments: list
     messages_to_send: list
-    stage: str  
+    stage: str
+    # Control flags set by callers. They must be declared here, or LangGraph
+    # drops them from the input before any node sees them.
+    _skip_qualification: NotRequired[bool]  # needs_counter_arguments (and keywords) already given
+    _skip_acknowledgment: NotRequired[bool]  # the acknowledgment was already sent
+    _run_qualification_only: NotRequired[bool]  # stop after qualification
+    _no_cache: NotRequired[bool]  # always query the LLM, bypassing its response cache
 
-def create_qualified_workflow(service_registry: ServiceRegistry):
+def create_qualified_workflow(
+    service_registry: ServiceRegistry,
+    notification_sink: Optional[Callable[[Message, Dict[str, Any]], None]] = None
+):
     """
     Create a workflow that first qualifies messages to determine if 
     counter-arguments are needed, then routes to appropriate handling.
+
+    Args:
+        service_registry: Registry providing the services used by the nodes
+        notification_sink: Called with the original message and an interim
+            message (e.g. the acknowledgment) as soon as it is ready, instead of
+            buffering it in messages_to_send until the workflow ends. It runs on
+            the workflow thread, so adapters with an event loop should schedule
+            their send (e.g. asyncio.run_coroutine_threadsafe) and return.
     """
+    # Resolve services once, so a missing registration fails here rather
+    # than halfway through a request
+    qualifier_service = service_registry.get_service("qualifier")
+    context_service = service_registry.get_service("context")
+    keyword_service = service_registry.get_service("keyword_extraction")
+    article_search_service = service_registry.get_service("article_search")
+    llm_service = service_registry.get_service("llm")
+    # Optional: qualifies and extracts keywords in one LLM call
+    qualifier_keywords_service = (
+        service_registry.get_service("qualifier_keywords")
+        if service_registry.has_service("qualifier_keywords") else None
+    )
     
-    def qualify_message(state: QualifiedWorkflowState):
-        """Determine if the message needs counter-arguments using QualifierService"""
-        # Skip qualification if requested
-        if state.get("_skip_qualification", False):
-            logger.info("Skipping qualification as requested")
-            return {}
-            
-        logger.info(f"Qualifying message: {state['message'].content[:100]}...")
-        
-        # Get the qualifier service
-        qualifier_service = service_registry.get_service("qualifier")
+    async def qualify(message: Message) -> Dict[str, Any]:
+        """
+        Determine if the message needs counter-arguments, picking up search
+        keywords from the same LLM call when the fused service is available
+        """
+        logger.info(f"Qualifying message: {message.content[:100]}...")
         
         # Execute qualification
-        needs_counter_arguments = qualifier_service.execute(message=state["message"])
+        if qualifier_keywords_service is not None:
+            result = await qualifier_keywords_service.execute_async(message=message)
+            needs_counter_arguments = result["needs_counter_arguments"]
+            keywords = result["keywords"]
+        else:
+            needs_counter_arguments = await qualifier_service.execute_async(message=message)
+            keywords = []
         
         logger.info(f"Qualification result: needs_counter_arguments={needs_counter_arguments}")
         
+        return {"needs_counter_arguments": needs_counter_arguments, "keywords": keywords}
+
+    async def qualify_and_context(state: QualifiedWorkflowState):
+        """
+        Qualify the message while fetching its context. Both only need the
+        message, so the context fetch hides under the qualifier's LLM call.
+        """
+        message = state["message"]
+        qualification_only = state.get("_run_qualification_only", False)
+        
+        # Answers only ever use the last few messages, so don't format more.
+        # Callers that already built the context pass it in.
+        context_task = None
+        if not qualification_only and not state.get("context"):
+            logger.info("Getting conversation context...")
+            context_task = asyncio.create_task(
+                asyncio.to_thread(context_service.execute, message=message, depth=HISTORY_MSGS)
+            )
+        
+        try:
+            # Skip qualification if requested
+            if state.get("_skip_qualification", False):
+                logger.info("Skipping qualification as requested")
+                result = {}
+            else:
+                result = await qualify(message)
+        except BaseException:
+            if context_task is not None:
+                context_task.cancel()
+            raise
+        
         # If we're only running qualification, return early
-        if state.get("_run_qualification_only", False):
+        if qualification_only:
             logger.info("Returning after qualification as requested")
-            return {"needs_counter_arguments": needs_counter_arguments}
+            return {"needs_counter_arguments": result["needs_counter_arguments"]}
         
-        return {"needs_counter_arguments": needs_counter_arguments}
+        if context_task is not None:
+            result["context"] = await context_task
+        return result
     
     def prepare_acknowledgment(state: QualifiedWorkflowState):
         """Create acknowledgment message for counter-argument search"""
@@ -54,33 +260,40 @@ def create_qualified_workflow(service_registry: ServiceRegistry):
         if state.get("_skip_acknowledgment", False):
             return {}
         
+        acknowledgment = {
+            "content": "🔄 I'm looking for different perspectives on this topic. I'll share what I find shortly...",
+            "type": "acknowledgment"
+        }
+        
+        # Deliver it right away when the caller gave us a way to
+        if notification_sink is not None:
+            notification_sink(state["message"], acknowledgment)
+            return {}
+        
         # Initialize or get existing messages array
         messages_to_send = state.get("messages_to_send", [])
         
         # Add acknowledgment message
-        messages_to_send.append({
-            "content": "🔄 I'm looking for different perspectives on this topic. I'll share what I find shortly...",
-            "type": "acknowledgment"
-        })
+        messages_to_send.append(acknowledgment)
         
         return {"messages_to_send": messages_to_send}
 
 
-    def get_context(state: QualifiedWorkflowState):
-        """Get context using ContextService"""
-        logger.info("Getting conversation context...")
-        
-        context_service = service_registry.get_service("context")
-        context = context_service.execute(message=state["message"])
-        
-        return {"context": context}
-
-    def extract_keywords(state: QualifiedWorkflowState):
+    async def extract_keywords(state: QualifiedWorkflowState):
         """Extract keywords from the message for article search"""
+        # Already extracted alongside qualification
+        if state.get("keywords"):
+            logger.info(f"Using keywords from qualification: {state['keywords']}")
+            return {}
+        
         logger.info("Extracting keywords for article search...")
         
-        keyword_service = service_registry.get_service("keyword_extraction")
-        keywords = keyword_service.execute(message_content=state["message"].content)
+        # Short messages are handled locally; longer ones still go through the LLM
+        message_content = state["message"].content
+        keywords = (
+            keyword_service.execute_fast(message_content)
+            or await keyword_service.execute_async(message_content=message_content)
+        )
         
         logger.info(f"Extracted keywords: {keywords}")
         
@@ -90,9 +303,6 @@ def create_qualified_workflow(service_registry: ServiceRegistry):
         """Search for articles based on extracted keywords"""
         logger.info(f"Searching for articles using keywords: {state['keywords']}")
         
-        # Get the article search service
-        article_search_service = service_registry.get_service("article_search")
-        
         # Execute search
         articles = article_search_service.execute(keywords=state["keywords"])
         
@@ -100,65 +310,34 @@ def create_qualified_workflow(service_registry: ServiceRegistry):
         
         return {"articles": articles}
 
-    def analyze_counter_arguments(state: QualifiedWorkflowState):
+    async def analyze_counter_arguments(state: QualifiedWorkflowState):
         """Analyze articles to find counter-arguments to the message"""
         logger.info("Analyzing articles for counter-arguments...")
         
         articles = state["articles"]
         message_content = state["message"].content
         
-        # Use Ollama to identify counter-arguments
-        llm_service = service_registry.get_service("llm")
-        
-        # Prepare system message for counter-argument analysis
-        system_message = {
-            "role": "system",
-            "content": """Analyze the provided articles to find counter-arguments to the main statement.
-            
-            For each article, determine if it presents a view that contradicts or provides an alternative 
-            perspective to the main statement.
-            
-            Format your response as a JSON array of objects, with each object containing:
-            1. "title": A concise title for the counter-argument
-            2. "summary": A brief summary of the counter-argument (1-2 sentences)
-            3. "article_index": The index of the article containing this counter-argument
-            
-            Only include counter-arguments that genuinely oppose or offer alternatives to the main statement.
-            If an article doesn't provide a counter-argument, don't include it.
-            
-            Return an empty array if no counter-arguments are found.
-            """
-        }
+        # Send only the sentences relevant to the statement, so long articles
+        # don't blow up the prompt
+        articles_json = orjson.dumps(_article_excerpts(articles, message_content)).decode()
         
         # Prepare user message with main statement and articles
         user_message = {
             "role": "user",
-            "content": f"""Main statement: "{message_content}"
-            
-            Articles to analyze:
-            {[f"Article {i+1}: {article['title']}\n{article['content']}" for i, article in enumerate(articles)]}
-            
-            Find counter-arguments in these articles and format as JSON.
-            """
+            "content": _USER_ANALYZE_TEMPLATE.substitute(statement=message_content, articles=articles_json)
         }
         
-        # Execute LLM call
-        messages = [system_message, user_message]
-        response = llm_service.execute(messages=messages)
+        # Execute LLM call in JSON mode so the response parses directly
+        messages = [_SYS_ANALYZE, user_message]
+        response = await llm_service.execute_async(
+            messages=messages, format="json", use_cache=not state.get("_no_cache", False)
+        )
         
         # Parse the response to extract counter-arguments
         try:
-            import json
-            import re
-            
-            # Try to extract just the JSON array using regex in case there's extra text
-            json_match = re.search(r'\[.*\]', response, re.DOTALL)
-            if json_match:
-                counter_arguments_json = json_match.group(0)
-                counter_arguments = json.loads(counter_arguments_json)
-            else:
-                # Fallback: try to parse the whole response
-                counter_arguments = json.loads(response)
+            counter_arguments = orjson.loads(response)
+            if isinstance(counter_arguments, dict):
+                counter_arguments = counter_arguments.get("counter_arguments", [])
                 
             # Ensure it's a list
             if not isinstance(counter_arguments, list):
@@ -181,17 +360,11 @@ def create_qualified_workflow(service_registry: ServiceRegistry):
             # Return empty counter-arguments in case of parsing error
             return {"counter_arguments": []}
 
-    def generate_standard_response(state: QualifiedWorkflowState):
+    async def generate_standard_response(state: QualifiedWorkflowState):
         """Generate a standard response using LLMService"""
         logger.info("Generating standard response...")
         
-        llm_service = service_registry.get_service("llm")
-        messages = [
-            {"role": "system", "content": """You are a helpful assistant. 
-            Provide clear, concise responses to the user's questions.
-            Focus only on the most recent message, not prior conversation.
-            """}
-        ]
+        messages = [_SYS_STANDARD]
         
         # Only include relevant recent context
         if state["context"].get("messages"):
@@ -201,41 +374,19 @@ def create_qualified_workflow(service_registry: ServiceRegistry):
                     "role": msg["role"],
                     "content": msg["content"]
                 }
-                for msg in state["context"]["messages"][-3:]  # Only use last 3 messages
+                for msg in state["context"]["messages"][-HISTORY_MSGS:]
             ])
         
-        response = llm_service.execute(messages=messages)
+        response = await llm_service.execute_async(messages=messages, use_cache=not state.get("_no_cache", False))
         return {"response": response}
 
-    def generate_counter_argument_response(state: QualifiedWorkflowState):
+    async def generate_counter_argument_response(state: QualifiedWorkflowState):
         """Generate a response that includes counter-arguments"""
         logger.info("Generating response with counter-arguments...")
         
-        llm_service = service_registry.get_service("llm")
         counter_arguments = state["counter_arguments"]
         message_content = state["message"].content
         
-        # Create system message for multi-message response
-        system_message = {
-            "role": "system",
-            "content": f"""You are a helpful assistant that provides balanced perspectives.
-
-            The user has shared a viewpoint about "{message_content}", and you need to present 
-            alternative perspectives in MULTIPLE SEPARATE MESSAGES.
-
-            Format your response as follows:
-            1. FIRST MESSAGE: A brief introduction acknowledging their view and mentioning you'll share different perspectives
-            2. SEPARATE MESSAGES for each counter-argument (maximum 3), with each containing:
-            - A title for the perspective
-            - A brief explanation (2-3 sentences)
-            - The source link in format "[Source: Title](URL)"
-            3. FINAL MESSAGE: A brief balanced conclusion
-
-            IMPORTANT: Format your response as a JSON array of message objects, where each object has a "content" field.
-            Example: [{{"content": "First message..."}}, {{"content": "Second message..."}}]
-            """
-        }
-        
         # Format counter-arguments for the prompt
         counter_args_text = ""
         if counter_arguments:
@@ -250,31 +401,21 @@ def create_qualified_workflow(service_registry: ServiceRegistry):
         # Create user message
         user_message = {
             "role": "user",
-            "content": f"""User's statement: "{message_content}"
-
-            {counter_args_text}
-
-            Split your response into multiple messages as described, with the first acknowledging 
-            the user's perspective and indicating you'll share different viewpoints.
-            
-            Return ONLY the JSON array of messages.
-            """
+            "content": _USER_COUNTER_TEMPLATE.substitute(
+                statement=message_content,
+                counter_args_text=counter_args_text
+            )
         }
         
         # Execute LLM call
-        messages = [system_message, user_message]
-        response = llm_service.execute(messages=messages)
+        messages = [_SYS_COUNTER, user_message]
+        response = await llm_service.execute_async(messages=messages, use_cache=not state.get("_no_cache", False))
         
         # Parse the response to extract multiple messages
         try:
-            import json
-            import re
-            
             # Try to extract the JSON array
-            json_match = re.search(r'\[.*\]', response, re.DOTALL)
-            if json_match:
-                messages_json = json_match.group(0)
-                messages_array = json.loads(messages_json)
+            messages_array = first_json_array(response, accept=_is_message_list)
+            if messages_array is not None:
                 
                 # Store the array of messages in the state
                 return {
@@ -289,11 +430,13 @@ def create_qualified_workflow(service_registry: ServiceRegistry):
             return {"response": response}
     
 
-    # Conditional edge function to route based on qualification and counter-arguments
-    def route_by_qualification(state: QualifiedWorkflowState) -> Literal["standard_response", "extract_keywords"]:
+    # Conditional edge functions to route based on qualification and counter-arguments
+    def route_by_qualification(state: QualifiedWorkflowState) -> Literal["standard_response", "prepare_acknowledgment", "__end__"]:
         """Route based on qualification result"""
+        if state.get("_run_qualification_only", False):
+            return END
         if state["needs_counter_arguments"]:
-            return "extract_keywords"
+            return "prepare_acknowledgment"
         else:
             return "standard_response"
 
@@ -309,30 +452,27 @@ def create_qualified_workflow(service_registry: ServiceRegistry):
     workflow = StateGraph(QualifiedWorkflowState)
     
     # Add nodes
-    workflow.add_node("qualification", qualify_message)
-    workflow.add_node("get_context", get_context)
-    workflow.add_node("extract_keywords", extract_keywords)
-    workflow.add_node("search_for_articles", search_for_articles)
-    workflow.add_node("analyze_counter_arguments", analyze_counter_arguments)
-    workflow.add_node("standard_response", generate_standard_response)
-    workflow.add_node("counter_argument_response", generate_counter_argument_response)
-    workflow.add_node("prepare_acknowledgment", prepare_acknowledgment)
+    workflow.add_node("qualification", timed_node("qualification")(qualify_and_context))
+    workflow.add_node("extract_keywords", timed_node("extract_keywords")(extract_keywords))
+    workflow.add_node("search_for_articles", timed_node("search_for_articles")(search_for_articles))
+    workflow.add_node("analyze_counter_arguments", timed_node("analyze_counter_arguments")(analyze_counter_arguments))
+    workflow.add_node("standard_response", timed_node("standard_response")(generate_standard_response))
+    workflow.add_node("counter_argument_response", timed_node("counter_argument_response")(generate_counter_argument_response))
+    workflow.add_node("prepare_acknowledgment", timed_node("prepare_acknowledgment")(prepare_acknowledgment))
     
     # Define edges
     workflow.add_edge(START, "qualification")
-    workflow.add_edge("qualification", "get_context")
-    
-    # Add conditional routing after context
     workflow.add_conditional_edges(
-        "get_context",
+        "qualification",
         route_by_qualification,
         {
             "standard_response": "standard_response",
-            "extract_keywords": "prepare_acknowledgment"
+            "prepare_acknowledgment": "prepare_acknowledgment",
+            END: END
         }
     )
 
-    # Define counter-argument workflow path
+    # Counter-argument path (context is already in the state)
     workflow.add_edge("prepare_acknowledgment", "extract_keywords")
     workflow.add_edge("extract_keywords", "search_for_articles")
     workflow.add_edge("search_for_articles", "analyze_counter_arguments")
@@ -2,6 +2,9 @@ from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END
 from src.orchestration.services.registry import ServiceRegistry
 from src.core.types import Message  
+from src.llm.service import cached_system_message
+
+_SYS_STANDARD = cached_system_message("You are a helpful assistant.")
 
 class WorkflowState(TypedDict):
     message: Message
@@ -10,19 +13,17 @@ class WorkflowState(TypedDict):
     
 def create_workflow(service_registry: ServiceRegistry):
     """Create workflow with service integration"""
+    context_service = service_registry.get_service("context")
+    llm_service = service_registry.get_service("llm")
     
     def get_context(state: WorkflowState):
         """Get context using ContextService"""
-        context_service = service_registry.get_service("context")
         context = context_service.execute(message=state["message"])
         return {"context": context}
 
     def generate_response(state: WorkflowState):
         """Generate response using LLMService"""
-        llm_service = service_registry.get_service("llm")
-        messages = [
-            {"role": "system", "content": "You are a helpful assistant."}
-        ]
+        messages = [_SYS_STANDARD]
         
         if state["context"].get("messages"):
             for msg in state["context"]["messages"]:
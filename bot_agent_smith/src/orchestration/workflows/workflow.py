@@ -1,33 +1,54 @@
 from dataclasses import dataclass
-from typing import Dict, Optional
+from datetime import datetime, UTC
+from functools import lru_cache
+from string import Template
+from textwrap import dedent
+from typing import AsyncIterator, Dict, Optional
+from typing_extensions import TypedDict
 
-from langgraph.graph import StateGraph, END
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.state import CompiledStateGraph
 from src.core.types import Message
 from src.orchestration.services.registry import ServiceRegistry
 from src.core.logger import logger
 
 from .state import WorkflowState
 
+# Recent context messages included when answering
+HISTORY_MSGS = 3
 
-@dataclass
-class QualificationState:
+# Built once at import; only the user profile varies per request
+_SYS_AGENT_TEMPLATE = Template(dedent("""\
+    You are Agent Smith, an AI assistant.
+    Your goal is to provide helpful and concise responses.
+
+    User profile:
+    $user_profile
+    """))
+
+
+@lru_cache(maxsize=256)
+def _agent_system_message(user_profile: str) -> Dict[str, str]:
+    """System message for a user profile, built once per distinct profile"""
+    return {"role": "system", "content": _SYS_AGENT_TEMPLATE.substitute(user_profile=user_profile)}
+
+
+class QualificationState(TypedDict, total=False):
+    """State for QualificationWorkflow; nodes return only the keys they set"""
     message: Message
-    needs_counterpoints: Optional[bool] = None
-    context: Optional[Dict] = None
-    
-    def dict(self) -> Dict:
-        return {
-            "message": self.message.to_dict(),
-            "needs_counterpoints": self.needs_counterpoints,
-            "context": self.context
-        }
+    needs_counterpoints: Optional[bool]
+    context: Optional[Dict]
 
 class QualificationWorkflow:
     def __init__(self, service_registry: ServiceRegistry):
         self.service_registry = service_registry
+        self._context = service_registry.get_service("context")
+        self._qualifier = service_registry.get_service("qualifier")
+        # Compiled once here and reused for every message
         self.workflow = self._create_workflow()
     
-    def _create_workflow(self) -> StateGraph:
+    def _create_workflow(self) -> CompiledStateGraph:
         workflow = StateGraph(QualificationState)
         
         # Add nodes
@@ -35,35 +56,28 @@ class QualificationWorkflow:
         workflow.add_node("qualifier", self._qualify_message)
         
         # Define edges
+        workflow.add_edge(START, "get_context")
         workflow.add_edge("get_context", "qualifier")
         workflow.add_edge("qualifier", END)
         
-        return workflow
+        return workflow.compile()
     
-    async def _get_context(self, state: Dict) -> Dict:
-        """Get conversation context for the message"""
-        current_state = QualificationState(**state)
+    async def _get_context(self, state: QualificationState) -> Dict:
+        """Get conversation context for the message, unless the caller passed it in"""
+        if state.get("context") is not None:
+            return {}
         
-        context_service = self.service_registry.get_service("context")
-        current_state.context = context_service.execute(current_state.message)
-        
-        return current_state.dict()
+        return {"context": self._context.execute(state["message"])}
     
-    async def _qualify_message(self, state: Dict) -> Dict:
-        """Qualify the message using context"""
-        current_state = QualificationState(**state)
-        
-        qualifier = self.service_registry.get_service("qualifier")
-        current_state.needs_counterpoints = qualifier.execute(
-            message=current_state.message,
-            context=current_state.context
-        )
+    async def _qualify_message(self, state: QualificationState) -> Dict:
+        """Qualify the message (the qualifier reads recent context itself)"""
+        needs_counterpoints = await self._qualifier.execute_async(message=state["message"])
         
-        return current_state.dict()
+        return {"needs_counterpoints": needs_counterpoints}
     
     async def execute(self, message: Message) -> bool:
-        initial_state = QualificationState(message=message)
-        final_state = await self.workflow.ainvoke(initial_state.dict())
+        initial_state: QualificationState = {"message": message}
+        final_state = await self.workflow.ainvoke(initial_state)
         return final_state.get("needs_counterpoints", False)
     
 @dataclass
@@ -72,10 +86,13 @@ class ConversationWorkflow:
     service_registry: ServiceRegistry
     
     def __post_init__(self):
+        self._context = self.service_registry.get_service("context")
+        self._llm = self.service_registry.get_service("llm")
+        # Compiled once here and reused for every message
         self.workflow = self._create_workflow()
     
-    def _create_workflow(self) -> StateGraph:
-        """Create the workflow graph"""
+    def _create_workflow(self) -> CompiledStateGraph:
+        """Create and compile the workflow graph"""
         workflow = StateGraph(WorkflowState)
         
         # Add nodes
@@ -83,47 +100,38 @@ class ConversationWorkflow:
         workflow.add_node("generate_response", self._generate_response)
         
         # Define edges - simple linear flow
+        workflow.add_edge(START, "get_context")
         workflow.add_edge("get_context", "generate_response")
         workflow.add_edge("generate_response", END)
         
-        return workflow
+        return workflow.compile()
     
-    async def _get_context(self, state: Dict) -> Dict:
-        """Get conversation context"""
-        current_state = WorkflowState.from_dict(state)
-        logger.info(f"Getting context for message {current_state.message.id}")
+    async def _get_context(self, state: WorkflowState) -> Dict:
+        """Get conversation context, unless the caller passed it in"""
+        if state.get("context") is not None:
+            logger.info(f"Using provided context for message {state['message'].id}")
+            return {"current_node": "get_context"}
         
-        context_service = self.service_registry.get_service("context")
-        current_state.context = context_service.execute(current_state.message)
-        current_state.current_node = "get_context"
+        logger.info(f"Getting context for message {state['message'].id}")
         
-        return current_state.dict()
+        return {
+            "context": self._context.execute(state["message"]),
+            "current_node": "get_context"
+        }
     
-    async def _generate_response(self, state: Dict) -> Dict:
+    async def _generate_response(self, state: WorkflowState) -> Dict:
         """Generate response using LLM"""
-        current_state = WorkflowState.from_dict(state)
         logger.info("Generating response using LLM")
         
-        llm_service = self.service_registry.get_service("llm")
-        
         # Prepare context for LLM
-        context = current_state.context
+        context = state.get("context")
         conversation_history = context.get("messages", []) if context else []
         
-        messages = [
-            {
-                "role": "system",
-                "content": f"""You are Agent Smith, an AI assistant.
-                Your goal is to provide helpful and concise responses.
-                
-                User profile:
-                {context.get('user', 'No user profile available')}
-                """
-            }
-        ]
+        user_profile = context.get("user") if context else None
+        messages = [_agent_system_message(str(user_profile or "No user profile available"))]
         
         # Add conversation history
-        for msg in conversation_history[-3:]:  # Last 3 messages for context
+        for msg in conversation_history[-HISTORY_MSGS:]:
             messages.append({
                 "role": msg["role"],
                 "content": msg["content"]
@@ -132,35 +140,62 @@ class ConversationWorkflow:
         # Add current message
         messages.append({
             "role": "user",
-            "content": current_state.message.content
+            "content": state["message"].content
         })
         
-        # Get response from LLM
-        response = llm_service.execute(messages=messages)
-        current_state.llm_responses.append(response)
-        current_state.current_node = "generate_response"
+        # Stream the response from the LLM; chunks reach stream_execute callers
+        # as they arrive, and are dropped when running through execute
+        write_chunk = get_stream_writer()
+        chunks = []
+        async for chunk in self._llm.astream(messages=messages):
+            write_chunk(chunk)
+            chunks.append(chunk)
+        response = "".join(chunks)
         
         logger.info("Generated response from LLM")
         logger.debug(f"Response: {response[:100]}...")
         
-        return current_state.dict()
+        return {
+            "llm_responses": [response],
+            "current_node": "generate_response"
+        }
+    
+    def _initial_state(self, state: WorkflowState) -> WorkflowState:
+        """Defaults for every workflow key, overridden by the caller's state"""
+        return {
+            "llm_responses": [],
+            "service_outputs": {},
+            "skills_used": [],
+            "started_at": datetime.now(UTC),
+            "current_node": "start",
+            **state
+        }
     
     async def execute(self, state: WorkflowState) -> str:
         """Execute the workflow for a message"""
         logger.info("========== WORKFLOW EXECUTION ==========")
-        logger.info(f"Starting workflow for message: {state.message.content[:100]}...")
+        logger.info(f"Starting workflow for message: {state['message'].content[:100]}...")
         
         logger.info("Running workflow through LangGraph")
-        final_state = await self.workflow.ainvoke(state.dict())
+        final_state = await self.workflow.ainvoke(self._initial_state(state))
         
-        final_state_obj = WorkflowState.from_dict(final_state)
-        
-        if final_state_obj.llm_responses:
+        llm_responses = final_state.get("llm_responses", [])
+        if llm_responses:
             logger.info("Workflow completed with response")
-            logger.info(f"Final response: {final_state_obj.llm_responses[-1][:100]}...")
+            logger.info(f"Final response: {llm_responses[-1][:100]}...")
         else:
             logger.warning("Workflow completed without response")
             
         logger.info("========== WORKFLOW COMPLETE ==========")
         
-        return final_state_obj.llm_responses[-1] if final_state_obj.llm_responses else ""
\ No newline at end of file
+        return llm_responses[-1] if llm_responses else ""
+    
+    async def stream_execute(self, state: WorkflowState) -> AsyncIterator[str]:
+        """
+        Execute the workflow for a message, yielding the response text as the
+        LLM generates it instead of waiting for the full answer
+        """
+        logger.info(f"Streaming workflow for message: {state['message'].content[:100]}...")
+        
+        async for chunk in self.workflow.astream(self._initial_state(state), stream_mode="custom"):
+            yield chunk
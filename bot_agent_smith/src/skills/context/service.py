@@ -1,18 +1,36 @@
-from dataclasses import dataclass
-from typing import Dict, Any, Optional, List
+from bisect import insort
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Set, Tuple
 from datetime import datetime, timedelta, UTC
+import threading
+import time
 
 from src.core.types import Message, UserProfile
 from src.orchestration.services.registry import ServiceProtocol
 from src.memory.chroma_db.chroma import MessageRepository, UserRepository
 from src.core.logger import logger
 
+# Hard cap on messages handed to the workflows, whatever window_size is configured
+MAX_CONTEXT_MSGS = 20
+
 @dataclass
 class ContextMetadata:
     """Metadata about the context"""
-    last_updated: datetime
     window_size: int
     ttl: timedelta
+    # Monotonic clock reading of the last update: cheaper than timezone-aware
+    # datetimes on the per-message path, and unaffected by wall-clock changes
+    updated_at: float = field(default_factory=time.monotonic)
+
+    def touch(self):
+        """Mark the context as just updated"""
+        self.updated_at = time.monotonic()
+
+    @property
+    def last_updated(self) -> datetime:
+        """Wall-clock time of the last update, for serialization"""
+        return datetime.now(UTC) - timedelta(seconds=time.monotonic() - self.updated_at)
 
 @dataclass
 class ContextWindow:
@@ -21,26 +39,35 @@ class ContextWindow:
     messages: List[Message]
     user_profile: Optional[UserProfile]
     metadata: ContextMetadata
+    # Dedup keys of the messages currently in the window
+    _seen: Set[Tuple] = field(default_factory=set, init=False, repr=False)
+
+    def __post_init__(self):
+        # Keep messages in timestamp order without duplicates, so to_dict
+        # doesn't have to sort or deduplicate on every read
+        messages, self.messages = sorted(self.messages, key=lambda m: m.timestamp), []
+        for message in messages:
+            key = self._dedup_key(message)
+            if key not in self._seen:
+                self._seen.add(key)
+                self.messages.append(message)
 
     def is_stale(self) -> bool:
         """Check if the context needs to be refreshed"""
-        return datetime.now(UTC) - self.metadata.last_updated > self.metadata.ttl
+        return time.monotonic() - self.metadata.updated_at > self.metadata.ttl.total_seconds()
 
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert context to a format suitable for LLM input"""
-        # Only use recent messages from the same conversation
-        conversation_messages = sorted(self.messages, key=lambda m: m.timestamp)
-        
-        # Deduplicate messages based on content and timestamp
-        deduped_messages = []
-        for msg in conversation_messages:
-            # Skip if nearly duplicate of previous message
-            if deduped_messages and self._is_duplicate(msg, deduped_messages[-1]):
-                continue
-            deduped_messages.append(msg)
-        
-        # Use only the last few messages
-        recent_messages = deduped_messages[-self.metadata.window_size:]
+    def to_dict(self, depth: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Convert context to a format suitable for LLM input
+
+        Args:
+            depth: Only include this many of the most recent messages
+        """
+        # Use only the last few messages (already sorted and deduplicated)
+        limit = min(self.metadata.window_size, MAX_CONTEXT_MSGS)
+        if depth is not None:
+            limit = min(limit, depth)
+        recent_messages = self.messages[-limit:] if limit > 0 else []
         
         return {
             "conversation_id": self.conversation_id,
@@ -63,12 +90,34 @@ class ContextWindow:
             }
         }
     
-    def _is_duplicate(self, msg1: Message, msg2: Message) -> bool:
-        """Check if two messages are very similar (duplicates)"""
-        content_match = msg1.content == msg2.content
-        author_match = msg1.author.id == msg2.author.id
-        time_close = abs((msg1.timestamp - msg2.timestamp).total_seconds()) < 5
-        return content_match and author_match and time_close
+    def add(self, message: Message) -> bool:
+        """
+        Add a message in timestamp order, trimming the window once it holds
+        twice its size. Returns False if it duplicates a message already in it.
+        """
+        key = self._dedup_key(message)
+        if key in self._seen:
+            return False
+        
+        self._seen.add(key)
+        if self.messages and message.timestamp < self.messages[-1].timestamp:
+            insort(self.messages, message, key=lambda m: m.timestamp)
+        else:
+            self.messages.append(message)
+        
+        if len(self.messages) > self.metadata.window_size * 2:  # Allow buffer
+            # Keep most recent
+            for dropped in self.messages[:-self.metadata.window_size]:
+                self._seen.discard(self._dedup_key(dropped))
+            self.messages = self.messages[-self.metadata.window_size:]
+        return True
+
+    @staticmethod
+    def _dedup_key(message: Message) -> Tuple:
+        """Messages sharing author, content and 5 second time slot count as duplicates"""
+        # Cheap fields first: on a hash collision tuples compare element by
+        # element, so a long content compare only happens when the rest match
+        return (message.author.id, int(message.timestamp.timestamp()) // 5, message.content)
 
 @dataclass
 class ContextService(ServiceProtocol):
@@ -80,17 +129,29 @@ class ContextService(ServiceProtocol):
     max_windows: int = 20
     
     def __post_init__(self):
-        self.active_windows: Dict[str, ContextWindow] = {}
+        # Least recently used first
+        self.active_windows: OrderedDict[str, ContextWindow] = OrderedDict()
+        # Workflows call execute from worker threads; guards active_windows and
+        # the windows' message lists. Repository reads happen outside it.
+        self._lock = threading.Lock()
+
+    def execute(self, message: Message, depth: Optional[int] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Get or create context window for a message
 
-    def execute(self, message: Message, **kwargs) -> Dict[str, Any]:
-        """Get or create context window for a message"""
+        Args:
+            message: The incoming message, added to its conversation's window
+            depth: Only return this many of the most recent messages, for
+                callers that don't need the whole window
+        """
         logger.info(f"Getting context for conversation: {message.conversation_id}")
         window = self._get_or_create_window(
             conversation_id=message.conversation_id,
             user_id=message.author.id
         )
-        window = self._add_message(window, message)
-        context_dict = window.to_dict()
+        with self._lock:
+            window = self._add_message(window, message)
+            context_dict = window.to_dict(depth)
         
         # Log context messages for debugging
         logger.info(f"Context contains {len(context_dict['messages'])} messages")
@@ -106,22 +167,20 @@ class ContextService(ServiceProtocol):
     ) -> ContextWindow:
         """Get existing window or create new one"""
         # Return existing window if not stale
-        if conversation_id in self.active_windows:
-            window = self.active_windows[conversation_id]
-            if not window.is_stale():
-                return window
+        with self._lock:
+            window = self._fresh_window(conversation_id)
+        if window is not None:
+            return window
 
         # Fetch recent messages for this specific conversation only
         logger.info(f"Creating new context window for conversation: {conversation_id}")
-        messages = self.message_repository.get_by_conversation(conversation_id)
-        
-        # Only use messages from the last hour to avoid old context
-        recent_time = datetime.now(UTC) - timedelta(hours=1)
-        recent_messages = [m for m in messages if m.timestamp > recent_time]
-        
-        # Sort by timestamp and limit to window size
-        sorted_messages = sorted(recent_messages, key=lambda m: m.timestamp)
-        window_messages = sorted_messages[-self.window_size:] if sorted_messages else []
+        # Only use the newest messages from the last hour, filtered by the
+        # repository so older history isn't loaded at all
+        window_messages = self.message_repository.get_by_conversation(
+            conversation_id,
+            since=datetime.now(UTC) - timedelta(hours=1),
+            limit=self.window_size
+        )
 
         # Fetch user profile if provided
         user_profile = None
@@ -130,7 +189,6 @@ class ContextService(ServiceProtocol):
 
         # Create metadata
         metadata = ContextMetadata(
-            last_updated=datetime.now(UTC),
             window_size=self.window_size,
             ttl=self.ttl
         )
@@ -143,31 +201,33 @@ class ContextService(ServiceProtocol):
             metadata=metadata
         )
 
-        # Manage active windows limit
-        if len(self.active_windows) >= self.max_windows:
-            oldest_id = min(
-                self.active_windows.keys(),
-                key=lambda k: self.active_windows[k].metadata.last_updated
-            )
-            del self.active_windows[oldest_id]
+        with self._lock:
+            # Another thread may have built this window while we were fetching
+            current = self._fresh_window(conversation_id)
+            if current is not None:
+                return current
+
+            # Manage active windows limit, dropping the least recently used
+            if conversation_id not in self.active_windows and len(self.active_windows) >= self.max_windows:
+                self.active_windows.popitem(last=False)
+
+            self.active_windows[conversation_id] = window
+            self.active_windows.move_to_end(conversation_id)
+        return window
 
-        self.active_windows[conversation_id] = window
+    def _fresh_window(self, conversation_id: str) -> Optional[ContextWindow]:
+        """The conversation's window, marked recently used, unless missing or stale. Caller holds the lock."""
+        window = self.active_windows.get(conversation_id)
+        if window is None or window.is_stale():
+            return None
+        self.active_windows.move_to_end(conversation_id)
         return window
 
     def _add_message(self, window: ContextWindow, message: Message) -> ContextWindow:
         """Add a message to the context window"""
-        # Check if the message is a duplicate
-        for existing in window.messages:
-            if window._is_duplicate(message, existing):
-                logger.info(f"Skipping duplicate message: {message.content[:50]}...")
-                return window
-                
-        # Add message and update window
-        window.messages.append(message)
-        if len(window.messages) > window.metadata.window_size * 2:  # Allow buffer
-            # Sort by timestamp and keep most recent
-            window.messages = sorted(window.messages, key=lambda m: m.timestamp)
-            window.messages = window.messages[-window.metadata.window_size:]
+        if not window.add(message):
+            logger.info(f"Skipping duplicate message: {message.content[:50]}...")
+            return window
             
-        window.metadata.last_updated = datetime.now(UTC)
+        window.metadata.touch()
         return window
\ No newline at end of file
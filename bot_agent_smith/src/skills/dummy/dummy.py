@@ -1,3 +1,4 @@
+import logging
 from dataclasses import dataclass
 from typing import Any
 from src.core.logger import logger
@@ -9,10 +10,13 @@ class DebugService(ServiceProtocol):
     name: str
 
     def execute(self, **kwargs: Any) -> Any:
-        """Log inputs and return a dummy response"""
-        logger.info(f"[{self.name}] Service called with args:")
-        for key, value in kwargs.items():
-            logger.info(f"  {key}: {value}")
+        """Log inputs (at DEBUG level) and return a dummy response"""
+        # Formatting whole messages and contexts is costly, so skip it entirely
+        # unless someone is looking
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[%s] Service called with args:", self.name)
+            for key, value in kwargs.items():
+                logger.debug("  %s: %r", key, value)
         
         # Return dummy response
         return {
@@ -0,0 +1,82 @@
+# src/skills/embedding/cache.py
+from typing import Dict, List, Optional
+from pathlib import Path
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+
+from src.core.cache import TTLCache
+from src.core.logger import logger
+
+# Part of every key, so entries stored before the vectors changed form are
+# not served again. v2: embeddings are L2-normalized.
+CACHE_FORMAT = "v2-normalized"
+
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by a hash of (format, model name, text), so identical content is
+    only embedded once. Recent entries are kept in memory; when a path is
+    given, every entry is also stored in SQLite and survives restarts.
+    """
+
+    def __init__(self, model_name: str, maxsize: int = 10000, path: Optional[str] = None):
+        self.model_name = model_name
+        self._memory = TTLCache(maxsize=maxsize, ttl=None)
+        self._db = None
+        self._lock = threading.Lock()
+
+        if path:
+            Path(path).expanduser().parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(Path(path).expanduser(), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, vec BLOB NOT NULL)"
+            )
+            self._db.commit()
+            logger.info(f"Persisting embeddings to {path}")
+
+    def key(self, text: str) -> bytes:
+        """Cache key for a text under this cache's model"""
+        return hashlib.blake2b(
+            f"{CACHE_FORMAT}\0{self.model_name}\0{text}".encode(), digest_size=16
+        ).digest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """Return the cached embedding for a text, if any"""
+        key = self.key(text)
+        embedding = self._memory.get(key)
+        if embedding is not None or self._db is None:
+            return embedding
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT vec FROM embeddings WHERE hash = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        embedding = np.frombuffer(row[0], dtype=np.float32).tolist()
+        self._memory.set(key, embedding)
+        return embedding
+
+    def set(self, text: str, embedding: List[float]):
+        """Store the embedding for a text"""
+        self.set_many({text: embedding})
+
+    def set_many(self, embeddings: Dict[str, List[float]]):
+        """Store embeddings for several texts, in a single SQLite transaction"""
+        rows = []
+        for text, embedding in embeddings.items():
+            key = self.key(text)
+            self._memory.set(key, embedding)
+            rows.append((key, np.asarray(embedding, dtype=np.float32).tobytes()))
+        if self._db is None or not rows:
+            return
+
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, vec) VALUES (?, ?)",
+                rows
+            )
+            self._db.commit()
@@ -2,9 +2,11 @@
 from dataclasses import dataclass
 from typing import List, Union, Dict, Any
 import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 
 from src.core.types import Message, UserProfile
+from src.skills.embedding.cache import EmbeddingCache
 from src.orchestration.services.registry import ServiceProtocol
 from src.core.logger import logger
 import os
@@ -17,7 +19,17 @@ class EmbeddingService(ServiceProtocol):
     
     def __post_init__(self):
         logger.info(f"Initializing embedding model: {self.model_name}")
-        self.model = SentenceTransformer(self.model_name)
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = SentenceTransformer(self.model_name, device=device)
+        if device == "cuda":
+            # Half precision halves weight and activation bandwidth on GPU
+            self.model = self.model.half()
+        else:
+            # Encodes run in worker threads; cap torch's own pool so they don't oversubscribe the CPU
+            torch.set_num_threads(min(4, os.cpu_count() or 1))
+        # Run one encode now so the first real message doesn't pay for lazy initialization
+        self.model.encode("warmup")
+        logger.info(f"Embedding model running on {device}")
         self.vector_dim = self.model.get_sentence_embedding_dimension()
         logger.info(f"Embedding model initialized with dimension: {self.vector_dim}")
         
@@ -25,12 +37,38 @@ class EmbeddingService(ServiceProtocol):
         env_dim = int(os.getenv('EMBEDDING_DIMENSION', '384'))
         if self.vector_dim != env_dim:
             logger.warning(f"Model dimension ({self.vector_dim}) doesn't match EMBEDDING_DIMENSION ({env_dim}) in environment!")
+        
+        # Identical texts (repeats, retries, quotes) are embedded once
+        self.cache = EmbeddingCache(self.model_name, path=os.getenv('EMBEDDING_CACHE_PATH'))
     
     def execute(self, text: str, **kwargs) -> List[float]:
         """Create embedding for a text string"""
+        embedding = self.cache.get(text)
+        if embedding is not None:
+            return embedding
+        
         logger.info(f"Creating embedding for text: {text[:50]}...")
-        embedding = self.model.encode(text)
-        return embedding.tolist()  # Convert numpy array to list
+        # Normalized so vector stores can score with a plain dot product
+        embedding = self.model.encode(text, normalize_embeddings=True).tolist()  # Convert numpy array to list
+        self.cache.set(text, embedding)
+        return embedding
+    
+    def execute_many(self, texts: List[str], batch_size: int = 64) -> List[List[float]]:
+        """
+        Create embeddings for several texts, encoding every uncached text in
+        one batched forward pass instead of one call per text
+        """
+        embeddings = [self.cache.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if not missing:
+            return embeddings
+        
+        logger.info(f"Creating embeddings for {len(missing)} texts")
+        encoded = self.model.encode(missing, batch_size=batch_size, normalize_embeddings=True)
+        fresh = dict(zip(missing, encoded.tolist()))
+        self.cache.set_many(fresh)
+        
+        return [embedding if embedding is not None else fresh[text] for text, embedding in zip(texts, embeddings)]
     
     def embed_message(self, message: Message) -> Message:
         """Add embedding to a message"""
@@ -39,6 +77,15 @@ class EmbeddingService(ServiceProtocol):
             logger.info(f"Created embedding for message {message.id}")
         return message
     
+    def embed_messages(self, messages: List[Message]) -> List[Message]:
+        """Add embeddings to several messages with a single batched encode"""
+        pending = [message for message in messages if not message.embedding]
+        if pending:
+            for message, embedding in zip(pending, self.execute_many([m.content for m in pending])):
+                message.embedding = embedding
+            logger.info(f"Created embeddings for {len(pending)} messages")
+        return messages
+    
     def embed_user(self, user: UserProfile) -> UserProfile:
         """Add embedding to a user profile based on interests"""
         if not user.embedding:
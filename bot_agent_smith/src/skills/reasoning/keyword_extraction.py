@@ -1,13 +1,116 @@
-from dataclasses import dataclass
-from typing import List, Dict, Any
+from dataclasses import dataclass, field
+from textwrap import dedent
+from functools import cache
+from typing import Callable, List, Dict, Any
+import json
 
 from src.core.logger import logger
+from src.core.cache import TTLCache
+from src.llm.service import first_json_array, response_key, send_message_async
 from src.orchestration.services.registry import ServiceProtocol
 
+# Messages shorter than this (in words) use the local extractor instead of the LLM
+FAST_PATH_MAX_WORDS = 30
+
+# Keywords only depend on the message, so identical messages reuse the earlier response
+RESPONSE_CACHE_TTL = 24 * 3600
+
+DEFAULT_KEYWORDS = ["artificial intelligence", "ethics", "technology"]
+
+_KEYWORD_SYSTEM_PROMPT = dedent("""\
+    You are a keyword extraction system that identifies the most relevant
+    search terms from a user's message or conversation.
+
+    Extract exactly 3 keywords or short phrases that:
+    1. Capture the main topic being discussed
+    2. Are suitable for searching for articles on this topic
+    3. Would help find diverse perspectives on the topic
+
+    Format your response as a JSON list of exactly 3 strings, nothing else:
+    ["keyword1", "keyword2", "keyword3"]
+    """)
+
+_BATCH_KEYWORD_SYSTEM_PROMPT = dedent("""\
+    You are a keyword extraction system that identifies the most relevant
+    search terms from users' messages.
+
+    For each message, extract exactly 3 keywords or short phrases that:
+    1. Capture the main topic being discussed
+    2. Are suitable for searching for articles on this topic
+    3. Would help find diverse perspectives on the topic
+
+    Format your response as a JSON array with one array of exactly 3 strings per
+    message, in the order the messages are given, nothing else:
+    [["keyword1", "keyword2", "keyword3"], ["keyword1", "keyword2", "keyword3"]]
+    """)
+
+@cache
+def _yake_extractor():
+    """Build the YAKE extractor once; None when yake isn't installed"""
+    try:
+        import yake
+    except ImportError:
+        logger.warning("yake not installed, keyword extraction always uses the LLM")
+        return None
+    return yake.KeywordExtractor(lan="en", n=2, top=8)
+
+def _is_keyword_list(value: List[Any]) -> bool:
+    """A non-empty array of strings, unlike a "[1]" citation in the prose"""
+    return bool(value) and all(isinstance(keyword, str) for keyword in value)
+
+def _three_keywords(keywords: List[Any]) -> List[str]:
+    """Trim or pad a keyword list to exactly 3 entries"""
+    keywords = [str(keyword) for keyword in keywords[:3]]
+    
+    # If we have fewer than 3, add defaults
+    while len(keywords) < 3:
+        keywords.append("technology")
+    return keywords
+
 @dataclass
 class KeywordExtractionService(ServiceProtocol):
     """Service that extracts keywords from a message for searching articles"""
     ollama_client: Any  # Parameter name kept for backward compatibility
+    # LLM responses keyed on the exact prompt
+    response_cache: TTLCache = field(
+        default_factory=lambda: TTLCache(maxsize=512, ttl=RESPONSE_CACHE_TTL), repr=False
+    )
+
+    def __post_init__(self):
+        # Build the local extractor up front so requests only pay for extraction
+        _yake_extractor()
+        # The client never changes, so look its message type up once
+        self._message_type = self._client_message_type()
+
+    def execute_fast(self, message_content: str) -> List[str]:
+        """
+        Extract keywords locally with YAKE, without an LLM round-trip
+
+        Args:
+            message_content: The message content to analyze
+
+        Returns:
+            List[str]: Up to 3 keywords, or an empty list when the message is
+            too long for the fast path or yake is unavailable
+        """
+        if len(message_content.split()) >= FAST_PATH_MAX_WORDS:
+            return []
+
+        extractor = _yake_extractor()
+        if extractor is None:
+            return []
+
+        # YAKE ranks overlapping n-grams; skip ones already covered by a better keyword
+        keywords = []
+        for keyword, _score in extractor.extract_keywords(message_content):
+            if any(keyword.lower() in kept.lower() or kept.lower() in keyword.lower() for kept in keywords):
+                continue
+            keywords.append(keyword)
+            if len(keywords) == 3:
+                break
+
+        logger.info(f"Extracted keywords locally: {keywords}")
+        return keywords
     
     def execute(self, message_content: str, **kwargs) -> List[str]:
         """
@@ -21,19 +124,40 @@ class KeywordExtractionService(ServiceProtocol):
         """
         logger.info(f"Extracting keywords from: {message_content[:100]}...")
         
-        # System and user prompts
-        system_prompt = """You are a keyword extraction system that identifies the most relevant 
-        search terms from a user's message or conversation.
+        messages = self._build_messages(message_content)
+        cache_key = self._cache_key(messages)
         
-        Extract exactly 3 keywords or short phrases that:
-        1. Capture the main topic being discussed
-        2. Are suitable for searching for articles on this topic
-        3. Would help find diverse perspectives on the topic
+        response_text = self.response_cache.get(cache_key)
+        if response_text is None:
+            # Get response from the LLM client
+            response_text = self.ollama_client.send_message(messages).response
+            self.response_cache.set(cache_key, response_text)
+        logger.info(f"Keyword extractor received response: {response_text}")
         
-        Format your response as a JSON list of exactly 3 strings, nothing else:
-        ["keyword1", "keyword2", "keyword3"]
-        """
+        return self._parse_response(response_text)
+
+    async def execute_async(self, message_content: str, **kwargs) -> List[str]:
+        """Same as execute, without blocking the event loop"""
+        logger.info(f"Extracting keywords from: {message_content[:100]}...")
+        
+        messages = self._build_messages(message_content)
+        cache_key = self._cache_key(messages)
+        
+        response_text = self.response_cache.get(cache_key)
+        if response_text is None:
+            response_text = (await send_message_async(self.ollama_client, messages)).response
+            self.response_cache.set(cache_key, response_text)
+        logger.info(f"Keyword extractor received response: {response_text}")
         
+        return self._parse_response(response_text)
+
+    def _cache_key(self, messages: List[Any]) -> bytes:
+        """Response cache key for a prompt sent to this service's client"""
+        return response_key(messages, getattr(self.ollama_client, "model", None), None)
+
+    def _build_messages(self, message_content: str) -> List[Any]:
+        """Keyword extraction prompt for one message, in the client's message type"""
+        # The system prompt is static; only the user prompt varies
         user_prompt = f"""Extract the 3 most important keywords from this message:
         
         "{message_content}"
@@ -41,79 +165,103 @@ class KeywordExtractionService(ServiceProtocol):
         Remember to respond with only a JSON array of 3 keywords.
         """
         
+        return self._to_client_messages(_KEYWORD_SYSTEM_PROMPT, user_prompt)
+
+    def _parse_response(self, response: str) -> List[str]:
+        """Read exactly 3 keywords from the LLM response, falling back to defaults"""
+        try:
+            # The response should be a JSON array, but may come with extra text around it
+            keywords = first_json_array(response, accept=_is_keyword_list)
+                
+            # Ensure we have exactly 3 keywords
+            if not isinstance(keywords, list):
+                logger.warning("Response is not a list, using default keywords")
+                return list(DEFAULT_KEYWORDS)
+                
+            keywords = _three_keywords(keywords)
+            logger.info(f"Extracted keywords: {keywords}")
+            return keywords
+            
+        except json.JSONDecodeError as e:
+            logger.error(f"Error parsing keywords: {e}")
+            # Return default keywords in case of parsing error
+            return list(DEFAULT_KEYWORDS)
+
+    def execute_batch(self, message_contents: List[str]) -> List[List[str]]:
+        """
+        Extract keywords for several messages with a single LLM call
+        
+        Args:
+            message_contents: The message contents to analyze
+            
+        Returns:
+            List[List[str]]: 3 keywords per message, in the same order. If the
+            batched response can't be parsed, each message is extracted on its own.
+        """
+        if len(message_contents) <= 1:
+            return [self.execute(message_content=content) for content in message_contents]
+        
+        logger.info(f"Extracting keywords for {len(message_contents)} messages in one call")
+        
+        numbered = "\n".join(f'{i}: "{content}"' for i, content in enumerate(message_contents, 1))
+        user_prompt = f"""Extract the 3 most important keywords from each of these {len(message_contents)} messages:
+        
+        {numbered}
+        
+        Remember to respond with only a JSON array of {len(message_contents)} arrays of 3 keywords.
+        """
+        
+        response = self.ollama_client.send_message(self._to_client_messages(_BATCH_KEYWORD_SYSTEM_PROMPT, user_prompt))
+        logger.info(f"Keyword extractor received batch response: {response.response}")
+        
+        try:
+            batches = first_json_array(
+                response.response,
+                accept=lambda value: len(value) == len(message_contents)
+                and all(isinstance(keywords, list) for keywords in value)
+            )
+        except json.JSONDecodeError as e:
+            logger.error(f"Error parsing batched keywords: {e}")
+            batches = None
+        
+        if (
+            not isinstance(batches, list)
+            or len(batches) != len(message_contents)
+            or not all(isinstance(keywords, list) for keywords in batches)
+        ):
+            logger.warning("Unusable batched keyword response, extracting one message at a time")
+            return [self.execute(message_content=content) for content in message_contents]
+        
+        return [_three_keywords(keywords) for keywords in batches]
+
+    def _client_message_type(self) -> Callable[..., Any]:
+        """Message class the client expects (dict for LLMService), from its module"""
         # Determine client type based on module name
         client_module = type(self.ollama_client).__module__
         
-        # Create messages for LLM based on client type
         if "ollama" in client_module:
             # Import here to avoid circular imports
             from src.llm.ollama import OllamaMessage
-            messages = [
-                OllamaMessage(role="system", content=system_prompt),
-                OllamaMessage(role="user", content=user_prompt)
-            ]
+            return OllamaMessage
         elif "gcp_models" in client_module:
             # Import here to avoid circular imports
             from src.llm.gcp_models.models import GCPMessage
-            messages = [
-                GCPMessage(role="system", content=system_prompt),
-                GCPMessage(role="user", content=user_prompt)
-            ]
+            return GCPMessage
         else:
             # Generic approach for unknown client types
             logger.warning(f"Unknown LLM client type in KeywordExtractionService: {client_module}")
-            # Create messages as properly formatted objects for this client type,
-            # not just dictionaries
             from src.llm.service import LLMService
             if isinstance(self.ollama_client, LLMService):
                 # If we have an LLMService, use dicts as it expects
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
+                return dict
             else:
                 # Default case, let's try the GCPMessage format
                 from src.llm.gcp_models.models import GCPMessage
-                messages = [
-                    GCPMessage(role="system", content=system_prompt),
-                    GCPMessage(role="user", content=user_prompt)
-                ]
-        
-        # Get response from the LLM client
-        response = self.ollama_client.send_message(messages)
-        logger.info(f"Keyword extractor received response: {response.response}")
-        
-        # Parse the response to extract keywords
-        try:
-            # The response should be a JSON array, but let's handle common formatting issues
-            import json
-            import re
-            
-            # Try to extract just the JSON array using regex in case there's extra text
-            json_match = re.search(r'\[.*?\]', response.response, re.DOTALL)
-            if json_match:
-                keywords_json = json_match.group(0)
-                keywords = json.loads(keywords_json)
-            else:
-                # Fallback: try to parse the whole response
-                keywords = json.loads(response.response)
-                
-            # Ensure we have exactly 3 keywords
-            if not isinstance(keywords, list):
-                logger.warning("Response is not a list, using default keywords")
-                return ["artificial intelligence", "ethics", "technology"]
-                
-            # Limit to 3 keywords
-            keywords = keywords[:3]
-            
-            # If we have fewer than 3, add defaults
-            while len(keywords) < 3:
-                keywords.append("technology")
-                
-            logger.info(f"Extracted keywords: {keywords}")
-            return keywords
-            
-        except Exception as e:
-            logger.error(f"Error parsing keywords: {e}")
-            # Return default keywords in case of parsing error
-            return ["artificial intelligence", "ethics", "technology"]
\ No newline at end of file
+                return GCPMessage
+
+    def _to_client_messages(self, system_prompt: str, user_prompt: str) -> List[Any]:
+        """Build the system/user pair in the message type the client expects"""
+        return [
+            self._message_type(role="system", content=system_prompt),
+            self._message_type(role="user", content=user_prompt)
+        ]
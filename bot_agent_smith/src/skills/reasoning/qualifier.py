@@ -1,12 +1,114 @@
-from dataclasses import dataclass
-from typing import Optional, List, Any
+from dataclasses import dataclass, field
+from textwrap import dedent
+from typing import Callable, Optional, List, Any, Dict
 from datetime import datetime, UTC
+import asyncio
+import json
+import os
+import re
 
 from src.core.types import Message
 from src.core.logger import logger
+from src.core.cache import TTLCache
+from src.llm.service import first_json_object, response_key, send_message_async
 from src.memory.chroma_db.chroma import MessageRepository
 from src.orchestration.services.registry import ServiceProtocol
 
+# Greetings and acknowledgments never need counter-arguments
+_SMALL_TALK_RE = re.compile(
+    r"^\s*(hi|hello|hey|yo|thanks|thank you|thx|ok|okay|cool|bye|good (morning|evening|night))\b[\s\W]*$",
+    re.IGNORECASE
+)
+
+# Questions about the bot itself have nothing to counter
+_IDENTITY_QUESTION_RE = re.compile(
+    r"^\s*(who are you|what are you|what('s| is) your name|what can you do)\b[\s\W]*$",
+    re.IGNORECASE
+)
+
+# No letters or digits at all: emoji, punctuation, or an attachment with no text
+_NO_TEXT_RE = re.compile(r"^[\W_]*$")
+
+# Identical prompts (same message and recent context) reuse the earlier decision
+RESPONSE_CACHE_TTL = 24 * 3600
+
+# Set USE_LLM_QUALIFICATION=1 to send every message to the LLM, e.g. to compare
+# its decisions with the rules below
+USE_LLM_QUALIFICATION = os.getenv('USE_LLM_QUALIFICATION', '0') == '1'
+
+_QUALIFIER_SYSTEM_PROMPT = dedent("""\
+    You are the Bubble Buster, analyzing conversations for opportunities to explore different viewpoints.
+
+    Consider these criteria before deciding:
+    1. Specificity: Does the message or conversation context contain concrete claims or topics?
+    2. Substance: Is there enough meaningful content to find opposing views?
+    3. Clarity: Are the claims or topics clear enough without needing clarification?
+
+    Return false for:
+    - Simple factual queries or greetings
+    - Vague statements without context ("it's the best")
+    - Personal preferences without broader implications
+    - Technical how-to questions
+    - Basic identity questions
+    - Messages lacking specific claims or topics
+
+    Return true only when:
+    1. There are clear, specific topics or claims to explore
+    2. The conversation provides enough context to understand the topic
+    3. The content is substantial enough to meaningfully explore different viewpoints
+
+    Return ONLY true or false.
+    """)
+
+_QUALIFIER_KEYWORDS_SYSTEM_PROMPT = dedent("""\
+    You are the Bubble Buster, analyzing conversations for opportunities to explore different viewpoints.
+
+    Consider these criteria before deciding:
+    1. Specificity: Does the message or conversation context contain concrete claims or topics?
+    2. Substance: Is there enough meaningful content to find opposing views?
+    3. Clarity: Are the claims or topics clear enough without needing clarification?
+
+    Set needs_counter_arguments to false for:
+    - Simple factual queries or greetings
+    - Vague statements without context ("it's the best")
+    - Personal preferences without broader implications
+    - Technical how-to questions
+    - Basic identity questions
+    - Messages lacking specific claims or topics
+
+    Set it to true only when:
+    1. There are clear, specific topics or claims to explore
+    2. The conversation provides enough context to understand the topic
+    3. The content is substantial enough to meaningfully explore different viewpoints
+
+    When it is true, also give exactly 3 keywords or short phrases that capture the main
+    topic and are suitable for searching articles with diverse perspectives on it.
+
+    Respond with a JSON object only:
+    {"needs_counter_arguments": true or false, "keywords": ["keyword1", "keyword2", "keyword3"]}
+    """)
+
+def obviously_no_counter_arguments(message: Message) -> bool:
+    """
+    Rule-based shortcut for messages that clearly don't need counter-arguments:
+    small talk, questions about the bot, and messages without any text.
+    Everything else goes to the LLM.
+    """
+    if USE_LLM_QUALIFICATION:
+        return False
+
+    content = message.content
+    if _SMALL_TALK_RE.match(content):
+        logger.info("Small talk, no counter-arguments needed")
+        return True
+    if _IDENTITY_QUESTION_RE.match(content):
+        logger.info("Question about the bot, no counter-arguments needed")
+        return True
+    if _NO_TEXT_RE.match(content):
+        logger.info("No text to analyze, no counter-arguments needed")
+        return True
+    return False
+
 @dataclass
 class QualifierService(ServiceProtocol):
     """Service that determines if a message needs counter-arguments"""
@@ -14,11 +116,17 @@ class QualifierService(ServiceProtocol):
     message_repository: MessageRepository
     window_size: int = 3
     model_family: Optional[str] = None
+    # LLM responses keyed on the exact prompt
+    response_cache: TTLCache = field(
+        default_factory=lambda: TTLCache(maxsize=512, ttl=RESPONSE_CACHE_TTL), repr=False
+    )
 
     def __post_init__(self):
         if self.model_family is None:
             from src.llm import get_default_model
             self.model_family = get_default_model()
+        # The client never changes, so look its message type up once
+        self._message_type = self._client_message_type()
 
     def execute(self, message: Message, model_family: Optional[str] = None) -> bool:
         """
@@ -32,51 +140,67 @@ class QualifierService(ServiceProtocol):
         Returns:
             bool: True if the message needs counter-arguments
         """
-        # Use specified model_family or the default
-        client = self.ollama_client
-        used_model_family = model_family or self.model_family
-        
-        logger.info(f"QualifierService using model family: {used_model_family}")
-        logger.info(f"QualifierService analyzing: {message.content}")
+        self._log_start(message, model_family)
 
-        # Get recent messages for context
-        conversation_messages = self.message_repository.get_by_conversation(
-            message.conversation_id
-        )
-        # Sort by timestamp and get last n messages
-        conversation_messages.sort(key=lambda m: m.timestamp)
-        context_messages = conversation_messages[-self.window_size:]
+        if obviously_no_counter_arguments(message):
+            return self._not_needed()
+
+        messages = self._build_messages(message, self._recent_context(message))
+        cache_key = self._cache_key(messages)
+
+        response_text = self.response_cache.get(cache_key)
+        if response_text is None:
+            # Get response from the LLM client
+            response_text = self.ollama_client.send_message(messages, **self._send_kwargs()).response
+            self.response_cache.set(cache_key, response_text)
+        logger.info(f"{type(self).__name__} received response: {response_text}")
         
-        # Format context for prompt
-        context_str = "\n".join([
-            f"{msg.author.name}: {msg.content}" 
-            for msg in context_messages
-        ])
+        return self._parse_response(response_text)
 
-        # Create system and user prompts
-        system_prompt = """You are the Bubble Buster, analyzing conversations for opportunities to explore different viewpoints.
+    async def execute_async(self, message: Message, model_family: Optional[str] = None) -> bool:
+        """Same as execute, without blocking the event loop"""
+        self._log_start(message, model_family)
 
-        Consider these criteria before deciding:
-        1. Specificity: Does the message or conversation context contain concrete claims or topics?
-        2. Substance: Is there enough meaningful content to find opposing views?
-        3. Clarity: Are the claims or topics clear enough without needing clarification?
+        if obviously_no_counter_arguments(message):
+            return self._not_needed()
 
-        Return false for:
-        - Simple factual queries or greetings
-        - Vague statements without context ("it's the best")
-        - Personal preferences without broader implications
-        - Technical how-to questions
-        - Basic identity questions
-        - Messages lacking specific claims or topics
+        context_str = await asyncio.to_thread(self._recent_context, message)
+        messages = self._build_messages(message, context_str)
+        cache_key = self._cache_key(messages)
 
-        Return true only when:
-        1. There are clear, specific topics or claims to explore
-        2. The conversation provides enough context to understand the topic
-        3. The content is substantial enough to meaningfully explore different viewpoints
+        response_text = self.response_cache.get(cache_key)
+        if response_text is None:
+            response = await send_message_async(self.ollama_client, messages, **self._send_kwargs())
+            response_text = response.response
+            self.response_cache.set(cache_key, response_text)
+        logger.info(f"{type(self).__name__} received response: {response_text}")
+        
+        return self._parse_response(response_text)
 
-        Return ONLY true or false.
-        """
+    def _log_start(self, message: Message, model_family: Optional[str]) -> None:
+        """Log the model family and message being qualified"""
+        # Use specified model_family or the default
+        used_model_family = model_family or self.model_family
         
+        logger.info(f"{type(self).__name__} using model family: {used_model_family}")
+        logger.info(f"{type(self).__name__} analyzing: {message.content}")
+
+    def _cache_key(self, messages: List[Any]) -> bytes:
+        """Response cache key for a prompt sent to this service's client"""
+        model = getattr(self.ollama_client, "model", None)
+        return response_key(messages, model, self._send_kwargs().get("format"))
+
+    def _not_needed(self) -> bool:
+        """Result for messages that skip the LLM"""
+        return False
+
+    def _send_kwargs(self) -> Dict[str, Any]:
+        """Extra arguments for the client's send_message"""
+        return {}
+
+    def _build_messages(self, message: Message, context_str: str) -> List[Any]:
+        """Prompt for the message and its recent context, in the client's message type"""
+        # The system prompt is static; only the user prompt varies
         user_prompt = f"""Recent conversation:
         {context_str}
         
@@ -84,38 +208,12 @@ class QualifierService(ServiceProtocol):
 
         Should we explore counter-arguments or alternative perspectives for this conversation? Answer with only true or false."""
         
-        # Determine client type based on module name
-        client_module = type(client).__module__
-        
-        # Create messages for LLM based on client type
-        if "ollama" in client_module:
-            # Import here to avoid circular imports
-            from src.llm.ollama import OllamaMessage
-            messages = [
-                OllamaMessage(role="system", content=system_prompt),
-                OllamaMessage(role="user", content=user_prompt)
-            ]
-        elif "gcp_models" in client_module:
-            # Import here to avoid circular imports
-            from src.llm.gcp_models import GCPMessage
-            messages = [
-                GCPMessage(role="system", content=system_prompt),
-                GCPMessage(role="user", content=user_prompt)
-            ]
-        else:
-            # Generic approach for unknown client types
-            logger.warning(f"Unknown LLM client type in QualifierService: {client_module}")
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-
-        # Get response from the LLM client
-        response = client.send_message(messages)
-        logger.info(f"QualifierService received response: {response.response}")
-        
+        return self._to_client_messages(_QUALIFIER_SYSTEM_PROMPT, user_prompt)
+
+    def _parse_response(self, response: str) -> bool:
+        """Read the true/false decision from the LLM response"""
         # Parse the response, handling different formats
-        response_text = response.response.lower().strip()
+        response_text = response.lower().strip()
         
         # Look for a true/false value
         if "true" in response_text and "false" not in response_text:
@@ -131,4 +229,119 @@ class QualifierService(ServiceProtocol):
             else:
                 # Default to false if we can't determine
                 logger.warning(f"Couldn't clearly determine true/false from response: {response_text}")
-                return False
\ No newline at end of file
+                return False
+
+    def _recent_context(self, message: Message) -> str:
+        """Last window_size messages of the conversation, formatted for the prompt"""
+        # Get recent messages for context, one extra in case the message
+        # itself is already stored
+        conversation_messages = self.message_repository.get_by_conversation(
+            message.conversation_id,
+            limit=self.window_size + 1
+        )
+        # The message itself goes in the prompt separately, and may or may not
+        # be stored yet (the agent stores it while qualifying)
+        conversation_messages = [m for m in conversation_messages if m.id != message.id]
+        
+        # Already oldest first; keep the last n messages
+        context_messages = conversation_messages[-self.window_size:]
+        
+        # Format context for prompt
+        return "\n".join([
+            f"{msg.author.name}: {msg.content}" 
+            for msg in context_messages
+        ])
+
+    def _client_message_type(self) -> Callable[..., Any]:
+        """Message class the client expects (dict for unknown clients), from its module"""
+        # Determine client type based on module name
+        client_module = type(self.ollama_client).__module__
+        
+        if "ollama" in client_module:
+            # Import here to avoid circular imports
+            from src.llm.ollama import OllamaMessage
+            return OllamaMessage
+        elif "gcp_models" in client_module:
+            # Import here to avoid circular imports
+            from src.llm.gcp_models import GCPMessage
+            return GCPMessage
+        else:
+            # Generic approach for unknown client types
+            logger.warning(f"Unknown LLM client type in QualifierService: {client_module}")
+            return dict
+
+    def _to_client_messages(self, system_prompt: str, user_prompt: str) -> List[Any]:
+        """Build the system/user pair in the message type the client expects"""
+        return [
+            self._message_type(role="system", content=system_prompt),
+            self._message_type(role="user", content=user_prompt)
+        ]
+
+
+@dataclass
+class QualifierPlusKeywordService(QualifierService):
+    """
+    Qualifies a message and extracts search keywords in a single LLM call,
+    saving the separate keyword extraction round-trip on the counter-argument path
+    """
+
+    def execute(self, message: Message, model_family: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Determine if a message needs counter-arguments and, if so, which keywords
+        to search articles with.
+        
+        Args:
+            message: The message to analyze
+            model_family: Optional model family to use (overrides the default)
+            
+        Returns:
+            Dict: {"needs_counter_arguments": bool, "keywords": List[str]}, where
+            keywords is empty when no counter-arguments are needed
+        """
+        return super().execute(message, model_family)
+
+    async def execute_async(self, message: Message, model_family: Optional[str] = None) -> Dict[str, Any]:
+        """Same as execute, without blocking the event loop"""
+        return await super().execute_async(message, model_family)
+
+    def _not_needed(self) -> Dict[str, Any]:
+        return {"needs_counter_arguments": False, "keywords": []}
+
+    def _send_kwargs(self) -> Dict[str, Any]:
+        # JSON mode, so the response parses without any cleanup
+        return {"format": "json"}
+
+    def _build_messages(self, message: Message, context_str: str) -> List[Any]:
+        user_prompt = f"""Recent conversation:
+        {context_str}
+        
+        Current message: {message.content}"""
+
+        return self._to_client_messages(_QUALIFIER_KEYWORDS_SYSTEM_PROMPT, user_prompt)
+
+    def _parse_response(self, response: str) -> Dict[str, Any]:
+        """Read the decision and keywords from the JSON response"""
+        # JSON mode normally returns the bare object, but some models still
+        # wrap it in prose or a code fence
+        try:
+            result = first_json_object(response)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Couldn't parse qualification response: {e}")
+            return self._not_needed()
+        if not isinstance(result, dict):
+            logger.warning("No JSON object in qualification response")
+            return self._not_needed()
+        
+        # Some models quote the boolean; bool("false") would be True
+        decision = result.get("needs_counter_arguments", False)
+        if isinstance(decision, str):
+            decision = decision.strip().lower() == "true"
+        needs_counter_arguments = decision is True
+        keywords = result.get("keywords") or []
+        if not isinstance(keywords, list):
+            keywords = []
+        
+        return {
+            "needs_counter_arguments": needs_counter_arguments,
+            "keywords": [str(k) for k in keywords[:3]] if needs_counter_arguments else []
+        }
@@ -34,20 +34,9 @@ class ArticleSearchService(ServiceProtocol):
         # Fetch real articles from Google News
         articles = self.news_fetcher.fetch_articles(keywords)
         
-        # If we got real articles, use them
+        # If we got real articles, use them (full content is already fetched)
         if articles:
             logger.info(f"Found {len(articles)} real articles from Google News")
-            
-            # Always fetch full content for each article
-            for article in articles:
-                logger.info(f"Fetching full content for article: {article['title']}")
-                content = self.news_fetcher.get_article_content(article["url"])
-                if content:
-                    article["content"] = content
-                    logger.info(f"Retrieved {len(content)} characters of content for: {article['title']}")
-                else:
-                    logger.warning(f"Failed to retrieve content for: {article['title']}")
-            
             return articles
         
         logger.warning("No real articles found, returning empty list")
@@ -1,7 +1,9 @@
 import html
 import re
+import threading
 import time
-from typing import List, Dict, Any, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Tuple
 import requests
 from urllib.parse import urlencode
 import feedparser
@@ -11,43 +13,70 @@ import trafilatura
 from src.core.logger import logger
 from src.skills.web_search.google_decoder import GoogleDecoder
 
+# Used on every article title, summary and fallback page, so compiled once
+_WHITESPACE_RE = re.compile(r"\s+")
+_SCRIPT_RE = re.compile(r'<script.*?</script>', re.DOTALL)
+_STYLE_RE = re.compile(r'<style.*?</style>', re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+_CONSENT_CONTINUE_RE = re.compile(r'continue=([^&]+)')
+
 class GoogleNewsFetcher:
     """
     Enhanced Google News fetcher that uses Google URL decoding and multiple
     content extraction methods to retrieve full article text.
     """
     
-    def __init__(self, delay_between_requests: float = 2.0, max_articles: int = 5):
+    def __init__(
+        self,
+        delay_between_requests: float = 2.0,
+        max_articles: int = 5,
+        content_timeout: float = 10.0,
+        max_workers: int = 8
+    ):
         """
         Initialize the Google News fetcher
         
         Args:
             delay_between_requests: Delay in seconds between requests to avoid rate limits
             max_articles: Maximum number of articles to return per search
+            content_timeout: Seconds to wait for full article content before
+                keeping the RSS summary instead
+            max_workers: Number of article pages fetched concurrently
         """
         self.base_url = "https://news.google.com/rss/search"
         self.delay = delay_between_requests
         self.max_articles = max_articles
+        self.content_timeout = content_timeout
         self.last_request_time = 0
+        # Rate limited requests may come from several pool threads at once
+        self._rate_lock = threading.Lock()
         self.decoder = GoogleDecoder()
+        # Article pages live on different publishers, so they are fetched in
+        # parallel; only requests to Google itself are rate limited
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="article-fetch")
     
     def clean_text(self, text: str) -> str:
         """Clean HTML entities and extra whitespace from text."""
         text = html.unescape(text)
-        text = re.sub(r"\s+", " ", text)
+        text = _WHITESPACE_RE.sub(" ", text)
         return text.strip()
     
     def _apply_rate_limit(self):
-        """Apply rate limiting to avoid being blocked by Google"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        
-        if time_since_last_request < self.delay:
-            # Sleep to respect the rate limit
-            sleep_time = self.delay - time_since_last_request
-            time.sleep(sleep_time)
+        """
+        Apply rate limiting to avoid being blocked by Google. Safe to call from
+        several threads: a caller only takes the slot when it is about to send,
+        so requests abandoned while waiting don't hold back later ones.
+        """
+        while True:
+            with self._rate_lock:
+                now = time.monotonic()
+                sleep_time = self.last_request_time + self.delay - now
+                if sleep_time <= 0:
+                    self.last_request_time = now
+                    return
             
-        self.last_request_time = time.time()
+            # Sleep to respect the rate limit, then compete for the slot again
+            time.sleep(sleep_time)
     
     def get_real_article_url(self, google_url: str) -> str:
         """
@@ -103,6 +132,63 @@ class GoogleNewsFetcher:
         """Fetch full article content using a tiered extraction approach"""
         # Apply rate limiting
         self._apply_rate_limit()
+        return self._fetch_content(url)
+
+    def fetch_contents(self, articles: List[Dict[str, Any]], decode_urls: bool = False) -> None:
+        """
+        Fetch full content for several articles concurrently, in place.
+
+        Articles whose page can't be extracted within content_timeout of its
+        fetch starting keep their current (summary) content.
+
+        With decode_urls, article urls are Google News links: they are decoded
+        concurrently (still rate limited), and each article's page is fetched
+        as soon as its real url is known. Decoding is only bounded by the rate
+        limit, so every article gets its real url.
+        """
+        if decode_urls:
+            futures = self._decode_then_fetch(articles)
+        else:
+            futures = dict(self._submit_fetch(article) for article in articles)
+        
+        for future, (article, deadline) in futures.items():
+            try:
+                full_content = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except TimeoutError:
+                future.cancel()
+                logger.warning(f"Timed out fetching content for: {article['title']}")
+                continue
+            except Exception as e:
+                logger.warning(f"Failed to retrieve content for {article['title']}: {e}")
+                continue
+            if full_content:
+                article["content"] = full_content
+                logger.info(f"Retrieved {len(full_content)} characters of content for: {article['title']}")
+            else:
+                logger.warning(f"Failed to retrieve content for: {article['title']}")
+
+    def _decode_then_fetch(self, articles: List[Dict[str, Any]]) -> Dict[Future, Tuple[Dict[str, Any], float]]:
+        """Decode article urls in the pool, submitting each content fetch once its url is decoded"""
+        decoding = {self._pool.submit(self.get_real_article_url, article["url"]): article for article in articles}
+        
+        futures = {}
+        for future in as_completed(decoding):
+            article = decoding[future]
+            try:
+                article["url"] = future.result()
+            except Exception as e:
+                logger.error(f"Error decoding URL: {str(e)}")  # Keep the Google URL as fallback
+            future, entry = self._submit_fetch(article)
+            futures[future] = entry
+        return futures
+
+    def _submit_fetch(self, article: Dict[str, Any]) -> Tuple[Future, Tuple[Dict[str, Any], float]]:
+        """Start fetching an article's page, due content_timeout from now: (future, (article, deadline))"""
+        future = self._pool.submit(self._fetch_content, article["url"])
+        return future, (article, time.monotonic() + self.content_timeout)
+
+    def _fetch_content(self, url: str) -> Optional[str]:
+        """Extract article text from a publisher page (no rate limiting)"""
         logger.info(f"Crawling full content from: {url}")
         
         # Try Trafilatura first (best for article extraction)
@@ -125,7 +211,7 @@ class GoogleNewsFetcher:
                 actual_url = self._extract_actual_url_from_consent(url)
                 if actual_url and actual_url != url:
                     logger.info(f"Extracted actual URL from consent page: {actual_url}")
-                    return self.get_article_content(actual_url)
+                    return self._fetch_content(actual_url)
             except Exception as e:
                 logger.warning(f"Failed to extract URL from consent page: {e}")
         
@@ -153,9 +239,8 @@ class GoogleNewsFetcher:
     def _extract_actual_url_from_consent(self, consent_url: str) -> Optional[str]:
         """Extract the actual article URL from a Google consent page"""
         try:
-            import re
             # Find the continue parameter in the URL
-            match = re.search(r'continue=([^&]+)', consent_url)
+            match = _CONSENT_CONTINUE_RE.search(consent_url)
             if match:
                 from urllib.parse import unquote
                 actual_url = unquote(match.group(1))
@@ -181,10 +266,10 @@ class GoogleNewsFetcher:
             content = response.text
             
             # Remove HTML tags
-            content = re.sub(r'<script.*?</script>', ' ', content, flags=re.DOTALL)
-            content = re.sub(r'<style.*?</style>', ' ', content, flags=re.DOTALL)
-            content = re.sub(r'<[^>]+>', ' ', content)
-            content = re.sub(r'\s+', ' ', content).strip()
+            content = _SCRIPT_RE.sub(' ', content)
+            content = _STYLE_RE.sub(' ', content)
+            content = _TAG_RE.sub(' ', content)
+            content = _WHITESPACE_RE.sub(' ', content).strip()
             
             # Return the full content instead of truncating
             logger.info(f"Extracted {len(content)} chars with basic HTML extraction")
@@ -229,13 +314,6 @@ class GoogleNewsFetcher:
         # Process articles
         articles = []
         for entry in feed.entries[:self.max_articles]:
-            # Get the real article URL
-            try:
-                article_url = self.get_real_article_url(entry.link)
-            except Exception as e:
-                logger.error(f"Error decoding URL: {str(e)}")
-                article_url = entry.link  # Use Google URL as fallback
-            
             # Extract source if available
             source = entry.source.title if hasattr(entry, "source") else None
             
@@ -247,23 +325,19 @@ class GoogleNewsFetcher:
                 content = self.clean_text(entry.description)
             
             # Create article data dictionary
+            # The Google News link is decoded to the real article URL below
             article_data = {
                 "title": self.clean_text(entry.title),
-                "url": article_url,
+                "url": entry.link,
                 "source": source,
                 "content": content
             }
             
             articles.append(article_data)
             logger.info(f"Found article: {article_data['title']} from {source}")
-            
-            # Get full content
-            logger.info(f"Fetching full content for article: {article_data['title']}")
-            full_content = self.get_article_content(article_url)
-            if full_content:
-                article_data["content"] = full_content
-                logger.info(f"Retrieved {len(full_content)} characters of content")
-            else:
-                logger.warning(f"Failed to retrieve content for: {article_data['title']}")
+        
+        # Decode URLs and get full content for all articles at once
+        logger.info(f"Fetching full content for {len(articles)} articles")
+        self.fetch_contents(articles, decode_urls=True)
         
         return articles
\ No newline at end of file
@@ -0,0 +1,34 @@
+### File: tests/test_core/test_cache.py ###
+
+import time
+
+from src.core.cache import TTLCache
+
+def test_ttl_cache():
+    """Test LRU eviction and expiry of the TTL cache"""
+    print("\nTesting TTL cache...")
+    
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    
+    # Touching "a" makes "b" the least recently used entry
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    
+    assert cache.pop("a") == 1
+    assert cache.get("a") is None
+    
+    # Expired entries are dropped on read
+    short = TTLCache(maxsize=10, ttl=0.01)
+    short.set("x", "value")
+    time.sleep(0.02)
+    assert short.get("x") is None
+    assert len(short) == 0
+    
+    print("✓ TTL cache tests passed")
+
+if __name__ == "__main__":
+    test_ttl_cache()
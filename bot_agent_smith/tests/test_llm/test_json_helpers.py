@@ -0,0 +1,48 @@
+from src.llm.service import _first_json, first_json_array, first_json_object
+from src.skills.reasoning.keyword_extraction import KeywordExtractionService
+import json
+
+def test_first_json_retries_next_bracket():
+    # The first "[" doesn't start valid JSON, the second does
+    assert first_json_array('Keywords [like these]: ["solar", "wind", "grid"]') == ["solar", "wind", "grid"]
+    assert first_json_object('{not json} {"needs_counter_arguments": true}') == {"needs_counter_arguments": True}
+    assert _first_json('<[x] [1, 2]>', "[") == [1, 2]
+
+def test_first_json_without_bracket():
+    assert first_json_array("no array here") is None
+    assert first_json_object("no object here") is None
+
+def test_first_json_invalid_everywhere():
+    try:
+        first_json_array("[not json] and [neither")
+    except json.JSONDecodeError:
+        pass
+    else:
+        raise AssertionError("Expected a JSONDecodeError")
+
+def test_first_json_prose_after_value():
+    text = '```json\n["a", "b", "c"]\n```\nThese keywords [mostly nouns] cover the topic.'
+    assert first_json_array(text) == ["a", "b", "c"]
+    assert first_json_object('{"keywords": ["x"]} Hope this helps! {"ignored": 1}') == {"keywords": ["x"]}
+
+def test_first_json_skips_rejected_values():
+    text = 'As noted in [1], the keywords are ["nuclear", "energy", "policy"]'
+    # Without a predicate the citation is the first array
+    assert first_json_array(text) == [1]
+    assert first_json_array(text, accept=lambda value: all(isinstance(k, str) for k in value)) == ["nuclear", "energy", "policy"]
+    # Valid arrays that are all rejected give None rather than an error
+    assert first_json_array("[1] [2]", accept=lambda value: False) is None
+
+def test_keywords_after_citation():
+    service = KeywordExtractionService(ollama_client=None)
+    response = 'See [1] for background. [{"note": "ignored"}] ["nuclear", "energy", "policy"]'
+    assert service._parse_response(response) == ["nuclear", "energy", "policy"]
+
+if __name__ == "__main__":
+    test_first_json_retries_next_bracket()
+    test_first_json_without_bracket()
+    test_first_json_invalid_everywhere()
+    test_first_json_prose_after_value()
+    test_first_json_skips_rejected_values()
+    test_keywords_after_citation()
+    print("JSON helper tests passed")
@@ -0,0 +1,72 @@
+from src.llm.service import LLMService
+from dataclasses import dataclass
+import asyncio
+
+@dataclass
+class FakeResponse:
+    response: str
+
+class FakeClient:
+    """Counts calls; each one takes a moment so concurrent requests overlap"""
+    def __init__(self, fail: bool = False):
+        self.calls = 0
+        self.fail = fail
+
+    async def send_message_async(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        return FakeResponse(f"answer {self.calls}")
+
+MESSAGES = [{"role": "user", "content": "What is the capital of France?"}]
+
+def test_identical_requests_share_one_call():
+    client = FakeClient()
+    service = LLMService(client=client, model_family="test")
+
+    async def run():
+        return await asyncio.gather(*(service.execute_async(messages=MESSAGES) for _ in range(5)))
+
+    responses = asyncio.run(run())
+    assert client.calls == 1, f"Expected one client call, got {client.calls}"
+    assert responses == ["answer 1"] * 5
+    assert not service._inflight
+
+def test_inflight_cleared_on_error():
+    client = FakeClient(fail=True)
+    service = LLMService(client=client, model_family="test")
+
+    async def run():
+        return await asyncio.gather(
+            *(service.execute_async(messages=MESSAGES) for _ in range(3)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert client.calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not service._inflight, "Failed request should not stay in flight"
+
+    # The next request goes to the client again instead of joining the failed one
+    client.fail = False
+    assert asyncio.run(service.execute_async(messages=MESSAGES)) == "answer 2"
+
+def test_use_cache_false_bypasses_cache_and_coalescing():
+    client = FakeClient()
+    service = LLMService(client=client, model_family="test")
+    asyncio.run(service.execute_async(messages=MESSAGES))
+
+    async def run():
+        return await asyncio.gather(*(service.execute_async(messages=MESSAGES, use_cache=False) for _ in range(3)))
+
+    responses = asyncio.run(run())
+    assert client.calls == 4, f"Expected a call per uncached request, got {client.calls}"
+    assert "answer 1" not in responses
+    assert not service._inflight
+
+if __name__ == "__main__":
+    test_identical_requests_share_one_call()
+    test_inflight_cleared_on_error()
+    test_use_cache_false_bypasses_cache_and_coalescing()
+    print("LLM service tests passed")
@@ -1,6 +1,7 @@
 from src.llm.ollama import create_ollama_client
 from src.llm.ollama.models import OllamaMessage
 from dotenv import load_dotenv
+import asyncio
 import os
 
 def test_ollama_integration():
@@ -41,5 +42,47 @@ def test_ollama_integration():
     
     print("\nAll tests passed successfully!")
 
+def test_ollama_streaming():
+    print("\nStarting Ollama streaming test...")
+    
+    load_dotenv()
+    client = create_ollama_client(base_url=os.getenv('OLLAMA_HOST'), model=os.getenv('OLLAMA_MODEL'))
+    
+    messages = [
+        OllamaMessage(role="system", content="You are a helpful AI assistant."),
+        OllamaMessage(role="user", content="What is the capital of France?")
+    ]
+    
+    async def collect():
+        chunks = [chunk async for chunk in client.astream(messages)]
+        await client.aclose()
+        return chunks
+    
+    chunks = asyncio.run(collect())
+    
+    print(f"\nReceived {len(chunks)} chunks: {''.join(chunks)}")
+    
+    assert chunks, "Stream should yield at least one chunk"
+    assert "".join(chunks).strip(), "Streamed response should not be empty"
+    
+    print("\nStreaming test passed!")
+
+def test_ollama_client_closes_pools():
+    """async with closes both connection pools; close() only the sync one"""
+    async def open_and_close():
+        async with create_ollama_client(base_url="http://localhost:11434", model="test") as client:
+            pass
+        return client
+    
+    client = asyncio.run(open_and_close())
+    assert client._client.is_closed and client._async_client.is_closed
+    
+    with create_ollama_client(base_url="http://localhost:11434", model="test") as client:
+        pass
+    assert client._client.is_closed
+    assert not client._async_client.is_closed, "close() leaves the async pool to aclose()"
+
 if __name__ == "__main__":
-    test_ollama_integration()
\ No newline at end of file
+    test_ollama_integration()
+    test_ollama_streaming()
+    test_ollama_client_closes_pools()
\ No newline at end of file
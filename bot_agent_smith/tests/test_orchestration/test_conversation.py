@@ -72,5 +72,33 @@ def test_conversation_window():
     
     print("\nAll conversation window tests passed!")
 
+def test_window_deduplication():
+    """Test that repeated messages are dropped and trimmed ones can return"""
+    print("\nTesting conversation window deduplication...")
+    
+    user = Author(id="user123", name="Test User", discord_id="discord123")
+    window = ConversationWindow(
+        conversation_id="conv123",
+        messages=[],
+        user_profile=None,
+        window_size=2
+    )
+    
+    first = Message(content="Hello", type=MessageType.TEXT, author=user, conversation_id="conv123")
+    repeat = Message(content="Hello", type=MessageType.TEXT, author=user, conversation_id="conv123",
+                     timestamp=first.timestamp)
+    window.add_message(first)
+    window.add_message(repeat)
+    assert len(window.messages) == 1, "Duplicate message should be skipped"
+    
+    # Push "Hello" out of the window, after which it is no longer a duplicate
+    for content in ["One", "Two"]:
+        window.add_message(Message(content=content, type=MessageType.TEXT, author=user, conversation_id="conv123"))
+    window.add_message(repeat)
+    assert [m.content for m in window.messages] == ["Two", "Hello"]
+    
+    print("\nConversation window deduplication tests passed!")
+
 if __name__ == "__main__":
-    test_conversation_window()
\ No newline at end of file
+    test_conversation_window()
+    test_window_deduplication()
\ No newline at end of file
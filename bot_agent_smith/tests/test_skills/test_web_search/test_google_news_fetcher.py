@@ -0,0 +1,71 @@
+# tests/test_skills/test_web_search/test_google_news_fetcher.py
+from src.skills.web_search.google_news_fetcher import GoogleNewsFetcher
+
+import time
+
+class SlowDecoder:
+    """Stands in for GoogleDecoder, without network access"""
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def decode_google_news_url(self, url):
+        time.sleep(self.delay)
+        return {"status": True, "decoded_url": url.replace("https://news.google.com/", "https://publisher.example/")}
+
+def create_fetcher(fetch_delays):
+    fetcher = GoogleNewsFetcher(delay_between_requests=0.2, content_timeout=0.5)
+    fetcher.decoder = SlowDecoder(0.05)
+
+    def fetch_content(url):
+        time.sleep(fetch_delays.get(url.rsplit("/", 1)[-1], 0.05))
+        return f"Full content of {url}"
+
+    fetcher._fetch_content = fetch_content
+    return fetcher
+
+def create_articles(count):
+    return [
+        {"title": f"Article {i}", "url": f"https://news.google.com/{i}", "content": f"Summary {i}"}
+        for i in range(count)
+    ]
+
+def test_rate_limited_decoding_keeps_every_article():
+    """Decoding 5 urls takes longer than content_timeout; every article is still decoded and fetched"""
+    fetcher = create_fetcher({})
+    articles = create_articles(5)
+
+    fetcher.fetch_contents(articles, decode_urls=True)
+
+    for i, article in enumerate(articles):
+        assert article["url"] == f"https://publisher.example/{i}", article
+        assert article["content"] == f"Full content of https://publisher.example/{i}", article
+
+def test_slow_page_keeps_summary():
+    """A page slower than content_timeout keeps its summary without holding back the others"""
+    fetcher = create_fetcher({"1": 2.0})
+    articles = create_articles(3)
+
+    start = time.monotonic()
+    fetcher.fetch_contents(articles, decode_urls=True)
+    elapsed = time.monotonic() - start
+
+    assert articles[1]["content"] == "Summary 1"
+    assert articles[1]["url"] == "https://publisher.example/1"
+    assert articles[0]["content"].startswith("Full content")
+    assert articles[2]["content"].startswith("Full content")
+    assert elapsed < 1.5, f"Took {elapsed:.2f}s, the slow page wasn't timed out"
+
+def test_rate_limit_not_held_by_timed_out_work():
+    """After a search whose page fetch timed out, the next Google request only waits one delay"""
+    fetcher = create_fetcher({"0": 2.0})
+    fetcher.fetch_contents(create_articles(1), decode_urls=True)
+
+    start = time.monotonic()
+    fetcher._apply_rate_limit()
+    assert time.monotonic() - start <= fetcher.delay + 0.05
+
+if __name__ == "__main__":
+    test_rate_limited_decoding_keeps_every_article()
+    test_slow_page_keeps_summary()
+    test_rate_limit_not_held_by_timed_out_work()
+    print("Google News fetcher tests passed")
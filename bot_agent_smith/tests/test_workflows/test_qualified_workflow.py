@@ -6,10 +6,11 @@ from src.llm.ollama import create_ollama_client
 from src.llm.service import LLMService
 from src.memory import create_vector_db_client, create_message_repository, create_user_repository
 from src.skills.context.service import ContextService
-from src.skills.reasoning.qualifier import QualifierService
+from src.skills.reasoning.qualifier import QualifierService, QualifierPlusKeywordService
 from src.skills.reasoning.keyword_extraction import KeywordExtractionService
 from src.skills.web_search.article_search import ArticleSearchService
 
+import asyncio
 import os
 from datetime import datetime, UTC
 import uuid
@@ -72,6 +73,18 @@ def test_counter_argument_workflow():
         version="1.0.0"
     )
     
+    # Qualifies and extracts keywords in one call, as the agent does
+    qualifier_keywords_service = QualifierPlusKeywordService(
+        ollama_client=ollama_client,
+        message_repository=message_repo
+    )
+    service_registry.register(
+        name="qualifier_keywords",
+        service=qualifier_keywords_service,
+        description="Qualifies messages and extracts search keywords in one call",
+        version="1.0.0"
+    )
+    
     keyword_extraction_service = KeywordExtractionService(
         ollama_client=ollama_client
     )
@@ -152,7 +165,7 @@ def test_counter_argument_workflow():
         print(f"\nMessage: {test_message.content}")
         
         # Run workflow
-        result = workflow.invoke(workflow_input)
+        result = asyncio.run(workflow.ainvoke(workflow_input))
         
         # Print results
         print(f"\nWorkflow results:")
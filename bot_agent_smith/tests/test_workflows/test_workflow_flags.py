@@ -0,0 +1,97 @@
+# tests/test_workflows/test_workflow_flags.py
+from src.orchestration.workflows.qualified_workflow import create_qualified_workflow
+from src.orchestration.services.registry import ServiceRegistry
+from src.core.types import Message, Author, MessageType
+
+import asyncio
+
+class FakeService:
+    """Records every call and answers with a fixed result"""
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def execute(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.result
+
+    async def execute_async(self, **kwargs):
+        return self.execute(**kwargs)
+
+    def execute_fast(self, message_content):
+        return []
+
+def create_services():
+    services = {
+        "qualifier": FakeService(False),
+        "context": FakeService({"messages": []}),
+        "keyword_extraction": FakeService(["requalified"]),
+        "article_search": FakeService([]),
+        "llm": FakeService("standard answer"),
+    }
+    registry = ServiceRegistry()
+    for name, service in services.items():
+        registry.register(name, service, name)
+    return registry, services
+
+def create_message():
+    author = Author(id="user123", name="Test User", discord_id="discord123")
+    return Message(content="Nuclear power is the only way forward", type=MessageType.TEXT,
+                   author=author, conversation_id="conv123")
+
+def test_skip_flags():
+    """The bot's background run must keep its qualification and not buffer a second acknowledgment"""
+    registry, services = create_services()
+    workflow = create_qualified_workflow(registry)
+
+    result = asyncio.run(workflow.ainvoke({
+        "message": create_message(),
+        "needs_counter_arguments": True,
+        "keywords": ["nuclear", "energy", "policy"],
+        "messages_to_send": [],
+        "_skip_qualification": True,
+        "_skip_acknowledgment": True,
+    }))
+
+    assert services["qualifier"].calls == [], "Qualifier should be skipped"
+    assert services["keyword_extraction"].calls == [], "Keywords were given, no extraction needed"
+    assert services["article_search"].calls == [{"keywords": ["nuclear", "energy", "policy"]}]
+    assert not any(m.get("type") == "acknowledgment" for m in result.get("messages_to_send", [])), \
+        "Acknowledgment should not be buffered again"
+
+def test_no_cache_flag():
+    """_no_cache reaches the LLM calls"""
+    registry, services = create_services()
+    workflow = create_qualified_workflow(registry)
+
+    asyncio.run(workflow.ainvoke({
+        "message": create_message(),
+        "needs_counter_arguments": False,
+        "messages_to_send": [],
+        "_no_cache": True,
+    }))
+
+    assert services["llm"].calls, "LLM should answer"
+    assert all(call["use_cache"] is False for call in services["llm"].calls)
+
+def test_qualification_only_flag():
+    """_run_qualification_only stops after the qualifier, without fetching context"""
+    registry, services = create_services()
+    workflow = create_qualified_workflow(registry)
+
+    result = asyncio.run(workflow.ainvoke({
+        "message": create_message(),
+        "needs_counter_arguments": False,
+        "messages_to_send": [],
+        "_run_qualification_only": True,
+    }))
+
+    assert len(services["qualifier"].calls) == 1
+    assert services["context"].calls == []
+    assert services["llm"].calls == []
+    assert result["needs_counter_arguments"] is False
+
+if __name__ == "__main__":
+    test_skip_flags()
+    test_no_cache_flag()
+    test_qualification_only_flag()